@@ -0,0 +1,177 @@
+"""
+Export benchmark for PNP San Juan
+Times the export_users path (one unbuffered cursor through exports.encode_csv)
+against the range-partitioned builder in parallel_export.py, on the same data.
+
+    python benchmark_exports.py --seed 1000000   # add bench_* users once
+    python benchmark_exports.py --workers 4      # run the comparison
+    python benchmark_exports.py --cleanup        # remove the bench_* users
+
+Seeded users are spread over five years of created_at and each gets the
+profile for its role, so the users report joins all three profile tables.
+Their password field holds no valid hash, so they can't be logged into.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import mysql.connector
+
+from config import DB_CONFIG, EXPORT_CONFIG
+from exports import CUSTOM_REPORTS, REPORTS, encode_csv
+from parallel_export import write_partitioned
+import stats_counters
+
+BENCH_PREFIX = 'bench_'
+BENCH_PATTERN = 'bench\\_%'  # LIKE pattern; `_` alone is a wildcard
+PROFILE_TABLES = [('applicant_profiles', 'applicant'), ('employee_profiles', 'employee'),
+                  ('admin_profiles', 'admin')]
+# Every date a custom report can hold
+FULL_RANGE = ('1970-01-01', '2999-12-31')
+
+
+def _role(n):
+    """80% applicants, 15% employees, 5% admins"""
+    bucket = n % 20
+    return 'admin' if bucket == 0 else 'employee' if bucket <= 3 else 'applicant'
+
+
+def seed(conn, count, batch_size=5000):
+    """Insert `count` bench_* users plus their profiles, then rebuild stats_counters"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM users')
+    first_id = cursor.fetchone()[0] + 1
+    cursor.execute("SELECT COUNT(*) FROM users WHERE username LIKE %s", (BENCH_PATTERN,))
+    offset = cursor.fetchone()[0]
+    now = datetime.now().replace(microsecond=0)
+    five_years = 5 * 365 * 24 * 60
+
+    started = time.monotonic()
+    for start in range(offset, offset + count, batch_size):
+        rows = [(f'{BENCH_PREFIX}{n}', f'{BENCH_PREFIX}{n}@example.invalid', '!', _role(n),
+                 now - timedelta(minutes=(n * 7919) % five_years))
+                for n in range(start, min(start + batch_size, offset + count))]
+        cursor.executemany('''
+            INSERT INTO users (username, email, password, role, created_at)
+            VALUES (%s, %s, %s, %s, %s)
+        ''', rows)
+        conn.commit()
+        print(f'  users: {start + len(rows) - offset}/{count}', end='\r')
+    print()
+
+    cursor.execute('SELECT MAX(id) FROM users')
+    last_id = cursor.fetchone()[0]
+    for low in range(first_id, last_id + 1, 50000):
+        for table, role in PROFILE_TABLES:
+            cursor.execute(f'''
+                INSERT INTO {table} (user_id, first_name, last_name)
+                SELECT id, 'Bench', username FROM users
+                WHERE id >= %s AND id < %s AND role = %s AND username LIKE %s
+            ''', (low, low + 50000, role, BENCH_PATTERN))
+        conn.commit()
+    cursor.close()
+    stats_counters.reconcile(conn)
+    print(f"✓ Seeded {count} users with profiles in {time.monotonic() - started:.1f}s")
+
+
+def cleanup(conn, batch_size=5000):
+    """Delete the bench_* users (profiles cascade), then rebuild stats_counters"""
+    cursor = conn.cursor()
+    removed = 0
+    while True:
+        cursor.execute('DELETE FROM users WHERE username LIKE %s LIMIT %s', (BENCH_PATTERN, batch_size))
+        conn.commit()
+        removed += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            break
+    cursor.close()
+    stats_counters.reconcile(conn)
+    print(f"✓ Removed {removed} bench users")
+
+
+def time_single_cursor(conn, sql, params, path, header=None, row=None):
+    """One unbuffered cursor, as the export routes and small export jobs do"""
+    cursor = conn.cursor(dictionary=row is not None)
+    cursor.execute(sql, params)
+    rows = cursor.fetchmany(EXPORT_CONFIG['fetch_size'])
+    written = 0
+
+    def count(n):
+        nonlocal written
+        written += n
+
+    with open(path, 'wb') as f:
+        for chunk in encode_csv(cursor, rows, header, row, on_batch=count):
+            f.write(chunk)
+    cursor.close()
+    conn.commit()
+    return written
+
+
+def time_partitioned(conn, path, workers):
+    report = CUSTOM_REPORTS['users']
+    cursor = conn.cursor()
+    cursor.execute(report['count'], FULL_RANGE)
+    _, low, high = cursor.fetchone()
+    cursor.close()
+    conn.commit()
+    return write_partitioned(report, FULL_RANGE, low, high, path, workers=workers)
+
+
+def benchmark(conn, workers, rounds):
+    out_dir = tempfile.mkdtemp(prefix='export-bench-')
+    users = REPORTS['users']
+    custom = CUSTOM_REPORTS['users']
+    runs = [
+        ('export_users (1 cursor)',
+         lambda path: time_single_cursor(conn, users['sql'], (), path, users['header'], users['row'])),
+        ('export_custom users (1 cursor)',
+         lambda path: time_single_cursor(conn, custom['sql'], FULL_RANGE, path)),
+        (f'export_custom users ({workers} processes)',
+         lambda path: time_partitioned(conn, path, workers)),
+    ]
+    try:
+        print(f"{'path':<36} {'rows':>10} {'MB':>8} {'best s':>8} {'rows/s':>10}")
+        for name, run in runs:
+            path = os.path.join(out_dir, 'out.csv')
+            best = None
+            for _ in range(rounds):
+                started = time.perf_counter()
+                rows = run(path)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            size = os.path.getsize(path) / 1024 / 1024
+            print(f'{name:<36} {rows:>10} {size:>8.1f} {best:>8.2f} {rows / best:>10.0f}')
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--seed', type=int, metavar='N', help='insert N bench users first')
+    parser.add_argument('--cleanup', action='store_true', help='remove the bench users and exit')
+    parser.add_argument('--workers', type=int, default=4, help='processes for the partitioned builder')
+    parser.add_argument('--rounds', type=int, default=3, help='runs per path (best is reported)')
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        if args.cleanup:
+            cleanup(conn)
+            return
+        if args.seed:
+            seed(conn, args.seed)
+        benchmark(conn, args.workers, args.rounds)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+Bulk templated email for applicant status updates
+One message is rendered once and sent to many recipients. SendGrid gets
+up to `batch_size` personalizations per API call over the shared keep-alive
+session; batches SendGrid rejects fall back to the pooled SMTP sessions.
+Both paths are paced to stay under the provider quotas in BULK_EMAIL_CONFIG.
+"""
+import os
+import smtplib
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from html import escape
+
+from config import BULK_EMAIL_CONFIG, SMTP_CONFIG
+from email_utils import SENDGRID_URL, ProvidersUnavailable, sendgrid_session, smtp_pool
+from provider_health import health as provider_health
+
+# Per-recipient substitution tags (the HTML part gets an escaped copy of the name)
+NAME_TAG = '-name-'
+HTML_NAME_TAG = '-name_html-'
+
+# SMTP fallback checkpoints this often so a long send keeps its outbox lock fresh
+SMTP_SLICE = 50
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart, across threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+sendgrid_limiter = RateLimiter(BULK_EMAIL_CONFIG['sendgrid_calls_per_second'])
+smtp_limiter = RateLimiter(BULK_EMAIL_CONFIG['smtp_messages_per_second'])
+
+
+def status_email(status, notes=''):
+    """(subject, text, html) for an application status update, with name tags left in"""
+    subject = f'PNP San Juan Application Update: {status}'
+    notes_text = f'\nNotes from the recruitment team:\n{notes}\n' if notes else ''
+    text_content = f"""
+Hello {NAME_TAG},
+
+Your application status has been updated to: {status}
+{notes_text}
+Log in to your PNP San Juan applicant account to see the details of this stage.
+
+Best regards,
+PNP San Juan Team
+    """
+
+    notes_html = f'<p><strong>Notes:</strong> {escape(notes)}</p>' if notes else ''
+    html_content = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; background-color: #f4f4f4; }
+        .content { background-color: white; padding: 30px; border-radius: 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+        .status { font-size: 22px; font-weight: bold; color: #007bff; text-align: center;
+                  padding: 15px; background-color: #f8f9fa; border-radius: 5px; margin: 20px 0; }
+        .footer { margin-top: 20px; font-size: 12px; color: #666; text-align: center; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="content">
+            <h2>PNP San Juan - Application Update</h2>
+            <p>Hello <strong>""" + HTML_NAME_TAG + """</strong>,</p>
+            <p>Your application status has been updated to:</p>
+            <div class="status">""" + escape(status) + """</div>
+            """ + notes_html + """
+            <p>Log in to your PNP San Juan applicant account to see the details of this stage.</p>
+            <div class="footer">
+                <p>Best regards,<br>PNP San Juan Team</p>
+            </div>
+        </div>
+    </div>
+</body>
+</html>
+    """
+    return subject, text_content, html_content
+
+
+def send_sendgrid_batch(recipients, subject, text_content, html_content, api_key):
+    """
+    Deliver one batch with a single SendGrid call
+
+    Each recipient gets its own personalization, so nobody sees the other
+    addresses and the name tags are filled per recipient.
+    """
+    data = {
+        'personalizations': [
+            {
+                'to': [{'email': r['email']}],
+                'substitutions': {NAME_TAG: r['name'], HTML_NAME_TAG: escape(r['name'])}
+            }
+            for r in recipients
+        ],
+        'from': {
+            'email': SMTP_CONFIG['sender_email'],
+            'name': SMTP_CONFIG['sender_name']
+        },
+        'subject': subject,
+        'content': [
+            {'type': 'text/plain', 'value': text_content},
+            {'type': 'text/html', 'value': html_content}
+        ]
+    }
+    headers = {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json'
+    }
+
+    sendgrid_limiter.wait()
+    try:
+        response = sendgrid_session().post(SENDGRID_URL, headers=headers, json=data,
+                                           timeout=BULK_EMAIL_CONFIG['timeout'])
+    except Exception as e:
+        print(f"✗ Error sending bulk email via SendGrid: {str(e)}")
+        return False
+
+    if response.status_code == 202:
+        print(f"✓ Bulk email sent via SendGrid to {len(recipients)} recipients")
+        return True
+    print(f"✗ SendGrid bulk error: {response.status_code} - {response.text}")
+    return False
+
+
+def send_smtp_batch(recipients, subject, text_content, html_content):
+    """
+    Deliver one message per recipient over the pooled SMTP sessions
+
+    Returns the recipients that were not delivered. A connection-level
+    failure stops the batch instead of timing out once per recipient.
+    """
+    for index, r in enumerate(recipients):
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = f"{SMTP_CONFIG['sender_name']} <{SMTP_CONFIG['sender_email']}>"
+        msg['To'] = r['email']
+        msg.attach(MIMEText(text_content.replace(NAME_TAG, r['name']), 'plain'))
+        msg.attach(MIMEText(html_content.replace(HTML_NAME_TAG, escape(r['name'])), 'html'))
+
+        smtp_limiter.wait()
+        try:
+            smtp_pool.send(msg)
+        except smtplib.SMTPRecipientsRefused:
+            print(f"✗ SMTP refused recipient {r['email']}")
+            return [r] + send_smtp_batch(recipients[index + 1:], subject, text_content, html_content)
+        except Exception as e:
+            print(f"✗ Error sending bulk email via SMTP: {str(e)}")
+            return list(recipients[index:])
+    if recipients:
+        print(f"✓ Bulk email sent via SMTP to {len(recipients)} recipients")
+    return []
+
+
+def send_bulk(recipients, subject, text_content, html_content, on_progress=None):
+    """
+    Send one templated message to many recipients
+
+    Args:
+        recipients: list of {'email': ..., 'name': ...}
+        on_progress: optional callback given the still-undelivered recipients
+                     after every batch, so callers can checkpoint
+
+    Returns:
+        The recipients that could not be delivered
+
+    Raises:
+        ProvidersUnavailable: every provider's circuit was open before anything was tried
+    """
+    api_key = os.getenv('SENDGRID_API_KEY')
+    pending = list(recipients)
+    undelivered = []
+    attempted = False
+
+    while pending:
+        batch, pending = pending[:BULK_EMAIL_CONFIG['batch_size']], pending[BULK_EMAIL_CONFIG['batch_size']:]
+        if api_key and provider_health.allow('sendgrid'):
+            attempted = True
+            ok = send_sendgrid_batch(batch, subject, text_content, html_content, api_key)
+            provider_health.record('sendgrid', ok, None if ok else 'Bulk send failed')
+            if ok:
+                if on_progress:
+                    on_progress(undelivered + pending)
+                continue
+
+        if api_key:
+            # Don't wait out another SendGrid timeout per batch for the rest of this send
+            print("⚠️ SendGrid unavailable, sending the rest of this bulk email via SMTP...")
+            api_key = None
+        for start in range(0, len(batch), SMTP_SLICE):
+            chunk = batch[start:start + SMTP_SLICE]
+            if provider_health.allow('smtp'):
+                attempted = True
+                failed = send_smtp_batch(chunk, subject, text_content, html_content)
+                provider_health.record('smtp', len(failed) < len(chunk), 'Bulk send failed' if failed else None)
+            else:
+                failed = chunk
+            undelivered += failed
+            if on_progress:
+                on_progress(undelivered + batch[start + SMTP_SLICE:] + pending)
+
+    if not attempted and undelivered:
+        raise ProvidersUnavailable('All email provider circuits are open')
+    return undelivered
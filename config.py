@@ -32,6 +32,55 @@ def get_db_config():
 
 DB_CONFIG = get_db_config()
 
+# gthread threads per gunicorn process (Procfile `web`)
+GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS') or '16')
+
+# Connection pool settings (per worker process). A request holds its connection
+# until teardown, so the default is one per thread plus one for the
+# notification feed poller; a smaller pool queues requests on acquire()
+DB_POOL_CONFIG = {
+    'size': int(os.getenv('DB_POOL_SIZE') or str(GUNICORN_THREADS + 1)),
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT') or '10'),
+    'recycle': int(os.getenv('DB_POOL_RECYCLE') or '1800'),
+    'ping_interval': int(os.getenv('DB_POOL_PING_INTERVAL') or '30')
+}
+
+# Per-request query instrumentation (Server-Timing header, N+1 and slow request logging)
+QUERY_STATS_CONFIG = {
+    'enabled': (os.getenv('QUERY_STATS_ENABLED') or '1') == '1',
+    'repeat_threshold': int(os.getenv('QUERY_REPEAT_THRESHOLD') or '5'),
+    'slow_request_ms': float(os.getenv('SLOW_REQUEST_MS') or '500'),
+    'slowest_kept': int(os.getenv('SLOW_QUERY_TOP') or '5')
+}
+
+# Seconds a list-page total (COUNT(*)) is cached per worker process
+COUNT_CACHE_TTL = int(os.getenv('COUNT_CACHE_TTL') or '60')
+
+# Seconds the navbar context (avatar, unread count) is cached per user
+NAV_CACHE_TTL = int(os.getenv('NAV_CACHE_TTL') or '30')
+
+# Server-Sent Events notification stream (falls back to polling when disabled).
+# Each open stream holds a gthread thread: keep max_streams well below
+# GUNICORN_THREADS (Procfile) so logins and form posts always find a free one.
+SSE_CONFIG = {
+    'enabled': (os.getenv('SSE_ENABLED') or '1') == '1',
+    'poll_interval': float(os.getenv('SSE_POLL_INTERVAL') or '2'),
+    'keepalive_seconds': int(os.getenv('SSE_KEEPALIVE_SECONDS') or '15'),
+    'max_stream_seconds': int(os.getenv('SSE_MAX_STREAM_SECONDS') or '300'),
+    'max_streams': int(os.getenv('SSE_MAX_STREAMS') or '4')
+}
+
+# Email outbox delivered by email_worker.py (Procfile `worker`)
+EMAIL_OUTBOX_CONFIG = {
+    'threads': int(os.getenv('EMAIL_WORKER_THREADS') or '4'),
+    'batch_size': int(os.getenv('EMAIL_WORKER_BATCH') or '20'),
+    'poll_interval': float(os.getenv('EMAIL_WORKER_POLL_INTERVAL') or '1'),
+    'max_attempts': int(os.getenv('EMAIL_MAX_ATTEMPTS') or '5'),
+    'backoff_base': int(os.getenv('EMAIL_BACKOFF_BASE') or '5'),
+    'backoff_max': int(os.getenv('EMAIL_BACKOFF_MAX') or '300'),
+    'stale_after': int(os.getenv('EMAIL_STALE_AFTER') or '120')
+}
+
 # SMTP Configuration for Gmail 2FA - Uses environment variables in production
 SMTP_CONFIG = {
     'server': os.getenv('SMTP_SERVER', 'smtp.gmail.com') or 'smtp.gmail.com',
@@ -39,12 +88,106 @@ SMTP_CONFIG = {
     'username': os.getenv('SMTP_USERNAME', 'your-email@gmail.com') or 'your-email@gmail.com',
     'password': os.getenv('SMTP_PASSWORD', 'your-app-password') or 'your-app-password',
     'sender_name': os.getenv('SMTP_SENDER_NAME', 'PNP San Juan') or 'PNP San Juan',
-    'sender_email': os.getenv('SMTP_SENDER_EMAIL', 'your-email@gmail.com') or 'your-email@gmail.com'
+    'sender_email': os.getenv('SMTP_SENDER_EMAIL', 'your-email@gmail.com') or 'your-email@gmail.com',
+    # Set both to 0 to point at a plain local test server (e.g. aiosmtpd)
+    'use_tls': (os.getenv('SMTP_USE_TLS') or '1') == '1',
+    'use_auth': (os.getenv('SMTP_USE_AUTH') or '1') == '1'
+}
+
+# Reused SMTP sessions (see email_utils.SMTPSessionPool)
+SMTP_POOL_CONFIG = {
+    'size': int(os.getenv('SMTP_POOL_SIZE') or '2'),
+    'max_messages': int(os.getenv('SMTP_MAX_MESSAGES_PER_SESSION') or '100'),
+    'noop_interval': int(os.getenv('SMTP_NOOP_INTERVAL') or '10'),
+    'max_idle': int(os.getenv('SMTP_MAX_IDLE') or '240'),
+    'timeout': int(os.getenv('SMTP_TIMEOUT') or '10')
+}
+
+# Email provider circuit breakers (see provider_health.py)
+PROVIDER_HEALTH_CONFIG = {
+    'window_seconds': int(os.getenv('PROVIDER_WINDOW_SECONDS') or '60'),
+    'min_calls': int(os.getenv('PROVIDER_MIN_CALLS') or '5'),
+    'failure_rate': float(os.getenv('PROVIDER_FAILURE_RATE') or '0.5'),
+    'consecutive_failures': int(os.getenv('PROVIDER_CONSECUTIVE_FAILURES') or '3'),
+    'open_seconds': int(os.getenv('PROVIDER_OPEN_SECONDS') or '30'),
+    'probe_timeout': int(os.getenv('PROVIDER_PROBE_TIMEOUT') or '30'),
+    'cache_seconds': float(os.getenv('PROVIDER_HEALTH_CACHE_SECONDS') or '2')
+}
+
+# Scheduled purges (see maintenance.py); the thread runs inside the email worker
+MAINTENANCE_CONFIG = {
+    'enabled': (os.getenv('MAINTENANCE_ENABLED') or '0') == '1',
+    'interval': int(os.getenv('MAINTENANCE_INTERVAL') or '3600'),
+    'batch_size': int(os.getenv('MAINTENANCE_BATCH_SIZE') or '500'),
+    'pause': float(os.getenv('MAINTENANCE_PAUSE') or '0.2'),
+    'notification_days': int(os.getenv('READ_NOTIFICATION_RETENTION_DAYS') or '90'),
+    'outbox_sent_days': int(os.getenv('EMAIL_SENT_RETENTION_DAYS') or '7'),
+    'outbox_dead_days': int(os.getenv('EMAIL_DEAD_RETENTION_DAYS') or '30')
+}
+
+# Bulk status emails (see bulk_email.py); SendGrid accepts at most 1000 personalizations per call
+BULK_EMAIL_CONFIG = {
+    'batch_size': min(int(os.getenv('BULK_EMAIL_BATCH_SIZE') or '1000'), 1000),
+    'sendgrid_calls_per_second': float(os.getenv('SENDGRID_CALLS_PER_SECOND') or '5'),
+    'smtp_messages_per_second': float(os.getenv('SMTP_MESSAGES_PER_SECOND') or '5'),
+    'timeout': int(os.getenv('SENDGRID_TIMEOUT') or '10')
+}
+
+# Report CSV exports (see exports.py): rows fetched per round trip while streaming
+EXPORT_CONFIG = {
+    'fetch_size': int(os.getenv('EXPORT_FETCH_SIZE') or '1000')
+}
+
+# Background custom-range exports (see export_jobs.py), built by the email worker.
+# The directory has to be shared by the web and worker processes.
+EXPORT_JOBS_CONFIG = {
+    'enabled': (os.getenv('EXPORT_JOBS_ENABLED') or '1') == '1',
+    'directory': os.getenv('EXPORT_DIR') or os.path.join('instance', 'exports'),
+    'poll_interval': float(os.getenv('EXPORT_POLL_INTERVAL') or '2'),
+    'progress_interval': float(os.getenv('EXPORT_PROGRESS_INTERVAL') or '1'),
+    'stale_after': int(os.getenv('EXPORT_STALE_AFTER') or '120'),
+    'max_attempts': int(os.getenv('EXPORT_MAX_ATTEMPTS') or '3'),
+    # Builds of at least parallel_min_rows rows are split across processes (see parallel_export.py)
+    'parallel_workers': int(os.getenv('EXPORT_PARALLEL_WORKERS') or str(min(os.cpu_count() or 1, 4))),
+    'parallel_min_rows': int(os.getenv('EXPORT_PARALLEL_MIN_ROWS') or '200000'),
+    'retention_days': int(os.getenv('EXPORT_RETENTION_DAYS') or '7')
 }
 
 # OTP Configuration
 OTP_EXPIRY_MINUTES = int(os.getenv('OTP_EXPIRY_MINUTES', '5'))
 OTP_LENGTH = int(os.getenv('OTP_LENGTH', '6'))
 
+# Password hashing policy (see passwords.py; tune with `flask calibrate-hashing`)
+PASSWORD_HASH_CONFIG = {
+    'method': os.getenv('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1',
+    'max_concurrent': int(os.getenv('PASSWORD_HASH_CONCURRENCY') or str(os.cpu_count() or 2))
+}
+
+def _limit(name, default):
+    """Token bucket as 'burst/seconds' from the environment, e.g. RATE_LIMIT_LOGIN_IP=20/60"""
+    burst, seconds = (os.getenv(name) or default).split('/')
+    return int(burst), int(seconds)
+
+# Throttling for login, registration and OTP issuance (see rate_limit.py)
+RATE_LIMIT_CONFIG = {
+    'enabled': (os.getenv('RATE_LIMIT_ENABLED') or '1') == '1',
+    # Proxies in front of the app that append to X-Forwarded-For. Opt in (Railway: 1):
+    # with none in front the header is client-supplied and would bypass the IP limits
+    'trusted_proxies': int(os.getenv('RATE_LIMIT_TRUSTED_PROXIES') or '0'),
+    'rules': {
+        'login_ip': _limit('RATE_LIMIT_LOGIN_IP', '20/60'),
+        'login_user': _limit('RATE_LIMIT_LOGIN_USER', '5/300'),  # failed attempts only
+        'register_ip': _limit('RATE_LIMIT_REGISTER_IP', '5/3600'),
+        'otp_ip': _limit('RATE_LIMIT_OTP_IP', '10/600'),
+        'otp_user': _limit('RATE_LIMIT_OTP_USER', '3/300')
+    }
+}
+
+# OTP storage backend (see otp_store.py): 'mysql', or 'local' for single-host deploys
+OTP_STORE_CONFIG = {
+    'backend': os.getenv('OTP_STORE') or 'mysql',
+    'path': os.getenv('OTP_STORE_PATH') or os.path.join('instance', 'otp_codes.sqlite3')
+}
+
 # Secret Key for Flask sessions
 SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-this-in-production')
@@ -29,8 +29,10 @@ CREATE TABLE IF NOT EXISTS `admin_profiles` (
   `email` varchar(100) DEFAULT NULL,
   `phone` varchar(20) DEFAULT NULL,
   `profile_picture` varchar(255) DEFAULT NULL,
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (`id`),
   UNIQUE KEY `user_id` (`user_id`),
+  KEY `idx_admin_updated` (`updated_at`),
   CONSTRAINT `admin_profiles_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB AUTO_INCREMENT=4 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
@@ -67,6 +69,7 @@ CREATE TABLE IF NOT EXISTS `applicant_applications` (
   `pdf_path` varchar(255) DEFAULT NULL COMMENT 'Path to generated PDF',
   `step_completed` int DEFAULT '0' COMMENT 'Track which step (1-10) user is on',
   `is_complete` tinyint(1) DEFAULT '0',
+  `form_completed` tinyint(1) DEFAULT '0',
   `admin_notes` text,
   `reviewed_by` int DEFAULT NULL,
   `reviewed_at` timestamp NULL DEFAULT NULL,
@@ -133,6 +136,15 @@ CREATE TABLE IF NOT EXISTS `applicant_eligibility` (
 
 -- Data exporting was unselected.
 
+-- Dumping structure for table pnpsanjuan_db.applicant_id_sequences
+CREATE TABLE IF NOT EXISTS `applicant_id_sequences` (
+  `year` smallint NOT NULL,
+  `last_value` int NOT NULL,
+  PRIMARY KEY (`year`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Data exporting was unselected.
+
 -- Dumping structure for table pnpsanjuan_db.applicant_profiles
 CREATE TABLE IF NOT EXISTS `applicant_profiles` (
   `id` int NOT NULL AUTO_INCREMENT,
@@ -158,13 +170,26 @@ CREATE TABLE IF NOT EXISTS `applicant_profiles` (
   `eligibility_cert` varchar(255) DEFAULT NULL,
   `application_status` enum('Pending','Approved','Rejected') DEFAULT 'Pending',
   `applied_date` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (`id`),
   UNIQUE KEY `user_id` (`user_id`),
+  KEY `idx_applicant_status` (`application_status`),
+  KEY `idx_applicant_updated` (`updated_at`),
+  KEY `idx_applicant_applied` (`applied_date`),
   CONSTRAINT `applicant_profiles_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB AUTO_INCREMENT=11 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
 -- Data exporting was unselected.
 
+-- Dumping structure for table pnpsanjuan_db.applicant_seq_counters
+CREATE TABLE IF NOT EXISTS `applicant_seq_counters` (
+  `year` smallint NOT NULL,
+  `last_value` int NOT NULL,
+  PRIMARY KEY (`year`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Data exporting was unselected.
+
 -- Dumping structure for table pnpsanjuan_db.character_references
 CREATE TABLE IF NOT EXISTS `character_references` (
   `id` int NOT NULL AUTO_INCREMENT,
@@ -196,6 +221,9 @@ CREATE TABLE IF NOT EXISTS `deployments` (
   `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (`id`),
   KEY `employee_id` (`employee_id`),
+  KEY `idx_deployments_status_start` (`status`,`start_date`),
+  KEY `idx_deployments_start` (`start_date`),
+  KEY `idx_deployments_updated` (`updated_at`),
   CONSTRAINT `deployments_ibfk_1` FOREIGN KEY (`employee_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB AUTO_INCREMENT=3 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
@@ -220,6 +248,51 @@ CREATE TABLE IF NOT EXISTS `education` (
 
 -- Data exporting was unselected.
 
+-- Dumping structure for table pnpsanjuan_db.email_outbox
+CREATE TABLE IF NOT EXISTS `email_outbox` (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `kind` varchar(30) NOT NULL,
+  `user_id` int DEFAULT NULL,
+  `recipient` varchar(100) NOT NULL,
+  `payload` json NOT NULL,
+  `status` enum('queued','sending','sent','dead') NOT NULL DEFAULT 'queued',
+  `attempts` int NOT NULL DEFAULT '0',
+  `next_attempt_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `locked_by` varchar(100) DEFAULT NULL,
+  `locked_at` timestamp NULL DEFAULT NULL,
+  `last_error` text,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `sent_at` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `idx_outbox_status_due` (`status`,`next_attempt_at`),
+  KEY `idx_outbox_user` (`user_id`),
+  CONSTRAINT `email_outbox_user_fk` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Data exporting was unselected.
+
+-- Dumping structure for table pnpsanjuan_db.email_provider_health
+CREATE TABLE IF NOT EXISTS `email_provider_health` (
+  `provider` varchar(20) NOT NULL,
+  `state` enum('closed','open','half_open') NOT NULL DEFAULT 'closed',
+  `window_start` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `successes` int NOT NULL DEFAULT '0',
+  `failures` int NOT NULL DEFAULT '0',
+  `prev_successes` int NOT NULL DEFAULT '0',
+  `prev_failures` int NOT NULL DEFAULT '0',
+  `consecutive_failures` int NOT NULL DEFAULT '0',
+  `open_until` timestamp NULL DEFAULT NULL,
+  `probe_started_at` timestamp NULL DEFAULT NULL,
+  `last_error` varchar(255) DEFAULT NULL,
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`provider`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Dumping data for table pnpsanjuan_db.email_provider_health: ~2 rows (approximately)
+INSERT IGNORE INTO `email_provider_health` (`provider`) VALUES
+	('sendgrid'),
+	('smtp');
+
 -- Dumping structure for table pnpsanjuan_db.employee_profiles
 CREATE TABLE IF NOT EXISTS `employee_profiles` (
   `id` int NOT NULL AUTO_INCREMENT,
@@ -241,13 +314,46 @@ CREATE TABLE IF NOT EXISTS `employee_profiles` (
   `emergency_contact_number` varchar(20) DEFAULT NULL,
   `rank` varchar(50) DEFAULT NULL,
   `profile_picture` varchar(255) DEFAULT NULL,
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (`id`),
   UNIQUE KEY `user_id` (`user_id`),
+  KEY `idx_employee_updated` (`updated_at`),
   CONSTRAINT `employee_profiles_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB AUTO_INCREMENT=7 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
 -- Data exporting was unselected.
 
+-- Dumping structure for table pnpsanjuan_db.export_jobs
+CREATE TABLE IF NOT EXISTS `export_jobs` (
+  `id` bigint NOT NULL AUTO_INCREMENT,
+  `report_type` varchar(30) NOT NULL,
+  `start_date` date NOT NULL,
+  `end_date` date NOT NULL,
+  `compress` tinyint(1) NOT NULL DEFAULT '0',
+  `requested_by` int DEFAULT NULL,
+  `status` enum('queued','running','done','failed') NOT NULL DEFAULT 'queued',
+  `watermark` char(40) DEFAULT NULL,
+  `rows_written` int NOT NULL DEFAULT '0',
+  `rows_total` int DEFAULT NULL,
+  `file_name` varchar(255) DEFAULT NULL,
+  `file_size` bigint DEFAULT NULL,
+  `attempts` int NOT NULL DEFAULT '0',
+  `locked_by` varchar(100) DEFAULT NULL,
+  `locked_at` timestamp NULL DEFAULT NULL,
+  `error` text,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `started_at` timestamp NULL DEFAULT NULL,
+  `finished_at` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `idx_export_status` (`status`,`id`),
+  KEY `idx_export_cache` (`report_type`,`start_date`,`end_date`,`compress`,`watermark`),
+  KEY `idx_export_finished` (`finished_at`),
+  KEY `export_jobs_user_fk` (`requested_by`),
+  CONSTRAINT `export_jobs_user_fk` FOREIGN KEY (`requested_by`) REFERENCES `users` (`id`) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Data exporting was unselected.
+
 -- Dumping structure for table pnpsanjuan_db.leave_applications
 CREATE TABLE IF NOT EXISTS `leave_applications` (
   `id` int NOT NULL AUTO_INCREMENT,
@@ -259,10 +365,15 @@ CREATE TABLE IF NOT EXISTS `leave_applications` (
   `reason` text NOT NULL,
   `status` enum('Pending','Approved','Rejected') DEFAULT 'Pending',
   `remarks` text,
-  `applied_date` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  `applied_date` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
   `reviewed_date` timestamp NULL DEFAULT NULL,
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (`id`),
   KEY `employee_id` (`employee_id`),
+  KEY `idx_leave_employee_status_start` (`employee_id`,`status`,`start_date`),
+  KEY `idx_leave_status_applied` (`status`,`applied_date`),
+  KEY `idx_leave_applied` (`applied_date`),
+  KEY `idx_leave_updated` (`updated_at`),
   CONSTRAINT `leave_applications_ibfk_1` FOREIGN KEY (`employee_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB AUTO_INCREMENT=7 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
@@ -281,6 +392,8 @@ CREATE TABLE IF NOT EXISTS `notifications` (
   PRIMARY KEY (`id`),
   KEY `idx_user_read` (`user_id`,`is_read`),
   KEY `idx_created_at` (`created_at` DESC),
+  KEY `idx_user_created` (`user_id`,`created_at`),
+  KEY `idx_notifications_user_id` (`user_id`,`id`),
   CONSTRAINT `notifications_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB AUTO_INCREMENT=39 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
@@ -302,6 +415,58 @@ CREATE TABLE IF NOT EXISTS `otp_codes` (
 
 -- Data exporting was unselected.
 
+-- Dumping structure for table pnpsanjuan_db.rate_limit_buckets
+CREATE TABLE IF NOT EXISTS `rate_limit_buckets` (
+  `bucket_key` varchar(191) NOT NULL,
+  `tokens` double NOT NULL,
+  `allowed` tinyint(1) NOT NULL DEFAULT '1',
+  `updated_at` timestamp(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+  PRIMARY KEY (`bucket_key`),
+  KEY `idx_rate_limit_updated` (`updated_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Data exporting was unselected.
+
+-- Dumping structure for table pnpsanjuan_db.schema_migrations
+CREATE TABLE IF NOT EXISTS `schema_migrations` (
+  `version` int NOT NULL,
+  `name` varchar(255) NOT NULL,
+  `applied_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`version`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Dumping data for table pnpsanjuan_db.schema_migrations: ~16 rows (approximately)
+-- Every migration below is already reflected in this file, so `flask db migrate`
+-- only runs the ones added after it
+INSERT IGNORE INTO `schema_migrations` (`version`, `name`) VALUES
+	(1, 'baseline schema'),
+	(2, 'reconcile columns missing from databases created by init_db'),
+	(3, 'hot-path composite indexes'),
+	(4, 'keyset pagination sort indexes'),
+	(5, 'persisted applicant display sequence (YY-NNN) with backfill'),
+	(6, 'per-year applicant ID sequence'),
+	(7, 'materialized dashboard counters'),
+	(8, 'denormalized per-user unread notification counter'),
+	(9, 'notification list validator index'),
+	(10, 'durable email outbox'),
+	(11, 'shared email provider circuit breakers'),
+	(12, 'token buckets for login, registration and OTP throttling'),
+	(13, 'background export jobs and data watermarks'),
+	(14, 'date-range indexes for custom exports'),
+	(15, 'per-year counter for applicant display sequences'),
+	(16, 'NOT NULL keyset pagination sort keys');
+
+-- Dumping structure for table pnpsanjuan_db.stats_counters
+CREATE TABLE IF NOT EXISTS `stats_counters` (
+  `entity` varchar(50) NOT NULL,
+  `status` varchar(50) NOT NULL,
+  `value` int NOT NULL DEFAULT '0',
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`entity`,`status`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Data exporting was unselected.
+
 -- Dumping structure for table pnpsanjuan_db.users
 CREATE TABLE IF NOT EXISTS `users` (
   `id` int NOT NULL AUTO_INCREMENT,
@@ -310,12 +475,17 @@ CREATE TABLE IF NOT EXISTS `users` (
   `password` varchar(255) NOT NULL,
   `role` enum('admin','employee','applicant') NOT NULL DEFAULT 'applicant',
   `status` enum('active','inactive','suspended') NOT NULL DEFAULT 'active',
-  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
   `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   `two_factor_enabled` tinyint(1) DEFAULT '1',
+  `applicant_seq` int DEFAULT NULL COMMENT 'Per-year applicant sequence for YY-NNN display IDs',
+  `unread_notifications` int NOT NULL DEFAULT '0' COMMENT 'Denormalized count of unread notifications',
   PRIMARY KEY (`id`),
   UNIQUE KEY `username` (`username`),
-  UNIQUE KEY `email` (`email`)
+  UNIQUE KEY `email` (`email`),
+  KEY `idx_users_role_created` (`role`,`created_at`),
+  KEY `idx_users_updated` (`updated_at`),
+  KEY `idx_users_created` (`created_at`)
 ) ENGINE=InnoDB AUTO_INCREMENT=26 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
 -- Data exporting was unselected.
@@ -0,0 +1,210 @@
+"""
+Database connection pooling for PNP San Juan
+Hands out one pooled MySQL connection per request/app context via flask.g
+"""
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from flask import g, has_app_context
+
+from config import DB_CONFIG, DB_POOL_CONFIG
+from query_stats import InstrumentedCursor, current_stats
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+
+class ConnectionPool:
+    """
+    Small thread-safe MySQL connection pool
+
+    Connections are opened lazily up to `size`. Idle connections are pinged
+    (and reconnected) before being handed out again once they have been idle
+    longer than `ping_interval`, and are recycled after `recycle` seconds.
+    """
+
+    def __init__(self, size=5, timeout=10, recycle=1800, ping_interval=30, **config):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self._config = config
+        self._idle = deque()
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'created': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'reconnects': 0,
+            'recycled': 0,
+            'discarded': 0,
+        }
+
+    def _count(self, name):
+        # Called from acquire()'s unlocked connect/revive path; += on a dict isn't atomic
+        with self._cond:
+            self._stats[name] += 1
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self._config)
+        self._count('created')
+        return {'conn': conn, 'created_at': time.monotonic(), 'last_used': time.monotonic()}
+
+    def acquire(self):
+        """Check out a live connection, blocking up to `timeout` seconds"""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while not self._idle and self._in_use >= self.size:
+                self._stats['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle and self._in_use >= self.size:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f'No database connection available after {self.timeout}s')
+            entry = self._idle.pop() if self._idle else None
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+
+        try:
+            if entry is None:
+                entry = self._connect()
+            else:
+                entry = self._revive(entry)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return entry
+
+    def _revive(self, entry):
+        """Recycle or pre-ping an idle connection before reuse"""
+        now = time.monotonic()
+        if self.recycle and now - entry['created_at'] > self.recycle:
+            self._count('recycled')
+            self._close_quietly(entry['conn'])
+            return self._connect()
+
+        if now - entry['last_used'] > self.ping_interval:
+            try:
+                entry['conn'].ping(reconnect=False)
+            except mysql.connector.Error:
+                self._count('reconnects')
+                try:
+                    entry['conn'].reconnect(attempts=2, delay=0)
+                    entry['created_at'] = time.monotonic()
+                except mysql.connector.Error:
+                    self._close_quietly(entry['conn'])
+                    return self._connect()
+        return entry
+
+    def release(self, entry, discard=False):
+        """Return a checked-out connection, rolling back any open transaction"""
+        conn = entry['conn']
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except mysql.connector.Error:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._stats['discarded'] += 1
+            else:
+                entry['last_used'] = time.monotonic()
+                self._idle.append(entry)
+            self._cond.notify()
+
+        if discard:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """Return a snapshot of pool usage counters"""
+        with self._cond:
+            return dict(self._stats,
+                        size=self.size,
+                        in_use=self._in_use,
+                        idle=len(self._idle))
+
+    def close_all(self):
+        """Close every idle connection (used at process shutdown / after fork)"""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for entry in idle:
+            self._close_quietly(entry['conn'])
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class RequestConnection:
+    """
+    Request-scoped handle around a pooled connection
+
+    Routes keep calling conn.close() as before; the real connection is only
+    returned to the pool when the app context is torn down.
+    """
+
+    def __init__(self, entry):
+        self._entry = entry
+
+    @property
+    def raw(self):
+        return self._entry['conn']
+
+    def cursor(self, *args, **kwargs):
+        cursor = self.raw.cursor(*args, **kwargs)
+        stats = current_stats()
+        return InstrumentedCursor(cursor, stats) if stats is not None else cursor
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._entry['conn'], name)
+
+
+pool = ConnectionPool(**DB_POOL_CONFIG, **DB_CONFIG)
+
+
+def get_db():
+    """Get the connection for the current app context, checking one out on first use"""
+    if not has_app_context():
+        raise RuntimeError('get_db() needs an app context; use pooled_connection() outside requests')
+    if 'db' not in g:
+        g.db = RequestConnection(pool.acquire())
+    return g.db
+
+
+def close_db(exc=None):
+    """Teardown handler: hand the request's connection back to the pool"""
+    db = g.pop('db', None)
+    if db is not None:
+        pool.release(db._entry, discard=isinstance(exc, mysql.connector.errors.OperationalError))
+
+
+class pooled_connection:
+    """Context manager for code running outside an app context (scripts, workers)"""
+
+    def __enter__(self):
+        self._entry = pool.acquire()
+        return self._entry['conn']
+
+    def __exit__(self, exc_type, exc, tb):
+        pool.release(self._entry)
+        return False
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
@@ -0,0 +1,202 @@
+"""
+Durable email outbox
+Request handlers only INSERT a row into email_outbox; email_worker.py
+delivers queued rows in the background with retries, exponential backoff
+and dead-lettering, and the verify-OTP page polls the row's status.
+"""
+import json
+import random
+
+from config import EMAIL_OUTBOX_CONFIG
+from db import get_db
+
+# queued -> sending -> sent, or back to queued (retry) until max_attempts -> dead
+QUEUED = 'queued'
+SENDING = 'sending'
+SENT = 'sent'
+DEAD = 'dead'
+
+
+def enqueue(cursor, kind, recipient, payload, user_id=None):
+    """Queue one email in the caller's transaction; returns the outbox id"""
+    cursor.execute('''
+        INSERT INTO email_outbox (kind, user_id, recipient, payload)
+        VALUES (%s, %s, %s, %s)
+    ''', (kind, user_id, recipient, json.dumps(payload)))
+    return cursor.lastrowid
+
+
+def queue_otp_email(user_id, recipient, otp_code, username):
+    """
+    Queue an OTP email from a request handler
+
+    Returns:
+        The outbox id, or None if the row could not be written
+    """
+    try:
+        conn = get_db()
+        cursor = conn.cursor()
+        email_id = enqueue(cursor, 'otp', recipient,
+                           {'otp_code': otp_code, 'username': username}, user_id)
+        conn.commit()
+        cursor.close()
+        return email_id
+    except Exception as e:
+        print(f"Error queueing email: {str(e)}")
+        return None
+
+
+def queue_status_emails(cursor, user_ids, status, notes=''):
+    """
+    Queue one bulk application-status email for many applicants
+
+    Runs in the caller's transaction on a dictionary cursor. The worker
+    delivers the whole list with batched provider calls (see bulk_email.py).
+
+    Returns:
+        The outbox id, or None if none of the applicants has an email address
+    """
+    if not user_ids:
+        return None
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    cursor.execute(f'''
+        SELECT u.id, COALESCE(NULLIF(ap.email, ''), u.email) AS email,
+               COALESCE(NULLIF(ap.first_name, ''), u.username) AS name
+        FROM users u
+        LEFT JOIN applicant_profiles ap ON ap.user_id = u.id
+        WHERE u.id IN ({placeholders})
+    ''', tuple(user_ids))
+    recipients = [{'email': row['email'], 'name': row['name']}
+                  for row in cursor.fetchall() if row['email']]
+    if not recipients:
+        return None
+
+    single = len(recipients) == 1
+    return enqueue(cursor, 'applicant_status',
+                   recipients[0]['email'] if single else f'{len(recipients)} applicants',
+                   {'status': status, 'notes': notes, 'recipients': recipients},
+                   user_ids[0] if single and len(user_ids) == 1 else None)
+
+
+def delivery_status(cursor, email_id, user_id):
+    """Status row for one of the user's queued emails, or None"""
+    cursor.execute('''
+        SELECT status, attempts, sent_at
+        FROM email_outbox
+        WHERE id = %s AND user_id = %s
+    ''', (email_id, user_id))
+    return cursor.fetchone()
+
+
+def backoff_seconds(attempts):
+    """Exponential backoff with +/-20% jitter so retries don't stampede"""
+    delay = min(EMAIL_OUTBOX_CONFIG['backoff_base'] * 2 ** max(attempts - 1, 0),
+                EMAIL_OUTBOX_CONFIG['backoff_max'])
+    return int(delay * random.uniform(0.8, 1.2))
+
+
+def claim(conn, worker_id, limit):
+    """
+    Lock up to `limit` due rows for this worker
+
+    Rows left in 'sending' by a crashed worker are reclaimed after
+    `stale_after` seconds. SKIP LOCKED lets several workers claim in parallel.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute('''
+            SELECT id FROM email_outbox
+            WHERE (status = %s AND next_attempt_at <= NOW())
+               OR (status = %s AND locked_at < NOW() - INTERVAL %s SECOND)
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        ''', (QUEUED, SENDING, EMAIL_OUTBOX_CONFIG['stale_after'], limit))
+        ids = [row['id'] for row in cursor.fetchall()]
+        if not ids:
+            conn.commit()
+            return []
+
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f'''
+            UPDATE email_outbox
+            SET status = %s, locked_by = %s, locked_at = NOW(), attempts = attempts + 1
+            WHERE id IN ({placeholders})
+        ''', (SENDING, worker_id, *ids))
+        cursor.execute(f'''
+            SELECT id, kind, user_id, recipient, payload, attempts
+            FROM email_outbox
+            WHERE id IN ({placeholders})
+            ORDER BY id
+        ''', tuple(ids))
+        rows = cursor.fetchall()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    for row in rows:
+        row['payload'] = json.loads(row['payload']) if row['payload'] else {}
+    return rows
+
+
+def mark_sent(conn, email_id):
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE email_outbox
+        SET status = %s, sent_at = NOW(), locked_by = NULL, locked_at = NULL, last_error = NULL
+        WHERE id = %s
+    ''', (SENT, email_id))
+    conn.commit()
+    cursor.close()
+
+
+def save_progress(conn, email_id, payload):
+    """Persist what is left of a bulk email and refresh its lock so it isn't reclaimed mid-send"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE email_outbox
+        SET payload = %s, locked_at = NOW()
+        WHERE id = %s
+    ''', (json.dumps(payload), email_id))
+    conn.commit()
+    cursor.close()
+
+
+def defer(conn, email_id, delay):
+    """Requeue a claimed row without spending an attempt (no provider was tried)"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE email_outbox
+        SET status = %s, locked_by = NULL, locked_at = NULL,
+            attempts = GREATEST(attempts - 1, 0),
+            next_attempt_at = NOW() + INTERVAL %s SECOND
+        WHERE id = %s
+    ''', (QUEUED, delay, email_id))
+    conn.commit()
+    cursor.close()
+
+
+def mark_failed(conn, email_id, attempts, error):
+    """Schedule a retry, or dead-letter the row once max_attempts is reached"""
+    cursor = conn.cursor()
+    if attempts >= EMAIL_OUTBOX_CONFIG['max_attempts']:
+        cursor.execute('''
+            UPDATE email_outbox
+            SET status = %s, locked_by = NULL, locked_at = NULL, last_error = %s
+            WHERE id = %s
+        ''', (DEAD, error[:1000], email_id))
+        dead = True
+    else:
+        cursor.execute('''
+            UPDATE email_outbox
+            SET status = %s, locked_by = NULL, locked_at = NULL, last_error = %s,
+                next_attempt_at = NOW() + INTERVAL %s SECOND
+            WHERE id = %s
+        ''', (QUEUED, error[:1000], backoff_seconds(attempts), email_id))
+        dead = False
+    conn.commit()
+    cursor.close()
+    return dead
@@ -5,15 +5,20 @@ Supports both Gmail SMTP and SendGrid API
 import smtplib
 import random
 import string
+import threading
+import time
+from collections import deque
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
-from config import SMTP_CONFIG, OTP_EXPIRY_MINUTES, OTP_LENGTH
-import mysql.connector
-from config import DB_CONFIG
+from config import SMTP_CONFIG, SMTP_POOL_CONFIG, OTP_EXPIRY_MINUTES, OTP_LENGTH
+from provider_health import health as provider_health
 import os
 
 
+class ProvidersUnavailable(Exception):
+    """Every configured provider's circuit is open; retry after the cooldown"""
+
+
 def generate_otp(length=OTP_LENGTH):
     """Generate a random OTP code"""
     return ''.join(random.choices(string.digits, k=length))
@@ -28,8 +33,13 @@ def send_otp_email(recipient_email, otp_code, username):
         otp_code: The OTP code to send
         username: User's username
     
+    Providers whose circuit is open are skipped without a network call.
+    
     Returns:
         Boolean indicating success
+    
+    Raises:
+        ProvidersUnavailable: no provider could be tried at all
     """
     print(f"🔧 DEBUG send_otp_email called with:")
     print(f"   Email: {recipient_email}")
@@ -43,16 +53,31 @@ def send_otp_email(recipient_email, otp_code, username):
     
     # Try SendGrid first if API key is available
     sendgrid_api_key = os.getenv('SENDGRID_API_KEY')
+    attempted = False
     if sendgrid_api_key:
-        success = send_via_sendgrid(recipient_email, otp_code, username, sendgrid_api_key)
-        if success:
-            return True
-        print("⚠️ SendGrid failed, trying SMTP...")
+        if provider_health.allow('sendgrid'):
+            attempted = True
+            success = send_via_sendgrid(recipient_email, otp_code, username, sendgrid_api_key)
+            provider_health.record('sendgrid', success, None if success else 'OTP send failed')
+            if success:
+                return True
+            print("⚠️ SendGrid failed, trying SMTP...")
+        else:
+            print("⚠️ SendGrid circuit open, trying SMTP...")
     
     # Try SMTP as fallback
-    print("🔧 DEBUG: Calling send_via_smtp...")
-    success = send_via_smtp(recipient_email, otp_code, username)
-    print(f"🔧 DEBUG: send_via_smtp returned: {success}")
+    if provider_health.allow('smtp'):
+        attempted = True
+        print("🔧 DEBUG: Calling send_via_smtp...")
+        success = send_via_smtp(recipient_email, otp_code, username)
+        provider_health.record('smtp', success, None if success else 'OTP send failed')
+        print(f"🔧 DEBUG: send_via_smtp returned: {success}")
+    else:
+        print("⚠️ SMTP circuit open")
+        success = False
+    
+    if not attempted:
+        raise ProvidersUnavailable('All email provider circuits are open')
     
     # In production, if both fail, log OTP for manual verification
     if not success and is_production:
@@ -65,6 +90,126 @@ def send_otp_email(recipient_email, otp_code, username):
     return success
 
 
+class SMTPSessionPool:
+    """
+    Small pool of authenticated SMTP sessions reused across sends
+
+    STARTTLS and login happen once per session instead of once per email.
+    Sessions idle longer than `noop_interval` are checked with NOOP before
+    reuse, and are closed after `max_messages` sends or `max_idle` seconds.
+    A send that hits a dropped connection is retried once on a fresh session.
+    """
+
+    def __init__(self, size=2, max_messages=100, noop_interval=10, max_idle=240, timeout=10):
+        self.size = size
+        self.max_messages = max_messages
+        self.noop_interval = noop_interval
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        server = smtplib.SMTP(SMTP_CONFIG['server'], SMTP_CONFIG['port'], timeout=self.timeout)
+        if SMTP_CONFIG['use_tls']:
+            server.starttls()
+        if SMTP_CONFIG['use_auth']:
+            server.login(SMTP_CONFIG['username'], SMTP_CONFIG['password'])
+        now = time.monotonic()
+        return {'server': server, 'last_used': now, 'sent': 0}
+
+    def _usable(self, entry):
+        idle = time.monotonic() - entry['last_used']
+        if idle > self.max_idle:
+            return False
+        if idle > self.noop_interval:
+            try:
+                return entry['server'].noop()[0] == 250
+            except (smtplib.SMTPException, OSError):
+                return False
+        return True
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise smtplib.SMTPException('No SMTP session available')
+        try:
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    return self._connect()
+                if self._usable(entry):
+                    return entry
+                self._close(entry)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, entry, broken=False):
+        if broken or entry['sent'] >= self.max_messages:
+            self._close(entry)
+        else:
+            entry['last_used'] = time.monotonic()
+            with self._lock:
+                self._idle.append(entry)
+        self._slots.release()
+
+    @staticmethod
+    def _close(entry):
+        try:
+            entry['server'].quit()
+        except Exception:
+            try:
+                entry['server'].close()
+            except Exception:
+                pass
+
+    def send(self, msg):
+        """Send one message, reconnecting once if the server dropped the session"""
+        for attempt in range(2):
+            entry = self._acquire()
+            try:
+                entry['server'].send_message(msg)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPSenderRefused, OSError):
+                self._release(entry, broken=True)
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                self._release(entry, broken=True)
+                raise
+            entry['sent'] += 1
+            self._release(entry)
+            return
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for entry in idle:
+            self._close(entry)
+
+
+smtp_pool = SMTPSessionPool(**SMTP_POOL_CONFIG)
+
+SENDGRID_URL = "https://api.sendgrid.com/v3/mail/send"
+_sendgrid_session = None
+_sendgrid_lock = threading.Lock()
+
+
+def sendgrid_session():
+    """Process-wide keep-alive session for the SendGrid API (one TLS handshake, reused)"""
+    global _sendgrid_session
+    with _sendgrid_lock:
+        if _sendgrid_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=8))
+            _sendgrid_session = session
+        return _sendgrid_session
+
+
 def send_via_smtp(recipient_email, otp_code, username):
     """
     Send OTP via traditional SMTP (Gmail)
@@ -132,21 +277,10 @@ PNP San Juan Team
         msg.attach(part1)
         msg.attach(part2)
         
-        print(f"🔧 DEBUG: Connecting to SMTP {SMTP_CONFIG['server']}:{SMTP_CONFIG['port']}")
-        
-        # Connect to SMTP server with timeout
-        server = smtplib.SMTP(SMTP_CONFIG['server'], SMTP_CONFIG['port'], timeout=10)
-        print(f"🔧 DEBUG: SMTP connection established, starting TLS...")
+        print(f"🔧 DEBUG: Sending via pooled SMTP session to {SMTP_CONFIG['server']}:{SMTP_CONFIG['port']}")
         
-        server.starttls()  # Enable TLS encryption
-        print(f"🔧 DEBUG: TLS enabled, logging in...")
-        
-        server.login(SMTP_CONFIG['username'], SMTP_CONFIG['password'])
-        print(f"🔧 DEBUG: Login successful, sending message...")
-        
-        # Send email
-        server.send_message(msg)
-        server.quit()
+        # Reuses an authenticated session (STARTTLS + login only on first use)
+        smtp_pool.send(msg)
         
         print(f"✓ Email sent successfully via SMTP to {recipient_email}")
         return True
@@ -164,8 +298,6 @@ def send_via_sendgrid(recipient_email, otp_code, username, api_key):
     Send OTP via SendGrid API (works on Railway)
     """
     try:
-        import requests
-        
         # Generate HTML content (using + for concatenation to avoid f-string escaping issues)
         html_content = """
 <!DOCTYPE html>
@@ -214,7 +346,6 @@ PNP San Juan Team
         """
         
         # SendGrid API request
-        url = "https://api.sendgrid.com/v3/mail/send"
         headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
@@ -243,7 +374,7 @@ PNP San Juan Team
             ]
         }
         
-        response = requests.post(url, headers=headers, json=data, timeout=10)
+        response = sendgrid_session().post(SENDGRID_URL, headers=headers, json=data, timeout=10)
         
         if response.status_code == 202:
             print(f"✓ Email sent successfully via SendGrid to {recipient_email}")
@@ -255,105 +386,3 @@ PNP San Juan Team
     except Exception as e:
         print(f"✗ Error sending email via SendGrid: {str(e)}")
         return False
-
-
-def store_otp(user_id, otp_code):
-    """
-    Store OTP code in database
-    
-    Args:
-        user_id: User's ID
-        otp_code: The OTP code to store
-    
-    Returns:
-        Boolean indicating success
-    """
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        
-        # Delete any existing unused OTPs for this user
-        cursor.execute('DELETE FROM otp_codes WHERE user_id = %s AND is_used = FALSE', (user_id,))
-        
-        # Calculate expiry time
-        expires_at = datetime.now() + timedelta(minutes=OTP_EXPIRY_MINUTES)
-        
-        # Insert new OTP
-        cursor.execute(
-            'INSERT INTO otp_codes (user_id, code, expires_at) VALUES (%s, %s, %s)',
-            (user_id, otp_code, expires_at)
-        )
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        return True
-        
-    except Exception as e:
-        print(f"Error storing OTP: {str(e)}")
-        return False
-
-
-def verify_otp(user_id, otp_code):
-    """
-    Verify OTP code
-    
-    Args:
-        user_id: User's ID
-        otp_code: The OTP code to verify
-    
-    Returns:
-        Boolean indicating if OTP is valid
-    """
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor(dictionary=True)
-        
-        # Find valid OTP
-        cursor.execute('''
-            SELECT * FROM otp_codes 
-            WHERE user_id = %s 
-            AND code = %s 
-            AND is_used = FALSE 
-            AND expires_at > NOW()
-            ORDER BY created_at DESC 
-            LIMIT 1
-        ''', (user_id, otp_code))
-        
-        otp_record = cursor.fetchone()
-        
-        if otp_record:
-            # Mark OTP as used
-            cursor.execute(
-                'UPDATE otp_codes SET is_used = TRUE WHERE id = %s',
-                (otp_record['id'],)
-            )
-            conn.commit()
-            cursor.close()
-            conn.close()
-            return True
-        
-        cursor.close()
-        conn.close()
-        return False
-        
-    except Exception as e:
-        print(f"Error verifying OTP: {str(e)}")
-        return False
-
-
-def cleanup_expired_otps():
-    """Remove expired OTP codes from database"""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM otp_codes WHERE expires_at < NOW()')
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-    except Exception as e:
-        print(f"Error cleaning up OTPs: {str(e)}")
@@ -0,0 +1,151 @@
+"""
+Background email sender for PNP San Juan
+Delivers rows queued in email_outbox with a small thread pool, and builds
+queued report exports (export_jobs.py) on a thread of its own.
+Run with: python email_worker.py   (Procfile `worker` process)
+"""
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import EMAIL_OUTBOX_CONFIG, EXPORT_JOBS_CONFIG, MAINTENANCE_CONFIG, PROVIDER_HEALTH_CONFIG
+from db import pooled_connection, pool
+import email_outbox
+from export_jobs import ExportRunner
+from maintenance import MaintenanceRunner
+from email_utils import ProvidersUnavailable, send_otp_email, smtp_pool
+from bulk_email import send_bulk, status_email
+
+
+def deliver_otp(row):
+    payload = row['payload']
+    return send_otp_email(row['recipient'], payload['otp_code'], payload['username'])
+
+
+def deliver_applicant_status(row):
+    """
+    One status message to every recipient in the row
+
+    Delivered recipients are dropped from the stored payload after each
+    batch, so a retry only resends to the ones still outstanding.
+    """
+    payload = row['payload']
+    subject, text_content, html_content = status_email(payload['status'], payload.get('notes'))
+
+    def checkpoint(remaining):
+        payload['recipients'] = remaining
+        with pooled_connection() as conn:
+            email_outbox.save_progress(conn, row['id'], payload)
+
+    undelivered = send_bulk(payload['recipients'], subject, text_content, html_content,
+                            on_progress=checkpoint)
+    return not undelivered
+
+
+DELIVERERS = {
+    'otp': deliver_otp,
+    'applicant_status': deliver_applicant_status,
+}
+
+
+class EmailWorker:
+    def __init__(self, threads, batch_size, poll_interval):
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='email')
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def stop(self, *_):
+        print("Email worker stopping after in-flight deliveries...")
+        self.stopping.set()
+
+    def run(self):
+        print(f"✓ Email worker {self.worker_id} started")
+        while not self.stopping.is_set():
+            with self.lock:
+                free = self.threads - self.in_flight
+            if not free:
+                time.sleep(0.1)
+                continue
+            try:
+                with pooled_connection() as conn:
+                    rows = email_outbox.claim(conn, self.worker_id, min(free, self.batch_size))
+            except Exception as e:
+                print(f"✗ Error claiming emails: {str(e)}")
+                rows = []
+            if not rows:
+                self.stopping.wait(self.poll_interval)
+                continue
+            with self.lock:
+                self.in_flight += len(rows)
+            for row in rows:
+                self.executor.submit(self._process, row)
+        self.executor.shutdown(wait=True)
+        smtp_pool.close_all()
+        pool.close_all()
+
+    def _process(self, row):
+        try:
+            deliver = DELIVERERS.get(row['kind'])
+            if deliver is None:
+                ok, error = False, f"Unknown email kind: {row['kind']}"
+            else:
+                try:
+                    ok, error = bool(deliver(row)), 'All email providers failed'
+                except ProvidersUnavailable:
+                    # Circuits are open: wait for the next probe instead of burning retries
+                    with pooled_connection() as conn:
+                        email_outbox.defer(conn, row['id'], PROVIDER_HEALTH_CONFIG['open_seconds'])
+                    return
+                except Exception as e:
+                    ok, error = False, f'{type(e).__name__}: {e}'
+
+            with pooled_connection() as conn:
+                if ok:
+                    email_outbox.mark_sent(conn, row['id'])
+                elif email_outbox.mark_failed(conn, row['id'], row['attempts'], error):
+                    print(f"✗ Email {row['id']} to {row['recipient']} dead-lettered after "
+                          f"{row['attempts']} attempts: {error}")
+        except Exception as e:
+            print(f"✗ Error processing email {row['id']}: {str(e)}")
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def main():
+    worker = EmailWorker(threads=EMAIL_OUTBOX_CONFIG['threads'],
+                         batch_size=EMAIL_OUTBOX_CONFIG['batch_size'],
+                         poll_interval=EMAIL_OUTBOX_CONFIG['poll_interval'])
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+
+    # Purges run here rather than in the web workers; one leader across all worker processes
+    runner = None
+    if MAINTENANCE_CONFIG['enabled']:
+        runner = MaintenanceRunner(interval=MAINTENANCE_CONFIG['interval'])
+        runner.start()
+    exporter = None
+    if EXPORT_JOBS_CONFIG['enabled']:
+        exporter = ExportRunner(poll_interval=EXPORT_JOBS_CONFIG['poll_interval'])
+        exporter.start()
+    worker.run()
+    if exporter is not None:
+        exporter.stop()
+    if runner is not None:
+        runner.stop()
+
+
+if __name__ == '__main__':
+    main()
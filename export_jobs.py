@@ -0,0 +1,441 @@
+"""
+Background report exports
+A custom date-range export can outrun gunicorn's worker timeout, so
+export_custom only queues a row in export_jobs and returns. The email
+worker builds the CSV into EXPORT_DIR, recording progress as it goes, and
+the reports page links the file once it's done.
+
+A finished file is reused by any later request for the same report, date
+range and data watermark, so the same export asked for twice only queries
+the database once.
+
+Build queued jobs by hand: flask --app app db build-exports
+"""
+import hashlib
+import os
+import socket
+import threading
+import time
+
+import click
+
+from config import EXPORT_CONFIG, EXPORT_JOBS_CONFIG, MAINTENANCE_CONFIG
+from db import pool, pooled_connection
+from exports import CUSTOM_REPORTS, custom_filename, encode_csv
+from parallel_export import write_partitioned
+
+# queued -> running -> done | failed; a build left running by a dead worker is reclaimed
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Tables each custom report reads. Profile rows are only deleted along with
+# their user, so the stats_counters totals of the others see every delete.
+SOURCE_TABLES = {
+    'users': ['users', 'employee_profiles', 'applicant_profiles', 'admin_profiles'],
+    'deployments': ['deployments', 'employee_profiles'],
+    'applicants': ['users', 'applicant_profiles'],
+    'leaves': ['leave_applications', 'employee_profiles'],
+}
+
+JOB_COLUMNS = '''id, report_type, start_date, end_date, compress, status, rows_written, rows_total,
+                 file_name, file_size, error, created_at, finished_at'''
+
+
+class Interrupted(Exception):
+    """The worker is shutting down mid-build; the job goes back to the queue"""
+
+
+def export_dir():
+    return os.path.abspath(EXPORT_JOBS_CONFIG['directory'])
+
+
+def file_path(job):
+    return os.path.join(export_dir(), job['file_name'])
+
+
+def download_name(job):
+    """Filename offered to the browser (stored files carry the job id as a prefix)"""
+    return job['file_name'].split('_', 1)[1]
+
+
+def data_watermark(conn, report_type):
+    """
+    Version of the data a report reads, or None while it is still changing
+
+    The newest updated_at across the report's tables (one index dive each)
+    plus their stats_counters totals, which move on deletes. updated_at has
+    one-second resolution, so data written in the last couple of seconds
+    gets no watermark and exports of it are never reused.
+    """
+    tables = SOURCE_TABLES[report_type]
+    cursor = conn.cursor()
+    newest = ' UNION ALL '.join(f'SELECT MAX(updated_at) AS ts FROM `{table}`' for table in tables)
+    cursor.execute(f'SELECT MAX(ts), MAX(ts) >= NOW() - INTERVAL 2 SECOND FROM ({newest}) AS newest')
+    latest, hot = cursor.fetchone()
+    placeholders = ', '.join(['%s'] * len(tables))
+    cursor.execute(f'''
+        SELECT entity, SUM(value) FROM stats_counters
+        WHERE entity IN ({placeholders})
+        GROUP BY entity
+        ORDER BY entity
+    ''', tuple(tables))
+    totals = [(entity, int(value)) for entity, value in cursor.fetchall()]
+    cursor.close()
+    if hot:
+        return None
+    return hashlib.sha1(repr((report_type, str(latest), totals)).encode()).hexdigest()
+
+
+def request_export(conn, report_type, start_date, end_date, compress, user_id):
+    """
+    Job that answers an export request
+
+    An identical job that hasn't started yet, or one built from the current
+    data (running or done), is handed back instead of queueing another.
+
+    Returns:
+        (job_id, status)
+    """
+    watermark = data_watermark(conn, report_type)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute('''
+        SELECT id, status, file_name FROM export_jobs
+        WHERE report_type = %s AND start_date = %s AND end_date = %s AND compress = %s
+          AND (status = %s OR (status IN (%s, %s) AND watermark = %s))
+        ORDER BY id DESC
+        LIMIT 1
+    ''', (report_type, start_date, end_date, compress, QUEUED, RUNNING, DONE, watermark))
+    job = cursor.fetchone()
+    if job is not None and (job['status'] != DONE or os.path.exists(file_path(job))):
+        cursor.close()
+        return job['id'], job['status']
+
+    cursor.execute('''
+        INSERT INTO export_jobs (report_type, start_date, end_date, compress, requested_by)
+        VALUES (%s, %s, %s, %s, %s)
+    ''', (report_type, start_date, end_date, compress, user_id))
+    job_id = cursor.lastrowid
+    conn.commit()
+    cursor.close()
+    return job_id, QUEUED
+
+
+def get_job(cursor, job_id):
+    cursor.execute(f'SELECT {JOB_COLUMNS} FROM export_jobs WHERE id = %s', (job_id,))
+    return cursor.fetchone()
+
+
+def recent_jobs(cursor, limit=10):
+    cursor.execute(f'SELECT {JOB_COLUMNS} FROM export_jobs ORDER BY id DESC LIMIT %s', (limit,))
+    return cursor.fetchall()
+
+
+def job_summary(job):
+    """JSON-friendly view of a job row for the reports page"""
+    total = job['rows_total']
+    if job['status'] == DONE:
+        percent = 100
+    elif total:
+        percent = min(int(job['rows_written'] * 100 / total), 99)
+    else:
+        percent = 0
+    return {
+        'id': job['id'],
+        'status': job['status'],
+        'rows_written': job['rows_written'],
+        'rows_total': total,
+        'percent': percent,
+        'file_size': job['file_size'],
+        'error': job['error'],
+    }
+
+
+def claim(conn, worker_id):
+    """
+    Lock the oldest queued job for this worker
+
+    A job left running by a dead worker is reclaimed once its heartbeat is
+    `stale_after` seconds old, or failed if it has used up max_attempts.
+    SKIP LOCKED lets several worker processes claim in parallel.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute('''
+            UPDATE export_jobs
+            SET status = %s, locked_by = NULL, locked_at = NULL, finished_at = NOW(),
+                error = 'The export worker stopped during the build'
+            WHERE status = %s AND locked_at < NOW() - INTERVAL %s SECOND AND attempts >= %s
+        ''', (FAILED, RUNNING, EXPORT_JOBS_CONFIG['stale_after'], EXPORT_JOBS_CONFIG['max_attempts']))
+        cursor.execute('''
+            SELECT id FROM export_jobs
+            WHERE status = %s
+               OR (status = %s AND locked_at < NOW() - INTERVAL %s SECOND)
+            ORDER BY id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        ''', (QUEUED, RUNNING, EXPORT_JOBS_CONFIG['stale_after']))
+        row = cursor.fetchone()
+        if row is None:
+            conn.commit()
+            return None
+
+        cursor.execute('''
+            UPDATE export_jobs
+            SET status = %s, locked_by = %s, locked_at = NOW(), started_at = NOW(),
+                attempts = attempts + 1, rows_written = 0, error = NULL
+            WHERE id = %s
+        ''', (RUNNING, worker_id, row['id']))
+        cursor.execute('''
+            SELECT id, report_type, start_date, end_date, compress, attempts
+            FROM export_jobs
+            WHERE id = %s
+        ''', (row['id'],))
+        job = cursor.fetchone()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return job
+
+
+def save_progress(conn, job_id, rows_written):
+    """Record progress and refresh the job's lock so it isn't reclaimed mid-build"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE export_jobs
+        SET rows_written = %s, locked_at = NOW()
+        WHERE id = %s
+    ''', (rows_written, job_id))
+    conn.commit()
+    cursor.close()
+
+
+def mark_done(conn, job_id, file_name, rows, size):
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE export_jobs
+        SET status = %s, file_name = %s, rows_written = %s, rows_total = %s, file_size = %s,
+            locked_by = NULL, locked_at = NULL, finished_at = NOW()
+        WHERE id = %s
+    ''', (DONE, file_name, rows, rows, size, job_id))
+    conn.commit()
+    cursor.close()
+
+
+def mark_failed(conn, job_id, error):
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE export_jobs
+        SET status = %s, error = %s, locked_by = NULL, locked_at = NULL, finished_at = NOW()
+        WHERE id = %s
+    ''', (FAILED, error[:1000], job_id))
+    conn.commit()
+    cursor.close()
+
+
+def requeue(conn, job_id):
+    """Put an interrupted job back without spending an attempt"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE export_jobs
+        SET status = %s, locked_by = NULL, locked_at = NULL, rows_written = 0,
+            attempts = GREATEST(attempts - 1, 0)
+        WHERE id = %s
+    ''', (QUEUED, job_id))
+    conn.commit()
+    cursor.close()
+
+
+def _heartbeat(job_id, progress, finished):
+    """Save progress every progress_interval seconds until `finished` is set"""
+    while not finished.wait(EXPORT_JOBS_CONFIG['progress_interval']):
+        try:
+            with pooled_connection() as conn:
+                save_progress(conn, job_id, progress['rows'])
+        except Exception as e:
+            print(f"Export {job_id} progress update failed: {str(e)}")
+
+
+def build(job, stop=None):
+    """
+    Write one job's CSV into the exports directory
+
+    The file is written under a .part name and renamed into place, so a
+    half-built file is never offered for download. Progress is saved by a
+    heartbeat thread, which keeps the job's lock fresh even while MySQL is
+    still working on the first row. Ranges of at least parallel_min_rows
+    go to parallel_export's process pool. Returns (file_name, rows).
+    """
+    report = CUSTOM_REPORTS[job['report_type']]
+    params = (job['start_date'], job['end_date'])
+    file_name = f"{job['id']}_{custom_filename(job['report_type'], job['start_date'], job['end_date'])}"
+    if job['compress']:
+        file_name += '.gz'
+    path = os.path.join(export_dir(), file_name)
+    os.makedirs(export_dir(), exist_ok=True)
+
+    progress = {'rows': 0}
+    finished = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job['id'], progress, finished),
+                                 name=f"export-{job['id']}", daemon=True)
+
+    def on_batch(count):
+        progress['rows'] += count
+        if stop is not None and stop.is_set():
+            raise Interrupted()
+
+    entry = pool.acquire()
+    conn = entry['conn']
+    built = False
+    try:
+        # Read the watermark before the rows, so the file is never older than it claims
+        watermark = data_watermark(conn, job['report_type'])
+        cursor = conn.cursor()
+        cursor.execute(report['count'], params)
+        total, low, high = cursor.fetchone()
+        cursor.execute('UPDATE export_jobs SET watermark = %s, rows_total = %s WHERE id = %s',
+                       (watermark, total, job['id']))
+        conn.commit()
+        heartbeat.start()
+
+        workers = EXPORT_JOBS_CONFIG['parallel_workers']
+        if workers > 1 and total >= EXPORT_JOBS_CONFIG['parallel_min_rows']:
+            write_partitioned(report, params, low, high, path + '.part', bool(job['compress']),
+                              workers=workers, on_rows=on_batch)
+        else:
+            cursor.execute(report['sql'], params)
+            rows = cursor.fetchmany(EXPORT_CONFIG['fetch_size'])
+            with open(path + '.part', 'wb') as f:
+                for chunk in encode_csv(cursor, rows, compress=bool(job['compress']), on_batch=on_batch):
+                    f.write(chunk)
+        cursor.close()
+        os.replace(path + '.part', path)
+        built = True
+    finally:
+        finished.set()
+        # An aborted build leaves unread rows on the connection
+        pool.release(entry, discard=not built)
+        if not built and os.path.exists(path + '.part'):
+            os.remove(path + '.part')
+    return file_name, progress['rows']
+
+
+def run_job(job, stop=None, echo=print):
+    """Build a claimed job and record the outcome"""
+    started = time.monotonic()
+    try:
+        file_name, rows = build(job, stop)
+    except Interrupted:
+        with pooled_connection() as conn:
+            requeue(conn, job['id'])
+        echo(f"⚠️ Export {job['id']} interrupted, requeued")
+        return
+    except Exception as e:
+        echo(f"✗ Export {job['id']} ({job['report_type']}) failed: {str(e)}")
+        with pooled_connection() as conn:
+            mark_failed(conn, job['id'], f'{type(e).__name__}: {e}')
+        return
+
+    size = os.path.getsize(os.path.join(export_dir(), file_name))
+    with pooled_connection() as conn:
+        mark_done(conn, job['id'], file_name, rows, size)
+    echo(f"✓ Export {job['id']} ({job['report_type']}): {rows} rows, {size} bytes "
+         f"in {time.monotonic() - started:.1f}s")
+
+
+def purge_finished(stop=None):
+    """
+    Finished and failed jobs past EXPORT_RETENTION_DAYS, files included
+
+    Runs as the maintenance `exports` task; returns the number of jobs removed.
+    """
+    batch_size = MAINTENANCE_CONFIG['batch_size']
+    total = 0
+    while True:
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute('''
+                SELECT id, file_name FROM export_jobs
+                WHERE finished_at < NOW() - INTERVAL %s DAY
+                ORDER BY finished_at
+                LIMIT %s
+            ''', (EXPORT_JOBS_CONFIG['retention_days'], batch_size))
+            jobs = cursor.fetchall()
+            for job in jobs:
+                if job['file_name']:
+                    try:
+                        os.remove(file_path(job))
+                    except FileNotFoundError:
+                        pass
+            if jobs:
+                placeholders = ', '.join(['%s'] * len(jobs))
+                cursor.execute(f'DELETE FROM export_jobs WHERE id IN ({placeholders})',
+                               tuple(job['id'] for job in jobs))
+            conn.commit()
+            cursor.close()
+        total += len(jobs)
+        if len(jobs) < batch_size:
+            return total
+        if stop is not None and stop.wait(MAINTENANCE_CONFIG['pause']):
+            return total
+
+
+class ExportRunner:
+    """
+    Background thread in the email worker that builds queued exports
+
+    One build at a time per process; more worker processes build more at
+    once. On shutdown a build in progress is abandoned and requeued.
+    """
+
+    def __init__(self, poll_interval=2):
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.poll_interval = poll_interval
+        self.stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='exports', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    def _run(self):
+        print(f"✓ Export builder {self.worker_id} started")
+        while not self.stopping.is_set():
+            try:
+                with pooled_connection() as conn:
+                    job = claim(conn, self.worker_id)
+                if job is not None:
+                    run_job(job, stop=self.stopping)
+                    continue
+            except Exception as e:
+                print(f"✗ Error running export jobs: {str(e)}")
+            self.stopping.wait(self.poll_interval)
+
+
+@click.command('build-exports')
+def build_exports_command():
+    """Build every queued export job now (normally done by the email worker)."""
+    worker_id = f'{socket.gethostname()}:{os.getpid()}:cli'
+    built = 0
+    while True:
+        with pooled_connection() as conn:
+            job = claim(conn, worker_id)
+        if job is None:
+            break
+        run_job(job, echo=click.echo)
+        built += 1
+    click.echo(f'✓ Processed {built} export job(s)')
+
+
+def init_app(app):
+    from migrations import db_cli
+    db_cli.add_command(build_exports_command)
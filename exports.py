@@ -0,0 +1,357 @@
+"""
+CSV export engine for the admin reports
+Each report is a query, a header and a row formatter. Exports stream: rows
+are read with fetchmany() from an unbuffered cursor and encoded as they
+arrive, so a worker holds one batch in memory however large the report is.
+With ?gzip=1 the download is a .csv.gz compressed on the fly.
+"""
+import csv
+import zlib
+
+import click
+import mysql.connector
+from flask import Response
+
+from config import EXPORT_CONFIG
+from db import pool, pooled_connection
+
+
+def _datetime(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+def _date(value, default=''):
+    return value.strftime('%Y-%m-%d') if value else default
+
+
+def _user_row(u):
+    return [u['id'], u['username'], u['full_name'] or 'N/A', u['email'], u['role'], u['status'],
+            _datetime(u['created_at'])]
+
+
+def _deployment_row(d):
+    return [d['id'], d['officer_name'], d['rank'] or 'N/A', d['station'], d['unit'] or 'N/A',
+            d['position'] or 'N/A', _date(d['start_date']), _date(d['end_date'], 'Ongoing'),
+            d['status'], d['remarks'] or '']
+
+
+def _applicant_row(a):
+    full_name = f"{a['first_name'] or ''} {a['middle_name'] or ''} {a['last_name'] or ''}".strip()
+    return [a['id'], full_name or 'N/A', a['email'] or a['user_email'], a['phone'] or 'N/A',
+            a['address'] or 'N/A', _date(a['date_of_birth'], 'N/A'), a['application_status'] or 'Pending',
+            a['account_status'], _datetime(a['applied_date'])]
+
+
+def _leave_row(l):
+    return [l['id'], l['employee_name'], l['rank'] or 'N/A', l['leave_type'], _date(l['start_date']),
+            _date(l['end_date']), l['days_count'], l['reason'], l['status'], _datetime(l['applied_date'])]
+
+
+# Full-table reports behind the buttons on the reports page
+REPORTS = {
+    'users': {
+        'sql': '''
+            SELECT u.id, u.username, u.email, u.role, u.status, u.created_at,
+                   CASE
+                       WHEN u.role = 'employee' THEN CONCAT(ep.first_name, ' ', ep.last_name)
+                       WHEN u.role = 'applicant' THEN CONCAT(ap.first_name, ' ', ap.last_name)
+                       WHEN u.role = 'admin' THEN CONCAT(adp.first_name, ' ', adp.last_name)
+                   END as full_name
+            FROM users u
+            LEFT JOIN employee_profiles ep ON u.id = ep.user_id AND u.role = 'employee'
+            LEFT JOIN applicant_profiles ap ON u.id = ap.user_id AND u.role = 'applicant'
+            LEFT JOIN admin_profiles adp ON u.id = adp.user_id AND u.role = 'admin'
+            ORDER BY u.created_at DESC
+        ''',
+        'header': ['ID', 'Username', 'Full Name', 'Email', 'Role', 'Status', 'Created At'],
+        'row': _user_row,
+        'filename': 'users_report.csv',
+    },
+    'deployments': {
+        'sql': '''
+            SELECT d.id, d.station, d.unit, d.position, d.start_date, d.end_date, d.status, d.remarks,
+                   CONCAT(ep.first_name, ' ', ep.last_name) as officer_name,
+                   ep.`rank`
+            FROM deployments d
+            JOIN employee_profiles ep ON d.employee_id = ep.user_id
+            ORDER BY d.start_date DESC
+        ''',
+        'header': ['ID', 'Officer Name', 'Rank', 'Station', 'Unit', 'Position', 'Start Date', 'End Date',
+                   'Status', 'Remarks'],
+        'row': _deployment_row,
+        'filename': 'deployments_report.csv',
+    },
+    'applicants': {
+        'sql': '''
+            SELECT u.id, u.email as user_email, u.status as account_status,
+                   ap.first_name, ap.middle_name, ap.last_name, ap.email, ap.phone,
+                   ap.address, ap.date_of_birth, ap.application_status, ap.applied_date
+            FROM users u
+            LEFT JOIN applicant_profiles ap ON u.id = ap.user_id
+            WHERE u.role = 'applicant'
+            ORDER BY ap.applied_date DESC
+        ''',
+        'header': ['ID', 'Full Name', 'Email', 'Phone', 'Address', 'Date of Birth', 'Application Status',
+                   'Account Status', 'Applied Date'],
+        'row': _applicant_row,
+        'filename': 'applicants_report.csv',
+    },
+    'leaves': {
+        'sql': '''
+            SELECT la.id, la.leave_type, la.start_date, la.end_date, la.days_count, la.reason,
+                   la.status, la.applied_date,
+                   CONCAT(ep.first_name, ' ', ep.last_name) as employee_name,
+                   ep.`rank`
+            FROM leave_applications la
+            JOIN employee_profiles ep ON la.employee_id = ep.user_id
+            ORDER BY la.applied_date DESC
+        ''',
+        'header': ['ID', 'Employee Name', 'Rank', 'Leave Type', 'Start Date', 'End Date', 'Days', 'Reason',
+                   'Status', 'Applied Date'],
+        'row': _leave_row,
+        'filename': 'leave_applications_report.csv',
+    },
+}
+
+
+# Date-range reports (export_custom). Filters are half-open ranges on the bare
+# indexed column, never DATE(col), so MySQL range-scans the index (check with
+# `flask db explain-exports`). Columns are explicit: no password hashes or internal
+# counters. `count` reads only the driving table's date index, which covers it: the
+# progress estimate for background jobs plus the bounds of `key`, the primary key
+# parallel_export splits on. `index` is the date index the driving table (the
+# alias of `key`) must be read through. Each `sql` must end with its WHERE clause.
+CUSTOM_REPORTS = {
+    'users': {
+        'sql': '''
+            SELECT u.id, u.username, u.email, u.role, u.status, u.two_factor_enabled,
+                   u.created_at, u.updated_at,
+                   CASE
+                       WHEN u.role = 'employee' THEN CONCAT(ep.first_name, ' ', ep.last_name)
+                       WHEN u.role = 'applicant' THEN CONCAT(ap.first_name, ' ', ap.last_name)
+                       WHEN u.role = 'admin' THEN CONCAT(adp.first_name, ' ', adp.last_name)
+                   END as full_name
+            FROM users u
+            LEFT JOIN employee_profiles ep ON u.id = ep.user_id
+            LEFT JOIN applicant_profiles ap ON u.id = ap.user_id
+            LEFT JOIN admin_profiles adp ON u.id = adp.user_id
+            WHERE u.created_at >= %s AND u.created_at < %s + INTERVAL 1 DAY
+        ''',
+        'count': '''SELECT COUNT(*), MIN(u.id), MAX(u.id) FROM users u
+                    WHERE u.created_at >= %s AND u.created_at < %s + INTERVAL 1 DAY''',
+        'key': 'u.id',
+        'index': 'idx_users_created',
+    },
+    'deployments': {
+        'sql': '''
+            SELECT d.id, d.employee_id, d.station, d.unit, d.position, d.start_date, d.end_date,
+                   d.status, d.remarks, d.created_at, d.updated_at,
+                   CONCAT(ep.first_name, ' ', ep.last_name) as officer_name, ep.`rank`
+            FROM deployments d
+            JOIN employee_profiles ep ON d.employee_id = ep.user_id
+            WHERE d.start_date >= %s AND d.start_date < %s + INTERVAL 1 DAY
+        ''',
+        'count': '''SELECT COUNT(*), MIN(d.id), MAX(d.id) FROM deployments d
+                    WHERE d.start_date >= %s AND d.start_date < %s + INTERVAL 1 DAY''',
+        'key': 'd.id',
+        'index': 'idx_deployments_start',
+    },
+    'applicants': {
+        'sql': '''
+            SELECT ap.id, u.id as user_id, u.username, u.email as account_email,
+                   u.status as account_status,
+                   ap.first_name, ap.middle_name, ap.last_name, ap.suffix, ap.gender, ap.civil_status,
+                   ap.email, ap.phone, ap.address, ap.date_of_birth, ap.place_of_birth, ap.citizenship,
+                   ap.weight_kg, ap.height_cm, ap.application_status, ap.applied_date
+            FROM applicant_profiles ap
+            JOIN users u ON u.id = ap.user_id
+            WHERE ap.applied_date >= %s AND ap.applied_date < %s + INTERVAL 1 DAY
+        ''',
+        'count': '''SELECT COUNT(*), MIN(ap.id), MAX(ap.id) FROM applicant_profiles ap
+                    WHERE ap.applied_date >= %s AND ap.applied_date < %s + INTERVAL 1 DAY''',
+        'key': 'ap.id',
+        'index': 'idx_applicant_applied',
+    },
+    'leaves': {
+        'sql': '''
+            SELECT la.id, la.employee_id, la.leave_type, la.start_date, la.end_date, la.days_count,
+                   la.reason, la.status, la.remarks, la.applied_date, la.reviewed_date,
+                   CONCAT(ep.first_name, ' ', ep.last_name) as employee_name, ep.`rank`
+            FROM leave_applications la
+            JOIN employee_profiles ep ON la.employee_id = ep.user_id
+            WHERE la.applied_date >= %s AND la.applied_date < %s + INTERVAL 1 DAY
+        ''',
+        'count': '''SELECT COUNT(*), MIN(la.id), MAX(la.id) FROM leave_applications la
+                    WHERE la.applied_date >= %s AND la.applied_date < %s + INTERVAL 1 DAY''',
+        'key': 'la.id',
+        'index': 'idx_leave_applied',
+    },
+}
+
+
+def custom_filename(report_type, start_date, end_date):
+    return f'{report_type}_{start_date}_to_{end_date}.csv'
+
+
+class _ChunkBuffer:
+    """Write target for csv.writer that hands back what was written since the last drain"""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, value):
+        self.parts.append(value)
+
+    def drain(self):
+        data, self.parts = ''.join(self.parts), []
+        return data
+
+
+def encode_csv(cursor, rows, header=None, row=None, compress=False, on_batch=None, write_header=True):
+    """
+    CSV bytes for `rows` (the first batch) and the rest of the cursor
+
+    Yields one chunk per fetchmany() batch, gzipped if `compress`.
+    on_batch(n) is called after each batch of n rows is encoded.
+    """
+    buffer = _ChunkBuffer()
+    writer = csv.writer(buffer)
+    gz = zlib.compressobj(wbits=31) if compress else None
+
+    def emit():
+        data = buffer.drain().encode('utf-8')
+        chunk = gz.compress(data) if gz else data
+        if chunk:
+            yield chunk
+
+    if write_header:
+        writer.writerow(header or cursor.column_names)
+    while rows:
+        writer.writerows(map(row, rows) if row else rows)
+        if on_batch is not None:
+            on_batch(len(rows))
+        yield from emit()
+        rows = cursor.fetchmany(EXPORT_CONFIG['fetch_size'])
+    # Header only, when nothing matched
+    yield from emit()
+    if gz:
+        yield gz.flush()
+
+
+def stream_csv(sql, params, filename, header=None, row=None, compress=False, require_rows=False):
+    """
+    Response that streams a query as CSV
+
+    Args:
+        header: column titles (default: the query's column names)
+        row: formatter from a dict row to a list (default: values as selected)
+        compress: gzip the stream and download as filename.gz
+        require_rows: return None instead of a header-only file when nothing matches
+
+    The connection comes straight from the pool rather than the request,
+    because the body is produced after the view returns. A download that
+    is abandoned halfway leaves unread rows on the wire, so that connection
+    is discarded instead of going back to the pool.
+    """
+    entry = pool.acquire()
+    try:
+        cursor = entry['conn'].cursor(dictionary=row is not None)
+        cursor.execute(sql, params)
+        rows = cursor.fetchmany(EXPORT_CONFIG['fetch_size'])
+    except Exception:
+        pool.release(entry, discard=True)
+        raise
+
+    state = {'released': False}
+
+    def release(discard):
+        if state['released']:
+            return
+        state['released'] = True
+        try:
+            cursor.close()
+        except Exception:
+            discard = True
+        pool.release(entry, discard=discard)
+
+    if not rows and require_rows:
+        release(False)
+        return None
+
+    def generate():
+        finished = False
+        try:
+            yield from encode_csv(cursor, rows, header, row, compress)
+            finished = True
+        finally:
+            release(not finished)
+
+    if compress:
+        filename, mimetype = f'{filename}.gz', 'application/gzip'
+    else:
+        mimetype = 'text/csv'
+    response = Response(generate(), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+    # Runs after the body is sent; only does work if the generator never got to its finally
+    response.call_on_close(lambda: release(True))
+    return response
+
+
+def check_plans(conn, start, end):
+    """
+    EXPLAIN every custom report query for one date range
+
+    Returns a list of (report_type, query, steps, problem); problem is None
+    when the driving table is range-read through the report's `index`.
+    """
+    results = []
+    cursor = conn.cursor(dictionary=True)
+    try:
+        for report_type, report in CUSTOM_REPORTS.items():
+            alias = report['key'].split('.')[0]
+            for query in ('sql', 'count'):
+                cursor.execute('EXPLAIN ' + report[query], (start, end))
+                steps = cursor.fetchall()
+                driving = next((step for step in steps if step['table'] == alias), None)
+                if driving is None:
+                    problem = f'{alias} is not in the plan'
+                elif driving['type'] == 'ALL':
+                    problem = f'full scan of {alias}'
+                elif driving['key'] != report['index']:
+                    problem = f"{alias} is read through {driving['key']}, not {report['index']}"
+                else:
+                    problem = None
+                results.append((report_type, query, steps, problem))
+    finally:
+        cursor.close()
+    return results
+
+
+@click.command('explain-exports')
+@click.option('--start', default='2024-01-01', show_default=True, help='Range start (YYYY-MM-DD).')
+@click.option('--end', default='2024-12-31', show_default=True, help='Range end, inclusive.')
+@click.option('--skip-unreachable', is_flag=True, help='Exit 0 when no database can be reached.')
+def explain_exports_command(start, end, skip_unreachable):
+    """Check the query plans of the custom-range exports; exits 1 on a regression."""
+    try:
+        with pooled_connection() as conn:
+            results = check_plans(conn, start, end)
+    except mysql.connector.Error as e:
+        if not skip_unreachable:
+            raise
+        click.echo(f'⚠️  Skipped, no database: {e}')
+        return
+
+    for report_type, query, steps, problem in results:
+        click.echo(f"{'✗' if problem else '✓'} {report_type} ({query}){f': {problem}' if problem else ''}")
+        for step in steps:
+            click.echo(f"    {step['table']:<4} type={step['type']:<7} key={step['key']} "
+                       f"rows={step['rows']} {step['Extra'] or ''}")
+    failed = sum(1 for *_, problem in results if problem)
+    if failed:
+        raise click.ClickException(f'{failed} custom export plan(s) no longer use their date index')
+
+
+def init_app(app):
+    from migrations import db_cli
+    db_cli.add_command(explain_exports_command)
@@ -0,0 +1,205 @@
+"""
+Scheduled maintenance
+Purges the tables that otherwise grow forever: expired OTP codes, old read
+notifications, delivered / dead-lettered outbox rows, idle rate-limit
+buckets and old export files. Every purge is a `DELETE ... LIMIT n`
+repeated in its own short transaction with a pause in between, so cleanup
+never holds locks the login path has to wait on.
+
+Run once:      flask --app app db maintenance [--task NAME]
+On a schedule: the email worker starts a MaintenanceRunner thread when
+               MAINTENANCE_ENABLED=1. A MySQL named lock elects one leader,
+               so scaling the worker out doesn't multiply the purges.
+"""
+import threading
+import time
+
+import click
+import mysql.connector
+
+from config import DB_CONFIG, MAINTENANCE_CONFIG
+from db import pooled_connection
+
+LEADER_LOCK = 'pnpsanjuan_maintenance'
+
+
+def purge_in_batches(sql, params=(), batch_size=None, pause=None, stop=None):
+    """
+    Repeat a `DELETE ... LIMIT %s` statement until a batch comes back short
+
+    The batch size is appended as the last parameter. Each batch commits on
+    its own; `stop` (a threading.Event) cuts the pauses short on shutdown.
+    Returns the total number of rows removed.
+    """
+    batch_size = batch_size or MAINTENANCE_CONFIG['batch_size']
+    pause = MAINTENANCE_CONFIG['pause'] if pause is None else pause
+    total = 0
+    while True:
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, (*params, batch_size))
+            removed = cursor.rowcount
+            conn.commit()
+            cursor.close()
+        total += removed
+        if removed < batch_size:
+            return total
+        if stop is not None:
+            if stop.wait(pause):
+                return total
+        else:
+            time.sleep(pause)
+
+
+def purge_expired_otps(stop=None):
+    """Expired codes in whichever OTP backend is active"""
+    from otp_store import store
+    return store.purge_expired(stop=stop)
+
+
+def purge_read_notifications(stop=None):
+    return purge_in_batches('''
+        DELETE FROM notifications
+        WHERE is_read = TRUE AND created_at < NOW() - INTERVAL %s DAY
+        ORDER BY created_at
+        LIMIT %s
+    ''', (MAINTENANCE_CONFIG['notification_days'],), stop=stop)
+
+
+def purge_email_outbox(stop=None):
+    """
+    Delivered and dead-lettered outbox rows past their retention
+
+    A row's next_attempt_at is never later than when it was sent or died,
+    so the range on (status, next_attempt_at) finds them through the index.
+    """
+    sent = purge_in_batches('''
+        DELETE FROM email_outbox
+        WHERE status = 'sent' AND next_attempt_at < NOW() - INTERVAL %s DAY
+          AND sent_at < NOW() - INTERVAL %s DAY
+        ORDER BY next_attempt_at
+        LIMIT %s
+    ''', (MAINTENANCE_CONFIG['outbox_sent_days'], MAINTENANCE_CONFIG['outbox_sent_days']), stop=stop)
+    dead = purge_in_batches('''
+        DELETE FROM email_outbox
+        WHERE status = 'dead' AND next_attempt_at < NOW() - INTERVAL %s DAY
+        ORDER BY next_attempt_at
+        LIMIT %s
+    ''', (MAINTENANCE_CONFIG['outbox_dead_days'],), stop=stop)
+    return sent + dead
+
+
+def purge_idle_rate_limits(stop=None):
+    """Buckets idle for a day have refilled completely, same as having no row"""
+    return purge_in_batches('''
+        DELETE FROM rate_limit_buckets
+        WHERE updated_at < NOW() - INTERVAL 1 DAY
+        ORDER BY updated_at
+        LIMIT %s
+    ''', stop=stop)
+
+
+def purge_old_exports(stop=None):
+    """Export jobs past their retention, along with their files"""
+    from export_jobs import purge_finished
+    return purge_finished(stop=stop)
+
+
+TASKS = {
+    'expired_otps': purge_expired_otps,
+    'read_notifications': purge_read_notifications,
+    'email_outbox': purge_email_outbox,
+    'rate_limits': purge_idle_rate_limits,
+    'exports': purge_old_exports,
+}
+
+
+def run_tasks(names=None, stop=None, echo=print):
+    """Run the named tasks (all by default); returns {name: rows removed}"""
+    results = {}
+    for name in names or TASKS:
+        if stop is not None and stop.is_set():
+            break
+        started = time.monotonic()
+        try:
+            results[name] = TASKS[name](stop=stop)
+            echo(f"✓ Maintenance {name}: removed {results[name]} rows "
+                 f"in {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            echo(f"✗ Maintenance {name} failed: {str(e)}")
+    return results
+
+
+class MaintenanceRunner:
+    """
+    Background thread that runs every task each `interval` seconds
+
+    Only the process holding the LEADER_LOCK named lock does any work. The
+    lock lives on a dedicated connection, so it's released by MySQL itself
+    if the leader dies and another process takes over on its next tick.
+    """
+
+    def __init__(self, interval=3600):
+        self.interval = interval
+        self.stopping = threading.Event()
+        self._conn = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='maintenance', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self._drop_lock()
+
+    def _run(self):
+        # Let the process settle before the first pass
+        while not self.stopping.wait(min(60, self.interval)):
+            if self._is_leader():
+                run_tasks(stop=self.stopping)
+                if self.stopping.wait(self.interval):
+                    break
+
+    def _is_leader(self):
+        try:
+            if self._conn is None or not self._conn.is_connected():
+                self._drop_lock()
+                self._conn = mysql.connector.connect(**DB_CONFIG)
+            cursor = self._conn.cursor()
+            cursor.execute('SELECT IS_USED_LOCK(%s) = CONNECTION_ID()', (LEADER_LOCK,))
+            held = cursor.fetchone()[0] == 1
+            if not held:
+                cursor.execute('SELECT GET_LOCK(%s, 0)', (LEADER_LOCK,))
+                held = cursor.fetchone()[0] == 1
+                if held:
+                    print("✓ Maintenance leader lock acquired")
+            cursor.close()
+            return held
+        except Exception as e:
+            print(f"Maintenance leader check failed: {str(e)}")
+            self._drop_lock()
+            return False
+
+    def _drop_lock(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+
+@click.command('maintenance')
+@click.option('--task', 'names', multiple=True, type=click.Choice(list(TASKS)),
+              help='Run only this task (repeatable). Default: all.')
+def maintenance_command(names):
+    """Purge expired and old rows in small batches."""
+    run_tasks(names or None, echo=click.echo)
+
+
+def init_app(app):
+    from migrations import db_cli
+    db_cli.add_command(maintenance_command)
@@ -0,0 +1,640 @@
+"""
+Versioned schema migrations for PNP San Juan
+Run with: flask --app app db migrate   (flask --app app db status to inspect)
+
+Every migration is idempotent: tables use CREATE TABLE IF NOT EXISTS and
+columns/indexes are only added when information_schema says they are
+missing, so the runner is safe on fresh and on long-lived databases.
+Indexes are built with ALGORITHM=INPLACE, LOCK=NONE so reads and writes
+keep flowing while they are created.
+"""
+import click
+from flask.cli import AppGroup
+
+from db import pooled_connection
+from stats_counters import RECONCILE_STATEMENTS
+
+MIGRATION_LOCK = 'pnpsanjuan_schema_migrations'
+
+db_cli = AppGroup('db', help='Database schema and maintenance commands.')
+
+
+def create_table(sql):
+    def step(cursor):
+        cursor.execute(sql)
+    return step
+
+
+def add_column(table, column, definition):
+    def step(cursor):
+        cursor.execute('''
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        ''', (table, column))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f'ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}')
+    return step
+
+
+def create_index(table, name, columns, unique=False):
+    def step(cursor):
+        cursor.execute('''
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        ''', (table, name))
+        if cursor.fetchone()[0] == 0:
+            kind = 'UNIQUE INDEX' if unique else 'INDEX'
+            cols = ', '.join(f'`{c}`' for c in columns)
+            cursor.execute(f'ALTER TABLE `{table}` ADD {kind} `{name}` ({cols}), '
+                           f'ALGORITHM=INPLACE, LOCK=NONE')
+    return step
+
+
+def run_sql(sql, params=None):
+    def step(cursor):
+        cursor.execute(sql, params)
+    return step
+
+
+BASELINE_TABLES = [
+    '''CREATE TABLE IF NOT EXISTS `users` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `username` varchar(50) NOT NULL,
+      `email` varchar(100) NOT NULL,
+      `password` varchar(255) NOT NULL,
+      `role` enum('admin','employee','applicant') NOT NULL DEFAULT 'applicant',
+      `status` enum('active','inactive','suspended') NOT NULL DEFAULT 'active',
+      `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+      `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+      `two_factor_enabled` tinyint(1) DEFAULT '1',
+      PRIMARY KEY (`id`),
+      UNIQUE KEY `username` (`username`),
+      UNIQUE KEY `email` (`email`)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS `admin_profiles` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `user_id` int NOT NULL,
+      `first_name` varchar(100) DEFAULT NULL,
+      `middle_name` varchar(100) DEFAULT NULL,
+      `last_name` varchar(100) DEFAULT NULL,
+      `email` varchar(100) DEFAULT NULL,
+      `phone` varchar(20) DEFAULT NULL,
+      `profile_picture` varchar(255) DEFAULT NULL,
+      PRIMARY KEY (`id`),
+      UNIQUE KEY `user_id` (`user_id`),
+      FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS `employee_profiles` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `user_id` int NOT NULL,
+      `first_name` varchar(100) DEFAULT NULL,
+      `middle_name` varchar(100) DEFAULT NULL,
+      `last_name` varchar(100) DEFAULT NULL,
+      `suffix` varchar(20) DEFAULT NULL,
+      `unit` varchar(100) DEFAULT NULL,
+      `station` varchar(100) DEFAULT NULL,
+      `address` varchar(255) DEFAULT NULL,
+      `home_address` varchar(255) DEFAULT NULL,
+      `gender` enum('Male','Female','Other') DEFAULT NULL,
+      `date_of_birth` date DEFAULT NULL,
+      `place_of_birth` varchar(100) DEFAULT NULL,
+      `religion` varchar(50) DEFAULT NULL,
+      `emergency_contact_name` varchar(100) DEFAULT NULL,
+      `emergency_relationship` varchar(50) DEFAULT NULL,
+      `emergency_contact_number` varchar(20) DEFAULT NULL,
+      `rank` varchar(50) DEFAULT NULL,
+      `profile_picture` varchar(255) DEFAULT NULL,
+      PRIMARY KEY (`id`),
+      UNIQUE KEY `user_id` (`user_id`),
+      FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS `applicant_profiles` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `user_id` int NOT NULL,
+      `first_name` varchar(100) DEFAULT NULL,
+      `middle_name` varchar(100) DEFAULT NULL,
+      `last_name` varchar(100) DEFAULT NULL,
+      `suffix` varchar(10) DEFAULT NULL,
+      `gender` enum('Male','Female','Other') DEFAULT NULL,
+      `civil_status` enum('Single','Married','Widowed','Divorced','Separated') DEFAULT NULL,
+      `email` varchar(100) DEFAULT NULL,
+      `phone` varchar(20) DEFAULT NULL,
+      `address` varchar(255) DEFAULT NULL,
+      `date_of_birth` date DEFAULT NULL,
+      `place_of_birth` varchar(255) DEFAULT NULL,
+      `citizenship` varchar(100) DEFAULT NULL,
+      `weight_kg` decimal(5,2) DEFAULT NULL,
+      `height_cm` decimal(5,2) DEFAULT NULL,
+      `profile_picture` varchar(255) DEFAULT NULL,
+      `photo_2x2` varchar(255) DEFAULT NULL,
+      `government_id` varchar(255) DEFAULT NULL,
+      `transcript_diploma` varchar(255) DEFAULT NULL,
+      `eligibility_cert` varchar(255) DEFAULT NULL,
+      `application_status` enum('Pending','Approved','Rejected') DEFAULT 'Pending',
+      `applied_date` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+      PRIMARY KEY (`id`),
+      UNIQUE KEY `user_id` (`user_id`),
+      FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS `applicant_address` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `user_id` int NOT NULL,
+      `house_no` varchar(50) DEFAULT NULL,
+      `street` varchar(255) DEFAULT NULL,
+      `barangay` varchar(100) NOT NULL,
+      `city` varchar(100) NOT NULL,
+      `zip_code` varchar(10) NOT NULL,
+      `mobile_number` varchar(20) NOT NULL,
+      `landline_number` varchar(20) DEFAULT NULL,
+      `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+      `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+      PRIMARY KEY (`id`),
+      KEY `idx_user_address` (`user_id`),
+      FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS `applicant_applications` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `user_id` int NOT NULL,
+      `applicant_id` varchar(20) NOT NULL COMMENT 'Format: YY-XXX (e.g., 25-001)',
+      `status` enum('SUBMITTED','UNDER REVIEW','INITIAL INTERVIEW','MEDICAL EXAMINATION','PHYSICAL AGILITY TEST','NEURO-PSYCHIATRIC EVALUATION','FINAL DELIBERATION','OATH TAKING PREPARATION','REJECTED') DEFAULT 'SUBMITTED',
+      `submission_date` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+      `reference_number` varchar(50) NOT NULL,
+      `pdf_path` varchar(255) DEFAULT NULL,
+      `step_completed` int DEFAULT '0',
+      `is_complete` tinyint(1) DEFAULT '0',
+      `form_completed` tinyint(1) DEFAULT '0',
+      `admin_notes` text,
+      `reviewed_by` int DEFAULT NULL,
+      `reviewed_at` timestamp NULL DEFAULT NULL,
+      `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+      `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+      `stage_notes` text,
+      `interview_date` datetime DEFAULT NULL,
+      `medical_exam_date` datetime DEFAULT NULL,
+      `pat_date` datetime DEFAULT NULL,
+      `neuro_psych_date` datetime DEFAULT NULL,
+      `oath_date` datetime DEFAULT NULL,
+      `medical_result` enum('PENDING','PASSED','FAILED') DEFAULT 'PENDING',
+      `pat_result` enum('PENDING','PASSED','FAILED') DEFAULT 'PENDING',
+      `neuro_result` enum('PENDING','PASSED','FAILED') DEFAULT 'PENDING',
+      PRIMARY KEY (`id`),
+      UNIQUE KEY `applicant_id` (`applicant_id`),
+      UNIQUE KEY `reference_number` (`reference_number`),
+      KEY `user_id` (`user_id`),
+      KEY `reviewed_by` (`reviewed_by`),
+      KEY `idx_status` (`status`),
+      KEY `idx_status_updated` (`status`,`updated_at`),
+      FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE,
+      FOREIGN KEY (`reviewed_by`) REFERENCES `users` (`id`) ON DELETE SET NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS `applicant_background` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `user_id` int NOT NULL,
+      `has_criminal_case` tinyint(1) DEFAULT '0',
+      `criminal_case_details` text,
+      `has_admin_case` tinyint(1) DEFAULT '0',
+      `admin_case_details` text,
+      `has_previous_pnp_application` tinyint(1) DEFAULT '0',
+      `previous_pnp_details` text,
+      `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+      `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+      PRIMARY KEY (`id`),
+      KEY `idx_user_background` (`user_id`),
+      FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS `applicant_eligibility` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `user_id` int NOT NULL,
+      `ra_1080` tinyint(1) DEFAULT '0',
+      `ra_6506` tinyint(1) DEFAULT '0',
+      `pd_907` tinyint(1) DEFAULT '0',
+      `cse_professional` tinyint(1) DEFAULT '0',
+      `csc_po1` tinyint(1) DEFAULT '0',
+      `napolcom` tinyint(1) DEFAULT '0',
+      `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+      `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+      PRIMARY KEY (`id`),
+      KEY `idx_user_eligibility` (`user_id`),
+      FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS `character_references` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `user_id` int NOT NULL,
+      `reference_name` varchar(255) NOT NULL,
+      `address` text NOT NULL,
+      `contact_number` varchar(20) NOT NULL,
+      `relationship` varchar(100) DEFAULT NULL,
+      `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+      PRIMARY KEY (`id`),
+      KEY `idx_user_references` (`user_id`),
+      FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS `education` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `user_id` int NOT NULL,
+      `level` varchar(50) DEFAULT NULL,
+      `school_name` varchar(200) DEFAULT NULL,
+      `year_graduated` int DEFAULT NULL,
+      `grade_gwa` varchar(20) DEFAULT NULL,
+      `course` varchar(255) DEFAULT NULL,
+      `location` varchar(255) DEFAULT NULL,
+      `date_from` date DEFAULT NULL,
+      `date_to` date DEFAULT NULL,
+      PRIMARY KEY (`id`),
+      KEY `user_id` (`user_id`),
+      FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS `deployments` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `employee_id` int NOT NULL,
+      `station` varchar(100) NOT NULL,
+      `unit` varchar(100) DEFAULT NULL,
+      `position` varchar(100) DEFAULT NULL,
+      `start_date` date NOT NULL,
+      `end_date` date DEFAULT NULL,
+      `status` enum('Active','Completed','Cancelled') DEFAULT 'Active',
+      `remarks` text,
+      `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+      `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+      PRIMARY KEY (`id`),
+      KEY `employee_id` (`employee_id`),
+      FOREIGN KEY (`employee_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS `leave_applications` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `employee_id` int NOT NULL,
+      `leave_type` enum('Sick Leave','Vacation Leave','Emergency Leave','Maternity Leave','Paternity Leave') NOT NULL,
+      `start_date` date NOT NULL,
+      `end_date` date NOT NULL,
+      `days_count` int NOT NULL,
+      `reason` text NOT NULL,
+      `status` enum('Pending','Approved','Rejected') DEFAULT 'Pending',
+      `remarks` text,
+      `applied_date` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+      `reviewed_date` timestamp NULL DEFAULT NULL,
+      PRIMARY KEY (`id`),
+      KEY `employee_id` (`employee_id`),
+      FOREIGN KEY (`employee_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS `notifications` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `user_id` int NOT NULL,
+      `title` varchar(255) NOT NULL,
+      `message` text NOT NULL,
+      `type` enum('applicant','leave','general') NOT NULL,
+      `related_id` int DEFAULT NULL,
+      `is_read` tinyint(1) DEFAULT '0',
+      `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+      PRIMARY KEY (`id`),
+      KEY `idx_user_read` (`user_id`,`is_read`),
+      KEY `idx_created_at` (`created_at` DESC),
+      FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+    '''CREATE TABLE IF NOT EXISTS `otp_codes` (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `user_id` int NOT NULL,
+      `code` varchar(6) NOT NULL,
+      `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+      `expires_at` timestamp NOT NULL,
+      `is_used` tinyint(1) DEFAULT '0',
+      PRIMARY KEY (`id`),
+      KEY `idx_user_code` (`user_id`,`code`),
+      KEY `idx_expires` (`expires_at`),
+      FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4''',
+]
+
+
+# (version, name, steps) - append only, never edit an applied migration.
+# Mirror each new one in database.sql (schema plus its schema_migrations row).
+MIGRATIONS = [
+    (1, 'baseline schema', [create_table(sql) for sql in BASELINE_TABLES]),
+    (2, 'reconcile columns missing from databases created by init_db', [
+        add_column('users', 'status', "enum('active','inactive','suspended') NOT NULL DEFAULT 'active'"),
+        add_column('users', 'updated_at', 'timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'),
+        add_column('users', 'two_factor_enabled', "tinyint(1) DEFAULT '1'"),
+        add_column('applicant_profiles', 'suffix', 'varchar(10) DEFAULT NULL'),
+        add_column('applicant_profiles', 'gender', "enum('Male','Female','Other') DEFAULT NULL"),
+        add_column('applicant_profiles', 'civil_status',
+                   "enum('Single','Married','Widowed','Divorced','Separated') DEFAULT NULL"),
+        add_column('applicant_profiles', 'date_of_birth', 'date DEFAULT NULL'),
+        add_column('applicant_profiles', 'place_of_birth', 'varchar(255) DEFAULT NULL'),
+        add_column('applicant_profiles', 'citizenship', 'varchar(100) DEFAULT NULL'),
+        add_column('applicant_profiles', 'weight_kg', 'decimal(5,2) DEFAULT NULL'),
+        add_column('applicant_profiles', 'height_cm', 'decimal(5,2) DEFAULT NULL'),
+        add_column('applicant_profiles', 'photo_2x2', 'varchar(255) DEFAULT NULL'),
+        add_column('applicant_profiles', 'government_id', 'varchar(255) DEFAULT NULL'),
+        add_column('applicant_profiles', 'transcript_diploma', 'varchar(255) DEFAULT NULL'),
+        add_column('applicant_profiles', 'eligibility_cert', 'varchar(255) DEFAULT NULL'),
+        add_column('applicant_applications', 'form_completed', "tinyint(1) DEFAULT '0'"),
+        add_column('education', 'grade_gwa', 'varchar(20) DEFAULT NULL'),
+        add_column('education', 'course', 'varchar(255) DEFAULT NULL'),
+        add_column('education', 'location', 'varchar(255) DEFAULT NULL'),
+        add_column('education', 'date_from', 'date DEFAULT NULL'),
+        add_column('education', 'date_to', 'date DEFAULT NULL'),
+    ]),
+    (3, 'hot-path composite indexes', [
+        create_index('users', 'idx_users_role_created', ['role', 'created_at']),
+        create_index('leave_applications', 'idx_leave_employee_status_start', ['employee_id', 'status', 'start_date']),
+        create_index('leave_applications', 'idx_leave_status_applied', ['status', 'applied_date']),
+        create_index('deployments', 'idx_deployments_status_start', ['status', 'start_date']),
+        create_index('applicant_profiles', 'idx_applicant_status', ['application_status']),
+        create_index('notifications', 'idx_user_created', ['user_id', 'created_at']),
+    ]),
+    (4, 'keyset pagination sort indexes', [
+        create_index('leave_applications', 'idx_leave_applied', ['applied_date']),
+        create_index('deployments', 'idx_deployments_start', ['start_date']),
+    ]),
+    (5, 'persisted applicant display sequence (YY-NNN) with backfill', [
+        add_column('users', 'applicant_seq', 'int DEFAULT NULL'),
+        run_sql('''
+            UPDATE users u
+            JOIN (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY YEAR(created_at) ORDER BY created_at, id) AS seq
+                FROM users
+                WHERE role = 'applicant'
+            ) ranked ON ranked.id = u.id
+            SET u.applicant_seq = ranked.seq
+            WHERE u.applicant_seq IS NULL
+        '''),
+    ]),
+    (6, 'per-year applicant ID sequence', [
+        create_table('''
+            CREATE TABLE IF NOT EXISTS applicant_id_sequences (
+                year SMALLINT NOT NULL PRIMARY KEY,
+                last_value INT NOT NULL
+            ) ENGINE=InnoDB
+        '''),
+        run_sql('''
+            INSERT INTO applicant_id_sequences (year, last_value)
+            SELECT 2000 + CAST(SUBSTRING_INDEX(applicant_id, '-', 1) AS UNSIGNED) AS yr,
+                   MAX(CAST(SUBSTRING_INDEX(applicant_id, '-', -1) AS UNSIGNED))
+            FROM applicant_applications
+            WHERE applicant_id REGEXP '^[0-9]{2}-[0-9]+$'
+            GROUP BY yr
+            ON DUPLICATE KEY UPDATE last_value = GREATEST(last_value, VALUES(last_value))
+        '''),
+    ]),
+    (7, 'materialized dashboard counters', [
+        create_table('''
+            CREATE TABLE IF NOT EXISTS stats_counters (
+                entity VARCHAR(50) NOT NULL,
+                status VARCHAR(50) NOT NULL,
+                value INT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                PRIMARY KEY (entity, status)
+            ) ENGINE=InnoDB
+        '''),
+    ] + [run_sql(sql) for sql in RECONCILE_STATEMENTS]),
+    (8, 'denormalized per-user unread notification counter', [
+        add_column('users', 'unread_notifications', 'int NOT NULL DEFAULT 0'),
+        run_sql('''
+            UPDATE users u
+            LEFT JOIN (
+                SELECT user_id, COUNT(*) AS unread
+                FROM notifications
+                WHERE is_read = FALSE
+                GROUP BY user_id
+            ) n ON n.user_id = u.id
+            SET u.unread_notifications = COALESCE(n.unread, 0)
+        '''),
+    ]),
+    (9, 'notification list validator index', [
+        create_index('notifications', 'idx_notifications_user_id', ['user_id', 'id']),
+    ]),
+    (10, 'durable email outbox', [
+        create_table('''
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                kind VARCHAR(30) NOT NULL,
+                user_id INT DEFAULT NULL,
+                recipient VARCHAR(100) NOT NULL,
+                payload JSON NOT NULL,
+                status ENUM('queued','sending','sent','dead') NOT NULL DEFAULT 'queued',
+                attempts INT NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                locked_by VARCHAR(100) DEFAULT NULL,
+                locked_at TIMESTAMP NULL DEFAULT NULL,
+                last_error TEXT,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                sent_at TIMESTAMP NULL DEFAULT NULL,
+                KEY idx_outbox_status_due (status, next_attempt_at),
+                KEY idx_outbox_user (user_id),
+                CONSTRAINT email_outbox_user_fk FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            ) ENGINE=InnoDB
+        '''),
+    ]),
+    (11, 'shared email provider circuit breakers', [
+        create_table('''
+            CREATE TABLE IF NOT EXISTS email_provider_health (
+                provider VARCHAR(20) NOT NULL PRIMARY KEY,
+                state ENUM('closed','open','half_open') NOT NULL DEFAULT 'closed',
+                window_start TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                successes INT NOT NULL DEFAULT 0,
+                failures INT NOT NULL DEFAULT 0,
+                prev_successes INT NOT NULL DEFAULT 0,
+                prev_failures INT NOT NULL DEFAULT 0,
+                consecutive_failures INT NOT NULL DEFAULT 0,
+                open_until TIMESTAMP NULL DEFAULT NULL,
+                probe_started_at TIMESTAMP NULL DEFAULT NULL,
+                last_error VARCHAR(255) DEFAULT NULL,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB
+        '''),
+        run_sql("INSERT IGNORE INTO email_provider_health (provider) VALUES ('sendgrid'), ('smtp')"),
+    ]),
+    (12, 'token buckets for login, registration and OTP throttling', [
+        create_table('''
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                bucket_key VARCHAR(191) NOT NULL PRIMARY KEY,
+                tokens DOUBLE NOT NULL,
+                allowed TINYINT(1) NOT NULL DEFAULT 1,
+                updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+                KEY idx_rate_limit_updated (updated_at)
+            ) ENGINE=InnoDB
+        '''),
+    ]),
+    (13, 'background export jobs and data watermarks', [
+        # Every table a custom report reads gets an updated_at, indexed so
+        # the newest change is one index dive (see export_jobs.data_watermark)
+        add_column('applicant_profiles', 'updated_at',
+                   'timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'),
+        add_column('employee_profiles', 'updated_at',
+                   'timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'),
+        add_column('admin_profiles', 'updated_at',
+                   'timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'),
+        add_column('leave_applications', 'updated_at',
+                   'timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'),
+        create_index('users', 'idx_users_updated', ['updated_at']),
+        create_index('applicant_profiles', 'idx_applicant_updated', ['updated_at']),
+        create_index('employee_profiles', 'idx_employee_updated', ['updated_at']),
+        create_index('admin_profiles', 'idx_admin_updated', ['updated_at']),
+        create_index('deployments', 'idx_deployments_updated', ['updated_at']),
+        create_index('leave_applications', 'idx_leave_updated', ['updated_at']),
+        create_table('''
+            CREATE TABLE IF NOT EXISTS export_jobs (
+                id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                report_type VARCHAR(30) NOT NULL,
+                start_date DATE NOT NULL,
+                end_date DATE NOT NULL,
+                compress TINYINT(1) NOT NULL DEFAULT 0,
+                requested_by INT DEFAULT NULL,
+                status ENUM('queued','running','done','failed') NOT NULL DEFAULT 'queued',
+                watermark CHAR(40) DEFAULT NULL,
+                rows_written INT NOT NULL DEFAULT 0,
+                rows_total INT DEFAULT NULL,
+                file_name VARCHAR(255) DEFAULT NULL,
+                file_size BIGINT DEFAULT NULL,
+                attempts INT NOT NULL DEFAULT 0,
+                locked_by VARCHAR(100) DEFAULT NULL,
+                locked_at TIMESTAMP NULL DEFAULT NULL,
+                error TEXT,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP NULL DEFAULT NULL,
+                finished_at TIMESTAMP NULL DEFAULT NULL,
+                KEY idx_export_status (status, id),
+                KEY idx_export_cache (report_type, start_date, end_date, compress, watermark),
+                KEY idx_export_finished (finished_at),
+                CONSTRAINT export_jobs_user_fk FOREIGN KEY (requested_by) REFERENCES users (id) ON DELETE SET NULL
+            ) ENGINE=InnoDB
+        '''),
+    ]),
+    (14, 'date-range indexes for custom exports', [
+        # Range scans for export_custom's half-open filters; InnoDB appends the
+        # primary key, so each also covers its COUNT / MIN(id) / MAX(id) query
+        create_index('users', 'idx_users_created', ['created_at']),
+        create_index('applicant_profiles', 'idx_applicant_applied', ['applied_date']),
+    ]),
+    (15, 'per-year counter for applicant display sequences', [
+        create_table('''
+            CREATE TABLE IF NOT EXISTS applicant_seq_counters (
+                year SMALLINT NOT NULL PRIMARY KEY,
+                last_value INT NOT NULL
+            ) ENGINE=InnoDB
+        '''),
+        # The old COUNT(*)-based assignment could hand out a YY-NNN twice;
+        # keep the first holder of each and move the rest past the year's max
+        run_sql('''
+            UPDATE users u
+            JOIN (
+                SELECT d.id, m.max_seq + ROW_NUMBER() OVER (PARTITION BY d.yr ORDER BY d.id) AS seq
+                FROM (
+                    SELECT id, YEAR(created_at) AS yr,
+                           ROW_NUMBER() OVER (PARTITION BY YEAR(created_at), applicant_seq ORDER BY id) AS dup
+                    FROM users
+                    WHERE applicant_seq IS NOT NULL
+                ) d
+                JOIN (
+                    SELECT YEAR(created_at) AS yr, MAX(applicant_seq) AS max_seq
+                    FROM users
+                    WHERE applicant_seq IS NOT NULL
+                    GROUP BY yr
+                ) m ON m.yr = d.yr
+                WHERE d.dup > 1
+            ) moved ON moved.id = u.id
+            SET u.applicant_seq = moved.seq, u.updated_at = u.updated_at
+        '''),
+        run_sql('''
+            INSERT INTO applicant_seq_counters (year, last_value)
+            SELECT YEAR(created_at) AS yr, MAX(applicant_seq)
+            FROM users
+            WHERE applicant_seq IS NOT NULL
+            GROUP BY yr
+            ON DUPLICATE KEY UPDATE last_value = GREATEST(last_value, VALUES(last_value))
+        '''),
+    ]),
+    (16, 'NOT NULL keyset pagination sort keys', [
+        # A NULL sort key can't be carried in a keyset token, so the list pages'
+        # sort columns (see pagination.keyset_paginate) must always hold a value
+        run_sql('''
+            UPDATE users SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP), updated_at = updated_at
+            WHERE created_at IS NULL
+        '''),
+        run_sql('ALTER TABLE `users` MODIFY `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP, '
+                'ALGORITHM=INPLACE, LOCK=NONE'),
+        run_sql('''
+            UPDATE leave_applications SET applied_date = COALESCE(updated_at, CURRENT_TIMESTAMP),
+                                          updated_at = updated_at
+            WHERE applied_date IS NULL
+        '''),
+        run_sql('ALTER TABLE `leave_applications` MODIFY `applied_date` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP, '
+                'ALGORITHM=INPLACE, LOCK=NONE'),
+    ]),
+]
+
+
+def _ensure_version_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def applied_versions(cursor):
+    _ensure_version_table(cursor)
+    cursor.execute('SELECT version FROM schema_migrations')
+    return {row[0] for row in cursor.fetchall()}
+
+
+def run_migrations(conn, echo=print):
+    """
+    Apply pending migrations in version order
+
+    Returns the list of versions that were applied. A named lock keeps two
+    workers/deploys from running the same migration concurrently.
+    """
+    cursor = conn.cursor()
+    cursor.execute('SELECT GET_LOCK(%s, 60)', (MIGRATION_LOCK,))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        raise RuntimeError('Could not acquire the schema migration lock')
+
+    applied = []
+    try:
+        done = applied_versions(cursor)
+        for version, name, steps in sorted(MIGRATIONS, key=lambda m: m[0]):
+            if version in done:
+                continue
+            echo(f'Applying migration {version}: {name}')
+            for step in steps:
+                step(cursor)
+            cursor.execute('INSERT INTO schema_migrations (version, name) VALUES (%s, %s)',
+                           (version, name))
+            conn.commit()
+            applied.append(version)
+    finally:
+        cursor.execute('SELECT RELEASE_LOCK(%s)', (MIGRATION_LOCK,))
+        cursor.fetchone()
+        cursor.close()
+    return applied
+
+
+@db_cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations."""
+    with pooled_connection() as conn:
+        applied = run_migrations(conn, echo=click.echo)
+    if applied:
+        click.echo(f'✓ Applied {len(applied)} migration(s): {", ".join(map(str, applied))}')
+    else:
+        click.echo('✓ Schema is up to date')
+
+
+@db_cli.command('status')
+def status_command():
+    """Show applied and pending schema migrations."""
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        done = applied_versions(cursor)
+        conn.commit()
+        cursor.close()
+    for version, name, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+        mark = 'applied' if version in done else 'pending'
+        click.echo(f'{version:>4}  {mark:<8} {name}')
+
+
+def init_app(app):
+    app.cli.add_command(db_cli)
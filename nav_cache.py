@@ -0,0 +1,77 @@
+"""
+Cached navigation context for the admin/employee/applicant base templates
+The navbar avatar and unread-notification badge are loaded with one query
+and cached per user for NAV_CACHE_TTL seconds. Profile uploads and
+notification inserts/reads call invalidate() so changes show up at once
+in this process; other worker processes catch up when the TTL expires.
+"""
+import threading
+import time
+
+from flask import session
+
+from config import NAV_CACHE_TTL
+from db import get_db
+
+PROFILE_TABLES = {
+    'admin': 'admin_profiles',
+    'employee': 'employee_profiles',
+    'applicant': 'applicant_profiles',
+}
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def load_nav(user_id, role):
+    """Avatar path and unread count for one user in a single round trip"""
+    table = PROFILE_TABLES[role]
+    cursor = get_db().cursor(dictionary=True)
+    cursor.execute(f'''
+        SELECT p.profile_picture, u.unread_notifications AS unread_notifs
+        FROM users u
+        LEFT JOIN {table} p ON p.user_id = u.id
+        WHERE u.id = %s
+    ''', (user_id,))
+    nav = cursor.fetchone()
+    cursor.close()
+    return nav
+
+
+def get_nav(user_id, role):
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(user_id)
+        if hit and hit[0] == role and hit[2] > now:
+            return hit[1]
+
+    nav = load_nav(user_id, role)
+    with _lock:
+        _cache[user_id] = (role, nav, now + NAV_CACHE_TTL)
+    return nav
+
+
+def invalidate(*user_ids):
+    """Forget cached nav data for the given users"""
+    with _lock:
+        for user_id in user_ids:
+            _cache.pop(user_id, None)
+
+
+def invalidate_role(role):
+    """Forget cached nav data for every cached user with `role` (admin broadcasts)"""
+    with _lock:
+        for user_id in [uid for uid, entry in _cache.items() if entry[0] == role]:
+            del _cache[user_id]
+
+
+def nav_context():
+    user_id = session.get('user_id')
+    role = session.get('role')
+    if user_id is None or role not in PROFILE_TABLES:
+        return {}
+    return {'nav': get_nav(user_id, role)}
+
+
+def init_app(app):
+    app.context_processor(nav_context)
@@ -0,0 +1,174 @@
+"""
+Server-Sent Events feed for notifications
+Each worker process runs one watcher thread, and only while browsers are
+subscribed. Every tick it reads new notification rows (id > last seen) and
+the unread counters of the subscribed users. It then pushes the changes to
+the local subscriber queues, so the DB cost per process stays flat no
+matter how many tabs are open.
+
+Under gthread every open stream holds a worker thread, so a process serves
+at most SSE_MAX_STREAMS of them and keeps the rest of its threads for
+ordinary requests. Past the cap a browser gets a 204 and falls back to
+polling the ETag-validated notification list.
+"""
+import json
+import queue
+import threading
+import time
+
+from flask import Response
+
+from config import SSE_CONFIG
+from db import pooled_connection
+
+
+class NotificationFeed:
+    """In-process pub/sub fed by a change watcher on the notifications table"""
+
+    def __init__(self, poll_interval=2.0):
+        self.poll_interval = poll_interval
+        self._subscribers = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_id = None
+        self._streams = 0
+
+    def open_stream(self):
+        """Claim one of the process's stream slots; False when all are taken"""
+        with self._lock:
+            if self._streams >= SSE_CONFIG['max_streams']:
+                return False
+            self._streams += 1
+            return True
+
+    def close_stream(self):
+        with self._lock:
+            self._streams -= 1
+
+    def subscribe(self, user_id):
+        q = queue.Queue(maxsize=100)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(q)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._watch, name='notification-feed', daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues is not None:
+                queues.discard(q)
+                if not queues:
+                    del self._subscribers[user_id]
+                    self._counts.pop(user_id, None)
+
+    def publish(self, user_id, event, data):
+        """Push an event to every local subscriber of `user_id`"""
+        with self._lock:
+            queues = list(self._subscribers.get(user_id, ()))
+        for q in queues:
+            try:
+                q.put_nowait((event, data))
+            except queue.Full:
+                pass
+
+    def _watch(self):
+        while True:
+            with self._lock:
+                user_ids = list(self._subscribers)
+                if not user_ids:
+                    self._thread = None
+                    return
+            try:
+                self._tick(user_ids)
+            except Exception as e:
+                print(f"Notification feed error: {e}")
+            time.sleep(self.poll_interval)
+
+    def _tick(self, user_ids):
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            if self._last_id is None:
+                cursor.execute('SELECT COALESCE(MAX(id), 0) AS last_id FROM notifications')
+                self._last_id = cursor.fetchone()['last_id']
+
+            cursor.execute('''
+                SELECT id, user_id, title, message, type, related_id, is_read, created_at
+                FROM notifications
+                WHERE id > %s
+                ORDER BY id
+                LIMIT 500
+            ''', (self._last_id,))
+            new_rows = cursor.fetchall()
+
+            placeholders = ', '.join(['%s'] * len(user_ids))
+            cursor.execute(f'SELECT id, unread_notifications FROM users WHERE id IN ({placeholders})',
+                           tuple(user_ids))
+            counts = {row['id']: row['unread_notifications'] for row in cursor.fetchall()}
+            cursor.close()
+            conn.commit()
+
+        if new_rows:
+            self._last_id = new_rows[-1]['id']
+        for row in new_rows:
+            if row['user_id'] in counts:
+                row['created_at'] = row['created_at'].isoformat() if row['created_at'] else None
+                self.publish(row['user_id'], 'notification',
+                             {'notification': row, 'unread_count': counts[row['user_id']]})
+
+        for user_id, count in counts.items():
+            with self._lock:
+                changed = self._counts.get(user_id) != count
+                self._counts[user_id] = count
+            if changed:
+                self.publish(user_id, 'count', {'count': count})
+
+
+feed = NotificationFeed(poll_interval=SSE_CONFIG['poll_interval'])
+
+
+def _format(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+def stream_response(user_id):
+    """
+    text/event-stream response for one user
+
+    Streams end after `max_stream_seconds`; EventSource reconnects by itself,
+    which keeps worker threads from being held by a tab forever.
+    """
+    if not SSE_CONFIG['enabled'] or not feed.open_stream():
+        # 204 tells EventSource not to reconnect; the page falls back to polling
+        return Response(status=204)
+
+    state = {'open': True}
+
+    def release():
+        if state['open']:
+            state['open'] = False
+            feed.close_stream()
+
+    def generate():
+        q = feed.subscribe(user_id)
+        deadline = time.monotonic() + SSE_CONFIG['max_stream_seconds']
+        try:
+            yield 'retry: 5000\n\n'
+            while time.monotonic() < deadline:
+                try:
+                    event, data = q.get(timeout=SSE_CONFIG['keepalive_seconds'])
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield _format(event, data)
+        finally:
+            feed.unsubscribe(user_id, q)
+            release()
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Frees the slot even if the client left before the body was ever iterated
+    response.call_on_close(release)
+    return response
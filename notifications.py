@@ -0,0 +1,110 @@
+"""
+Notification service shared by every blueprint
+All writes run on the caller's cursor, inside the caller's transaction.
+users.unread_notifications is kept in step with the notifications table,
+so badge polls read a single primary-key row instead of running COUNT(*).
+Counter writes pin updated_at to itself: badge traffic is not an edit of
+the user and must not move the timestamp that exports and their caches read.
+Role broadcasts are two set-based statements however many recipients there are.
+
+Every helper touches the users row first so concurrent inserts and reads
+for the same user queue on one row lock instead of deadlocking.
+"""
+
+
+def notify_user(cursor, user_id, title, message, notif_type, related_id=None):
+    """Insert one notification and bump the recipient's unread counter"""
+    cursor.execute('UPDATE users SET unread_notifications = unread_notifications + 1, updated_at = updated_at '
+                   'WHERE id = %s', (user_id,))
+    cursor.execute('''
+        INSERT INTO notifications (user_id, title, message, type, related_id)
+        VALUES (%s, %s, %s, %s, %s)
+    ''', (user_id, title, message, notif_type, related_id))
+
+
+def notify_users(cursor, user_ids, title, message, notif_type, related_id=None):
+    """Send the same notification to a list of users with two set-based statements"""
+    if not user_ids:
+        return 0
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    cursor.execute(f'UPDATE users SET unread_notifications = unread_notifications + 1, updated_at = updated_at '
+                   f'WHERE id IN ({placeholders})', tuple(user_ids))
+    recipients = cursor.rowcount
+    cursor.execute(f'''
+        INSERT INTO notifications (user_id, title, message, type, related_id)
+        SELECT id, %s, %s, %s, %s FROM users WHERE id IN ({placeholders})
+    ''', (title, message, notif_type, related_id, *user_ids))
+    return recipients
+
+
+def notify_role(cursor, role, title, message, notif_type, related_id=None):
+    """Fan one notification out to every user with `role`; returns the recipient count"""
+    cursor.execute('UPDATE users SET unread_notifications = unread_notifications + 1, updated_at = updated_at '
+                   'WHERE role = %s', (role,))
+    recipients = cursor.rowcount
+    cursor.execute('''
+        INSERT INTO notifications (user_id, title, message, type, related_id)
+        SELECT id, %s, %s, %s, %s FROM users WHERE role = %s
+    ''', (title, message, notif_type, related_id, role))
+    return recipients
+
+
+def notify_admins(cursor, title, message, notif_type, related_id=None):
+    """Broadcast to every admin (new applicants, leave requests, support requests)"""
+    return notify_role(cursor, 'admin', title, message, notif_type, related_id)
+
+
+def mark_read(cursor, user_id, notif_id):
+    """Mark one of the user's notifications read; returns True if it was unread"""
+    cursor.execute('SELECT unread_notifications FROM users WHERE id = %s FOR UPDATE', (user_id,))
+    cursor.fetchall()
+    cursor.execute('UPDATE notifications SET is_read = TRUE WHERE id = %s AND user_id = %s AND is_read = FALSE',
+                   (notif_id, user_id))
+    changed = cursor.rowcount
+    if changed:
+        cursor.execute('UPDATE users SET unread_notifications = GREATEST(unread_notifications - %s, 0), '
+                       'updated_at = updated_at WHERE id = %s', (changed, user_id))
+    return bool(changed)
+
+
+def mark_all_read(cursor, user_id):
+    """Mark every notification of the user read and zero the counter"""
+    cursor.execute('UPDATE users SET unread_notifications = 0, updated_at = updated_at WHERE id = %s',
+                   (user_id,))
+    cursor.execute('UPDATE notifications SET is_read = TRUE WHERE user_id = %s AND is_read = FALSE',
+                   (user_id,))
+
+
+def list_version(cursor, user_id):
+    """
+    Validator for a user's notification list: (etag, unread_count)
+
+    New rows raise the max id, reads lower the unread counter and deleting
+    read rows (by the user or the maintenance purge) lowers the row count,
+    so the triple changes whenever the rendered list would. One counter
+    row plus a covering range scan of the user's (user_id, id) entries.
+    """
+    cursor.execute('''
+        SELECT u.unread_notifications AS unread, n.total, n.max_id
+        FROM users u
+        JOIN (
+            SELECT COUNT(*) AS total, COALESCE(MAX(id), 0) AS max_id
+            FROM notifications
+            WHERE user_id = %s
+        ) n
+        WHERE u.id = %s
+    ''', (user_id, user_id))
+    row = cursor.fetchone()
+    if row is None:
+        return 'n0-0-0', 0
+    unread, total, max_id = (row['unread'], row['total'], row['max_id']) if isinstance(row, dict) else row
+    return f'n{max_id}-{total}-{unread}', unread
+
+
+def unread_count(cursor, user_id):
+    """Current unread counter for one user (0 for unknown users)"""
+    cursor.execute('SELECT unread_notifications FROM users WHERE id = %s', (user_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return 0
+    return row['unread_notifications'] if isinstance(row, dict) else row[0]
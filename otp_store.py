@@ -0,0 +1,168 @@
+"""
+One-time code storage
+OTP_STORE picks the backend:
+  mysql - the otp_codes table (default; works across hosts)
+  local - an SQLite file shared by the worker processes of a single host
+Both consume a code with one conditional statement, so a verify is a
+single round trip and two concurrent requests can't both use the same code.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from config import OTP_EXPIRY_MINUTES, OTP_LENGTH, OTP_STORE_CONFIG
+from db import get_db
+
+
+class OTPStore:
+    """Backend interface: issue() replaces the user's unused code, verify() consumes it"""
+
+    def issue(self, user_id, code):
+        raise NotImplementedError
+
+    def verify(self, user_id, code):
+        raise NotImplementedError
+
+    def purge_expired(self, stop=None):
+        """Delete expired codes; returns the number removed"""
+        raise NotImplementedError
+
+
+class MySQLOTPStore(OTPStore):
+    """otp_codes on the request-scoped connection; expiry uses the DB clock"""
+
+    def issue(self, user_id, code):
+        conn = get_db()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('DELETE FROM otp_codes WHERE user_id = %s AND is_used = FALSE', (user_id,))
+            cursor.execute('''
+                INSERT INTO otp_codes (user_id, code, expires_at)
+                VALUES (%s, %s, NOW() + INTERVAL %s MINUTE)
+            ''', (user_id, code, OTP_EXPIRY_MINUTES))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def verify(self, user_id, code):
+        # Served by idx_user_code (user_id, code); rowcount says whether it was valid
+        conn = get_db()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                UPDATE otp_codes SET is_used = TRUE
+                WHERE user_id = %s AND code = %s AND is_used = FALSE AND expires_at > NOW()
+            ''', (user_id, code))
+            consumed = cursor.rowcount > 0
+            conn.commit()
+        finally:
+            cursor.close()
+        return consumed
+
+    def purge_expired(self, stop=None):
+        # Small batches on idx_expires so verify never queues behind the purge
+        from maintenance import purge_in_batches
+        return purge_in_batches('''
+            DELETE FROM otp_codes
+            WHERE expires_at < NOW()
+            ORDER BY expires_at
+            LIMIT %s
+        ''', stop=stop)
+
+
+class LocalOTPStore(OTPStore):
+    """
+    SQLite file shared by every gunicorn worker on this host
+
+    Only for single-host deploys: codes issued here are invisible to other
+    hosts. One row per user, deleted when the code is used.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS otp_codes (
+                    user_id INTEGER PRIMARY KEY,
+                    code TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def issue(self, user_id, code):
+        self._conn().execute('INSERT OR REPLACE INTO otp_codes (user_id, code, expires_at) VALUES (?, ?, ?)',
+                             (user_id, code, time.time() + OTP_EXPIRY_MINUTES * 60))
+
+    def verify(self, user_id, code):
+        cursor = self._conn().execute('DELETE FROM otp_codes WHERE user_id = ? AND code = ? AND expires_at > ?',
+                                      (user_id, code, time.time()))
+        return cursor.rowcount > 0
+
+    def purge_expired(self, stop=None):
+        return self._conn().execute('DELETE FROM otp_codes WHERE expires_at <= ?', (time.time(),)).rowcount
+
+
+def create_store(backend, path=None):
+    if backend == 'local':
+        return LocalOTPStore(path)
+    if backend == 'mysql':
+        return MySQLOTPStore()
+    raise ValueError(f'Unknown OTP_STORE backend: {backend}')
+
+
+store = create_store(OTP_STORE_CONFIG['backend'], OTP_STORE_CONFIG['path'])
+
+
+def store_otp(user_id, otp_code):
+    """
+    Store a freshly generated code for the user, replacing any unused one
+
+    Returns:
+        Boolean indicating success
+    """
+    try:
+        store.issue(user_id, otp_code)
+        return True
+    except Exception as e:
+        print(f"Error storing OTP: {str(e)}")
+        return False
+
+
+def verify_otp(user_id, otp_code):
+    """
+    Check and consume a code in one step
+
+    Returns:
+        Boolean indicating if OTP is valid
+    """
+    # Malformed input never reaches the backend
+    if not otp_code or len(otp_code) != OTP_LENGTH or not otp_code.isdigit():
+        return False
+    try:
+        return store.verify(user_id, otp_code)
+    except Exception as e:
+        print(f"Error verifying OTP: {str(e)}")
+        return False
+
+
+def cleanup_expired_otps():
+    """Remove expired OTP codes from the active backend"""
+    try:
+        return store.purge_expired()
+    except Exception as e:
+        print(f"Error cleaning up OTPs: {str(e)}")
+        return 0
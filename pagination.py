@@ -0,0 +1,155 @@
+"""
+Keyset (cursor) pagination helpers for the admin list pages
+
+Pages are fetched with WHERE (sort_key, id) < (last_sort_key, last_id)
+instead of OFFSET, so page 500 costs the same index range scan as page 1.
+Totals come from a short-lived per-process count cache.
+Every sort column must be NOT NULL: a NULL would drop out of the
+row-value comparison and end pagination at the boundary row.
+"""
+import base64
+import json
+import threading
+import time
+
+from config import COUNT_CACHE_TTL
+
+
+def encode_token(row, order_by):
+    """Opaque URL-safe token holding the sort-key values of a boundary row"""
+    if any(row[key] is None for _, key in order_by):
+        raise ValueError(f'keyset sort keys must be NOT NULL, got {[row[key] for _, key in order_by]}')
+    values = [str(row[key]) for _, key in order_by]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(token, order_by):
+    """Decode a token from the query string; invalid tokens mean 'first page'"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(order_by) or None in values:
+        return None
+    return values
+
+
+def _keyset_condition(order_by, op):
+    """(a, b) < (x, y) expanded so MySQL can use a range scan on the index"""
+    clauses = []
+    for i, (column, _) in enumerate(order_by):
+        equal = [f'{col} = %s' for col, _ in order_by[:i]]
+        clauses.append('(' + ' AND '.join(equal + [f'{column} {op} %s']) + ')')
+    return '(' + ' OR '.join(clauses) + ')'
+
+
+def _keyset_params(values):
+    params = []
+    for i in range(len(values)):
+        params.extend(values[:i])
+        params.append(values[i])
+    return params
+
+
+class KeysetPage:
+    def __init__(self, items, next_token, prev_token):
+        self.items = items
+        self.next_token = next_token
+        self.prev_token = prev_token
+
+    @property
+    def has_next(self):
+        return self.next_token is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_token is not None
+
+
+def keyset_paginate(cursor, select_sql, where, params, order_by, per_page,
+                    after=None, before=None):
+    """
+    Fetch one page ordered by `order_by` descending
+
+    Args:
+        cursor: dictionary cursor
+        select_sql: SELECT ... FROM ... JOIN ... (no WHERE/ORDER/LIMIT)
+        where: base predicate string ('1=1' when unfiltered)
+        params: parameters for `where`
+        order_by: [(column_expression, row_key), ...] of NOT NULL columns,
+            ending in a unique one
+        per_page: page size
+        after / before: tokens from a previous page's next/prev links
+
+    Returns:
+        KeysetPage
+    """
+    after_values = decode_token(after, order_by)
+    before_values = decode_token(before, order_by) if after_values is None else None
+
+    conditions = [f'({where})']
+    query_params = list(params)
+    if after_values is not None:
+        conditions.append(_keyset_condition(order_by, '<'))
+        query_params += _keyset_params(after_values)
+        direction = 'DESC'
+    elif before_values is not None:
+        conditions.append(_keyset_condition(order_by, '>'))
+        query_params += _keyset_params(before_values)
+        direction = 'ASC'
+    else:
+        direction = 'DESC'
+
+    order_sql = ', '.join(f'{column} {direction}' for column, _ in order_by)
+    cursor.execute(f'{select_sql} WHERE {" AND ".join(conditions)} ORDER BY {order_sql} LIMIT %s',
+                   tuple(query_params + [per_page + 1]))
+    rows = cursor.fetchall()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if before_values is not None:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, after_values is not None
+
+    next_token = encode_token(rows[-1], order_by) if rows and has_next else None
+    prev_token = encode_token(rows[0], order_by) if rows and has_prev else None
+    return KeysetPage(rows, next_token, prev_token)
+
+
+_count_cache = {}
+_count_lock = threading.Lock()
+
+
+def cached_count(cursor, sql, params=(), ttl=None):
+    """
+    Run a COUNT(*) query at most once per `ttl` seconds per process
+
+    The query must return a single column. Counts may be up to `ttl`
+    seconds stale, which is fine for "Showing x of ~N" labels.
+    """
+    ttl = COUNT_CACHE_TTL if ttl is None else ttl
+    key = (sql, tuple(params))
+    now = time.monotonic()
+    with _count_lock:
+        hit = _count_cache.get(key)
+        if hit and hit[1] > now:
+            return hit[0]
+
+    cursor.execute(sql, tuple(params))
+    row = cursor.fetchone()
+    value = next(iter(row.values())) if isinstance(row, dict) else row[0]
+    with _count_lock:
+        _count_cache[key] = (value, now + ttl)
+    return value
+
+
+def invalidate_counts():
+    """Drop cached counts (call after bulk writes that should show up immediately)"""
+    with _count_lock:
+        _count_cache.clear()
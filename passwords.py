@@ -0,0 +1,118 @@
+"""
+Password hashing policy
+PASSWORD_HASH_METHOD is a werkzeug method string: 'scrypt:N:r:p' or
+'pbkdf2:sha256:iterations'. `flask calibrate-hashing` measures candidates
+on the current machine and suggests the strongest one under a target time.
+Hashes stored under any other method are upgraded on the next successful
+login, while the plaintext is at hand.
+
+hashlib's scrypt and pbkdf2 release the GIL, so a hash doesn't stall the
+other gthread request threads. A per-process semaphore caps how many run
+at once: each scrypt hash allocates 128 * N * r bytes, and a burst of
+logins must not exhaust CPU or memory on a small container.
+"""
+import statistics
+import threading
+import time
+
+import click
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from config import PASSWORD_HASH_CONFIG
+
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_CONFIG['max_concurrent'])
+
+
+def canonical_method(method):
+    """Spell out werkzeug's defaults ('scrypt' -> 'scrypt:32768:8:1') as they appear in stored hashes"""
+    algorithm, *args = method.split(':')
+    if algorithm == 'scrypt':
+        defaults = ['32768', '8', '1']
+    elif algorithm == 'pbkdf2':
+        defaults = ['sha256', '600000']
+    else:
+        return method
+    return ':'.join([algorithm] + args + defaults[len(args):])
+
+
+METHOD = canonical_method(PASSWORD_HASH_CONFIG['method'])
+
+
+def hash_password(password):
+    """Hash with the current policy"""
+    with _slots:
+        return generate_password_hash(password, method=METHOD)
+
+
+def verify_password(stored_hash, password):
+    with _slots:
+        return check_password_hash(stored_hash, password)
+
+
+def needs_rehash(stored_hash):
+    """True if the hash was made with a method other than the current policy"""
+    return stored_hash.split('$', 1)[0] != METHOD
+
+
+def rehash_password(cursor, user_id, stored_hash, password):
+    """
+    Re-store a verified password under the current policy
+
+    Compare-and-set on the old hash, so a password change that lands in the
+    meantime is never overwritten. Returns True if the row was updated.
+    """
+    cursor.execute('UPDATE users SET password = %s WHERE id = %s AND password = %s',
+                   (hash_password(password), user_id, stored_hash))
+    return cursor.rowcount == 1
+
+
+def time_method(method, rounds=3):
+    """Median seconds per hash for `method` on this machine"""
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        generate_password_hash('calibration-password', method=method)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def calibrate(algorithm, target, max_memory_mb=64, echo=print):
+    """Strongest method of `algorithm` whose median hash time stays under `target` seconds"""
+    if algorithm == 'scrypt':
+        best = 'scrypt:16384:8:1'
+        for log_n in range(14, 21):
+            n = 2 ** log_n
+            if 128 * n * 8 > max_memory_mb * 1024 * 1024:
+                break
+            method = f'scrypt:{n}:8:1'
+            elapsed = time_method(method)
+            echo(f'  {method:<28} {elapsed * 1000:7.1f} ms')
+            if elapsed > target:
+                break
+            best = method
+        return best
+
+    base = 100_000
+    elapsed = time_method(f'pbkdf2:sha256:{base}')
+    echo(f'  pbkdf2:sha256:{base:<14} {elapsed * 1000:7.1f} ms')
+    # Cost is linear in iterations; never go below the 100k floor
+    iterations = max(int(base * target / elapsed) // 10_000 * 10_000, base)
+    method = f'pbkdf2:sha256:{iterations}'
+    echo(f'  {method:<28} {time_method(method) * 1000:7.1f} ms')
+    return method
+
+
+@click.command('calibrate-hashing')
+@click.option('--target-ms', default=250, show_default=True, help='Target time per hash.')
+@click.option('--algorithm', type=click.Choice(['scrypt', 'pbkdf2']), default='scrypt', show_default=True)
+@click.option('--max-memory-mb', default=64, show_default=True, help='Memory cap per scrypt hash.')
+def calibrate_command(target_ms, algorithm, max_memory_mb):
+    """Pick password hashing parameters for this hardware."""
+    click.echo(f'Current policy: {METHOD} ({time_method(METHOD) * 1000:.1f} ms)')
+    method = calibrate(algorithm, target_ms / 1000, max_memory_mb, echo=click.echo)
+    click.echo(f'✓ Suggested setting: PASSWORD_HASH_METHOD={method}')
+    click.echo('  Existing hashes are upgraded as users log in.')
+
+
+def init_app(app):
+    app.cli.add_command(calibrate_command)
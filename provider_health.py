@@ -0,0 +1,232 @@
+"""
+Circuit breakers for the email providers
+Health lives in email_provider_health, so every web and worker process
+sees the same state. Each provider row keeps a sliding-window failure rate
+(current + previous window, weighted by overlap). The circuit opens on a high
+failure rate or a run of consecutive failures. While it is open, callers skip
+the provider without touching the network. After `open_seconds` exactly one
+caller wins the half-open probe; its result closes or re-opens the circuit.
+
+Reads are cached per process for `cache_seconds`, so a healthy provider costs
+no extra query per send. Health tracking never blocks sending: if the table
+can't be read, the provider is treated as closed.
+"""
+import threading
+import time
+
+import click
+
+from config import PROVIDER_HEALTH_CONFIG
+from db import pooled_connection
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class ProviderHealth:
+    """Shared circuit breaker state for named providers"""
+
+    def __init__(self, window_seconds=60, min_calls=5, failure_rate=0.5,
+                 consecutive_failures=3, open_seconds=30, probe_timeout=30, cache_seconds=2):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.consecutive_failures = consecutive_failures
+        self.open_seconds = open_seconds
+        self.probe_timeout = probe_timeout
+        self.cache_seconds = cache_seconds
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, provider):
+        """(state, monotonic time the open period ends) for `provider`"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(provider)
+        if entry and now - entry['fetched'] < self.cache_seconds:
+            return entry
+
+        with pooled_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute('''
+                SELECT state, GREATEST(TIMESTAMPDIFF(MICROSECOND, NOW(), open_until), 0) / 1000000 AS open_for
+                FROM email_provider_health
+                WHERE provider = %s
+            ''', (provider,))
+            row = cursor.fetchone()
+            cursor.close()
+            conn.commit()
+
+        entry = {
+            'state': row['state'] if row else CLOSED,
+            'open_until': now + float(row['open_for'] or 0) if row else now,
+            'fetched': now
+        }
+        with self._lock:
+            self._cache[provider] = entry
+        return entry
+
+    def _forget(self, provider):
+        with self._lock:
+            self._cache.pop(provider, None)
+
+    def allow(self, provider):
+        """True if a send may be attempted on `provider` right now"""
+        try:
+            entry = self._cached(provider)
+            if entry['state'] == CLOSED:
+                return True
+            if entry['state'] == OPEN and time.monotonic() < entry['open_until']:
+                return False
+            return self._claim_probe(provider)
+        except Exception as e:
+            print(f"Provider health unavailable ({provider}): {str(e)}")
+            return True
+
+    def _claim_probe(self, provider):
+        """Atomically become the single half-open probe (stale probes can be taken over)"""
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE email_provider_health
+                SET state = %s, probe_started_at = NOW()
+                WHERE provider = %s
+                  AND ((state = %s AND open_until <= NOW())
+                    OR (state = %s AND probe_started_at < NOW() - INTERVAL %s SECOND))
+            ''', (HALF_OPEN, provider, OPEN, HALF_OPEN, self.probe_timeout))
+            claimed = cursor.rowcount == 1
+            conn.commit()
+            cursor.close()
+        self._forget(provider)
+        if claimed:
+            print(f"⚠️ {provider} circuit half-open, sending a probe")
+        return claimed
+
+    def record(self, provider, ok, error=None):
+        """Fold one send outcome into the provider's window and move the circuit"""
+        try:
+            with pooled_connection() as conn:
+                self._record(conn, provider, ok, error)
+        except Exception as e:
+            print(f"Could not record {provider} health: {str(e)}")
+        finally:
+            self._forget(provider)
+
+    def _record(self, conn, provider, ok, error):
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute('INSERT IGNORE INTO email_provider_health (provider) VALUES (%s)', (provider,))
+            cursor.execute('''
+                SELECT state, successes, failures, prev_successes, prev_failures, consecutive_failures,
+                       TIMESTAMPDIFF(MICROSECOND, window_start, NOW()) / 1000000 AS window_age
+                FROM email_provider_health
+                WHERE provider = %s
+                FOR UPDATE
+            ''', (provider,))
+            row = cursor.fetchone()
+
+            # Slide the window: keep one previous window for the weighted estimate
+            age = float(row['window_age'])
+            shift = 0
+            if age >= 2 * self.window_seconds:
+                row.update(prev_successes=0, prev_failures=0, successes=0, failures=0)
+                shift, age = None, 0.0
+            elif age >= self.window_seconds:
+                row.update(prev_successes=row['successes'], prev_failures=row['failures'],
+                           successes=0, failures=0)
+                shift, age = self.window_seconds, age - self.window_seconds
+
+            if ok:
+                row['successes'] += 1
+                row['consecutive_failures'] = 0
+            else:
+                row['failures'] += 1
+                row['consecutive_failures'] += 1
+
+            weight = max(1 - age / self.window_seconds, 0)
+            calls = row['successes'] + row['failures'] + weight * (row['prev_successes'] + row['prev_failures'])
+            failures = row['failures'] + weight * row['prev_failures']
+
+            state = row['state']
+            if state == HALF_OPEN:
+                state = CLOSED if ok else OPEN
+            elif state == CLOSED and not ok and (
+                    row['consecutive_failures'] >= self.consecutive_failures
+                    or (calls >= self.min_calls and failures / calls >= self.failure_rate)):
+                state = OPEN
+            if state == CLOSED and row['state'] != CLOSED:
+                # A good probe starts the provider over with a clean window
+                row.update(prev_successes=0, prev_failures=0, successes=1, failures=0)
+                shift = None
+
+            if shift is None:
+                window_sql = 'window_start = NOW()'
+            else:
+                window_sql = f'window_start = window_start + INTERVAL {int(shift)} SECOND'
+            cursor.execute(f'''
+                UPDATE email_provider_health
+                SET state = %s, successes = %s, failures = %s,
+                    prev_successes = %s, prev_failures = %s, consecutive_failures = %s,
+                    {window_sql},
+                    open_until = IF(%s, NOW() + INTERVAL %s SECOND, open_until),
+                    probe_started_at = NULL,
+                    last_error = COALESCE(%s, last_error)
+                WHERE provider = %s
+            ''', (state, row['successes'], row['failures'], row['prev_successes'], row['prev_failures'],
+                  row['consecutive_failures'], state == OPEN and row['state'] != OPEN, self.open_seconds,
+                  error[:255] if error else None, provider))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        if state != row['state']:
+            mark = '✓' if state == CLOSED else '✗'
+            print(f"{mark} {provider} circuit {row['state']} -> {state}")
+
+    def snapshot(self, conn):
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute('''
+            SELECT provider, state, successes, failures, prev_successes, prev_failures,
+                   consecutive_failures, open_until, last_error
+            FROM email_provider_health
+            ORDER BY provider
+        ''')
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.commit()
+        return rows
+
+
+health = ProviderHealth(**PROVIDER_HEALTH_CONFIG)
+
+
+@click.command('provider-health')
+@click.option('--reset', is_flag=True, help='Close every circuit and clear the counters.')
+def provider_health_command(reset):
+    """Show (or reset) the email provider circuit breakers."""
+    with pooled_connection() as conn:
+        if reset:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE email_provider_health
+                SET state = %s, successes = 0, failures = 0, prev_successes = 0, prev_failures = 0,
+                    consecutive_failures = 0, window_start = NOW(), open_until = NULL, probe_started_at = NULL
+            ''', (CLOSED,))
+            conn.commit()
+            cursor.close()
+        rows = health.snapshot(conn)
+    for row in rows:
+        click.echo(f"{row['provider']:<10} {row['state']:<10} "
+                   f"ok={row['successes']}+{row['prev_successes']} "
+                   f"fail={row['failures']}+{row['prev_failures']} "
+                   f"streak={row['consecutive_failures']} open_until={row['open_until'] or '-'} "
+                   f"last_error={row['last_error'] or '-'}")
+
+
+def init_app(app):
+    from migrations import db_cli
+    db_cli.add_command(provider_health_command)
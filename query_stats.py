@@ -0,0 +1,143 @@
+"""
+Per-request query instrumentation
+Counts queries and DB time, flags repeated statement shapes (N+1) and
+reports totals through the Server-Timing header and a slow-request log line
+"""
+import re
+import time
+from collections import Counter
+
+from flask import current_app, g, request
+
+from config import QUERY_STATS_CONFIG
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r'\b\d+\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Reduce a statement to its shape so repeats with different values match"""
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    shape = _STRING_LITERAL.sub('?', sql)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _IN_LIST.sub('IN (...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class QueryStats:
+    """Accumulates query timings for a single request"""
+
+    def __init__(self, keep_slowest=5):
+        self.count = 0
+        self.total_ms = 0.0
+        self.fetch_ms = 0.0
+        self.shapes = Counter()
+        self.slowest = []
+        self.keep_slowest = keep_slowest
+
+    def record(self, sql, elapsed_ms):
+        shape = normalize_sql(sql)
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.shapes[shape] += 1
+        self.slowest.append((elapsed_ms, shape))
+        self.slowest.sort(key=lambda item: item[0], reverse=True)
+        del self.slowest[self.keep_slowest:]
+
+    def record_fetch(self, elapsed_ms):
+        """Time spent reading results; rows of unbuffered cursors arrive here, not in execute()"""
+        self.total_ms += elapsed_ms
+        self.fetch_ms += elapsed_ms
+
+    def repeated(self, threshold):
+        """Statement shapes executed more than `threshold` times"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > threshold]
+
+
+class InstrumentedCursor:
+    """Cursor wrapper that times execute()/executemany() and the fetch methods into a QueryStats"""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            self._stats.record(operation, (time.perf_counter() - start) * 1000)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            self._stats.record(operation, (time.perf_counter() - start) * 1000)
+
+    def _timed_fetch(self, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._stats.record_fetch((time.perf_counter() - start) * 1000)
+
+    def fetchone(self):
+        return self._timed_fetch(self._cursor.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed_fetch(self._cursor.fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return self._timed_fetch(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def current_stats():
+    """QueryStats for the active request, or None outside instrumented requests"""
+    return g.get('query_stats')
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.query_stats = QueryStats(keep_slowest=QUERY_STATS_CONFIG['slowest_kept'])
+
+
+def _finish_request(response):
+    stats = g.pop('query_stats', None)
+    started = g.pop('request_started', None)
+    if stats is None or started is None:
+        return response
+
+    total_ms = (time.perf_counter() - started) * 1000
+    response.headers.add('Server-Timing',
+                         f'db;dur={stats.total_ms:.1f};desc="{stats.count} queries, {stats.fetch_ms:.1f}ms fetching", '
+                         f'app;dur={total_ms:.1f}')
+
+    threshold = QUERY_STATS_CONFIG['repeat_threshold']
+    for shape, n in stats.repeated(threshold):
+        current_app.logger.warning('N+1 suspect on %s %s: %dx %s',
+                                   request.method, request.path, n, shape[:200])
+
+    if total_ms >= QUERY_STATS_CONFIG['slow_request_ms']:
+        worst = '; '.join(f'{ms:.1f}ms {shape[:120]}' for ms, shape in stats.slowest)
+        current_app.logger.warning('Slow request %s %s: %.1fms total, %d queries, %.1fms in DB '
+                                   '(%.1fms fetching) | worst: %s',
+                                   request.method, request.path, total_ms,
+                                   stats.count, stats.total_ms, stats.fetch_ms, worst)
+    return response
+
+
+def init_app(app):
+    if not QUERY_STATS_CONFIG['enabled']:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
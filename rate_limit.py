@@ -0,0 +1,112 @@
+"""
+Token-bucket throttling shared by every worker process
+Buckets live in rate_limit_buckets, one row per rule and key (IP, username
+or user id). A check is one INSERT ... ON DUPLICATE KEY UPDATE that refills
+the bucket for the time elapsed and takes a token if one is available. So
+every gunicorn worker and host sees the same counts, and a throttled request
+is turned away with a 429 before any password hashing or email work starts.
+"""
+import hashlib
+import math
+
+from flask import flash, make_response, render_template, request
+
+from config import RATE_LIMIT_CONFIG
+from db import get_db
+
+
+def client_ip():
+    """Client address, taken from X-Forwarded-For behind `trusted_proxies` proxies"""
+    proxies = RATE_LIMIT_CONFIG['trusted_proxies']
+    forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',') if part.strip()]
+    if proxies and len(forwarded) >= proxies:
+        # Each trusted proxy appends the address it saw; anything further left is client-supplied
+        return forwarded[-proxies]
+    return request.remote_addr or 'unknown'
+
+
+def _bucket_key(rule, value):
+    key = f'{rule}:{str(value).lower()}'
+    if len(key) > 191:
+        key = f'{rule}:{hashlib.sha1(key.encode()).hexdigest()}'
+    return key
+
+
+def consume(rule, value):
+    """
+    Take one token from the (rule, value) bucket
+
+    Returns:
+        (allowed, retry_after_seconds)
+    """
+    if not RATE_LIMIT_CONFIG['enabled'] or value is None:
+        return True, 0
+    capacity, period = RATE_LIMIT_CONFIG['rules'][rule]
+    rate = capacity / period
+    key = _bucket_key(rule, value)
+
+    try:
+        conn = get_db()
+        cursor = conn.cursor()
+        # Assignments run left to right: `allowed` and `tokens` see the old
+        # tokens/updated_at, and `tokens` sees the new `allowed`
+        cursor.execute('''
+            INSERT INTO rate_limit_buckets (bucket_key, tokens, allowed, updated_at)
+            VALUES (%s, %s, TRUE, NOW(6))
+            ON DUPLICATE KEY UPDATE
+                allowed = LEAST(%s, tokens + TIMESTAMPDIFF(MICROSECOND, updated_at, NOW(6)) * %s / 1000000) >= 1,
+                tokens = LEAST(%s, tokens + TIMESTAMPDIFF(MICROSECOND, updated_at, NOW(6)) * %s / 1000000) - allowed,
+                updated_at = NOW(6)
+        ''', (key, capacity - 1, capacity, rate, capacity, rate))
+        cursor.execute('SELECT allowed, tokens FROM rate_limit_buckets WHERE bucket_key = %s', (key,))
+        allowed, tokens = cursor.fetchone()
+        conn.commit()
+        cursor.close()
+    except Exception as e:
+        # Throttling must never take login down with it
+        print(f"Rate limit check failed ({rule}): {str(e)}")
+        return True, 0
+
+    if allowed:
+        return True, 0
+    return False, max(math.ceil((1 - tokens) / rate), 1)
+
+
+def available(rule, value):
+    """
+    Check that the bucket has a token without taking it
+
+    Used for buckets that only count failures (e.g. per-username logins),
+    so a stranger can't lock a user out just by trying their name.
+    """
+    if not RATE_LIMIT_CONFIG['enabled'] or value is None:
+        return True, 0
+    capacity, period = RATE_LIMIT_CONFIG['rules'][rule]
+    rate = capacity / period
+
+    try:
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT LEAST(%s, tokens + TIMESTAMPDIFF(MICROSECOND, updated_at, NOW(6)) * %s / 1000000)
+            FROM rate_limit_buckets
+            WHERE bucket_key = %s
+        ''', (capacity, rate, _bucket_key(rule, value)))
+        row = cursor.fetchone()
+        cursor.close()
+    except Exception as e:
+        print(f"Rate limit check failed ({rule}): {str(e)}")
+        return True, 0
+
+    tokens = float(row[0]) if row else capacity
+    if tokens >= 1:
+        return True, 0
+    return False, max(math.ceil((1 - tokens) / rate), 1)
+
+
+def throttled(template, retry_after, **context):
+    """429 page with a Retry-After header, rendered without touching anything expensive"""
+    flash(f'Too many attempts. Please try again in {retry_after} seconds.', 'error')
+    response = make_response(render_template(template, **context), 429)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
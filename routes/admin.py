@@ -1,40 +1,87 @@
-from flask import Blueprint, render_template, request, session, flash, redirect, url_for, Response
-from routes.auth import login_required, role_required, get_db_connection
+from flask import Blueprint, render_template, request, session, flash, redirect, url_for, Response, jsonify, send_file, abort
+from routes.auth import login_required, role_required, get_db_connection, assign_applicant_sequence, format_applicant_id
 from werkzeug.utils import secure_filename
+from pagination import keyset_paginate, cached_count
+import nav_cache
+from notification_feed import stream_response
+from notifications import list_version, notify_user, notify_users, mark_read, mark_all_read, unread_count
+from email_outbox import queue_status_emails
+import stats_counters
+from passwords import hash_password
+from exports import REPORTS, CUSTOM_REPORTS, custom_filename, stream_csv
+import export_jobs
+from config import EXPORT_JOBS_CONFIG
 import os
-import csv
-from io import StringIO
+from datetime import datetime
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+# Keyset sort orders for the paginated list pages (newest first)
+USER_ORDER = [('u.created_at', 'created_at'), ('u.id', 'id')]
+APPLICANT_ORDER = [('u.created_at', 'created_at'), ('u.id', 'user_id')]
+LEAVE_ORDER = [('la.applied_date', 'applied_date'), ('la.id', 'id')]
+DEPLOYMENT_ORDER = [('d.start_date', 'start_date'), ('d.id', 'id')]
+
+# applicant_applications.status values, in pipeline order
+APPLICATION_STAGES = ['SUBMITTED', 'UNDER REVIEW', 'INITIAL INTERVIEW', 'MEDICAL EXAMINATION',
+                      'PHYSICAL AGILITY TEST', 'NEURO-PSYCHIATRIC EVALUATION', 'FINAL DELIBERATION',
+                      'OATH TAKING PREPARATION', 'REJECTED']
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif'}
 
-def create_notification(title, message, notif_type, related_id=None):
-    """Create a notification for all admin users"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def load_applicant_children(cursor, applicants, key='user_id'):
+    """
+    Attach education and character references to a page of applicants
+    using one IN (...) query per child table instead of two per applicant
+    """
+    for applicant in applicants:
+        applicant['education'] = []
+        applicant['references'] = []
     
-    try:
-        # Get all admin users
-        cursor.execute('SELECT id FROM users WHERE role = "admin"')
-        admins = cursor.fetchall()
-        
-        # Create notification for each admin
-        for admin in admins:
-            cursor.execute('''
-                INSERT INTO notifications (user_id, title, message, type, related_id)
-                VALUES (%s, %s, %s, %s, %s)
-            ''', (admin[0], title, message, notif_type, related_id))
-        
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        print(f"Error creating notification: {e}")
-    finally:
-        cursor.close()
-        conn.close()
-
+    user_ids = list({a[key] for a in applicants})
+    if not user_ids:
+        return applicants
+    
+    by_user = {}
+    for applicant in applicants:
+        by_user.setdefault(applicant[key], []).append(applicant)
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    
+    cursor.execute(f'''
+        SELECT user_id, level, school_name, location, year_graduated
+        FROM education
+        WHERE user_id IN ({placeholders})
+        ORDER BY user_id,
+            CASE level
+                WHEN 'primary' THEN 1
+                WHEN 'secondary' THEN 2
+                WHEN 'bachelor' THEN 3
+                WHEN 'graduate' THEN 4
+            END
+    ''', tuple(user_ids))
+    for row in cursor.fetchall():
+        owner = row.pop('user_id')
+        for applicant in by_user.get(owner, []):
+            applicant['education'].append(row)
+    
+    # Keep the 3-reference limit per applicant
+    cursor.execute(f'''
+        SELECT user_id, reference_name, address, contact_number, relationship
+        FROM (
+            SELECT cr.*, ROW_NUMBER() OVER (PARTITION BY cr.user_id ORDER BY cr.id) AS rn
+            FROM character_references cr
+            WHERE cr.user_id IN ({placeholders})
+        ) ranked
+        WHERE rn <= 3
+        ORDER BY user_id, rn
+    ''', tuple(user_ids))
+    for row in cursor.fetchall():
+        owner = row.pop('user_id')
+        for applicant in by_user.get(owner, []):
+            applicant['references'].append(row)
+    
+    return applicants
 
 @admin_bp.route('/dashboard')
 @login_required
@@ -43,23 +90,13 @@ def dashboard():
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Get profile
-    cursor.execute('SELECT profile_picture FROM admin_profiles WHERE user_id = %s', (session['user_id'],))
-    profile = cursor.fetchone()
-    
-    # Get total users by role
-    cursor.execute('SELECT COUNT(*) as total FROM users WHERE role = "admin"')
-    total_admins = cursor.fetchone()['total']
-    
-    cursor.execute('SELECT COUNT(*) as total FROM users WHERE role = "employee"')
-    total_employees = cursor.fetchone()['total']
-    
-    cursor.execute('SELECT COUNT(*) as total FROM users WHERE role = "applicant"')
-    total_applicants = cursor.fetchone()['total']
-    
-    # Get pending leave applications
-    cursor.execute('SELECT COUNT(*) as total FROM leave_applications WHERE status = "Pending"')
-    pending_leaves = cursor.fetchone()['total']
+    # Totals by role/status come from the materialized counters in one query
+    counters = stats_counters.read_counters(conn)
+    total_admins = counters['users'].get('admin', 0)
+    total_employees = counters['users'].get('employee', 0)
+    total_applicants = counters['users'].get('applicant', 0)
+    pending_leaves = counters['leave_applications'].get('Pending', 0)
+    active_deployments = counters['deployments'].get('Active', 0)
     
     # Get recent leave applications (last 5)
     cursor.execute('''
@@ -74,10 +111,6 @@ def dashboard():
     ''')
     recent_leaves = cursor.fetchall()
     
-    # Get active deployments
-    cursor.execute('SELECT COUNT(*) as total FROM deployments WHERE status = "Active"')
-    active_deployments = cursor.fetchone()['total']
-    
     # Get recent applicants (last 5)
     cursor.execute('''
         SELECT u.id, u.username, u.email, u.created_at,
@@ -89,23 +122,17 @@ def dashboard():
     ''')
     recent_applicants = cursor.fetchall()
     
-    # Get unread notifications count
-    cursor.execute('SELECT COUNT(*) as total FROM notifications WHERE user_id = %s AND is_read = FALSE', (session['user_id'],))
-    unread_notifs = cursor.fetchone()['total']
-    
     cursor.close()
     conn.close()
     
     return render_template('admin/dashboard.html',
-                         profile=profile,
                          total_admins=total_admins,
                          total_employees=total_employees,
                          total_applicants=total_applicants,
                          pending_leaves=pending_leaves,
                          recent_leaves=recent_leaves,
                          active_deployments=active_deployments,
-                         recent_applicants=recent_applicants,
-                         unread_notifs=unread_notifs)
+                         recent_applicants=recent_applicants)
 
 @admin_bp.route('/profile', methods=['GET', 'POST'])
 @login_required
@@ -157,6 +184,7 @@ def profile():
                 (session['user_id'], email, phone, profile_picture))
         
         conn.commit()
+        nav_cache.invalidate(session['user_id'])
         flash('Profile updated successfully!', 'success')
     
     # Get profile data
@@ -176,60 +204,39 @@ def profile():
 @role_required('admin')
 def users():
     tab = request.args.get('tab', 'employees')
-    page = int(request.args.get('page', 1))
+    page = max(request.args.get('page', 1, type=int), 1)
     per_page = 20
-    offset = (page - 1) * per_page
     
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Get admin profile for navbar
-    cursor.execute('SELECT profile_picture FROM admin_profiles WHERE user_id = %s', (session['user_id'],))
-    profile = cursor.fetchone()
+    # Badge counts (cached briefly instead of COUNT(*) on every page view)
+    employee_count = cached_count(cursor, 'SELECT COUNT(*) as count FROM users WHERE role = "employee"')
+    applicant_count = cached_count(cursor, 'SELECT COUNT(*) as count FROM users WHERE role = "applicant"')
     
     if tab == 'employees':
-        # Count total employees
-        cursor.execute('SELECT COUNT(*) as count FROM users WHERE role = "employee"')
-        total = cursor.fetchone()['count']
+        total = employee_count
         
-        # Get paginated employees with profile data
-        cursor.execute('''
+        # Get employees with profile data, one keyset page at a time
+        pager = keyset_paginate(cursor, '''
             SELECT u.id, u.username, u.email, u.created_at, u.status,
                    ep.first_name, ep.middle_name, ep.last_name, ep.`rank`, ep.profile_picture
             FROM users u
             LEFT JOIN employee_profiles ep ON u.id = ep.user_id
-            WHERE u.role = "employee"
-            ORDER BY u.created_at DESC
-            LIMIT %s OFFSET %s
-        ''', (per_page, offset))
-        users_list = cursor.fetchall()
-        
-        # Count total applicants for badge
-        cursor.execute('SELECT COUNT(*) as count FROM users WHERE role = "applicant"')
-        applicant_count = cursor.fetchone()['count']
-        employee_count = total
+        ''', 'u.role = "employee"', (), USER_ORDER, per_page,
+            after=request.args.get('after'), before=request.args.get('before'))
         
     else:  # applicants
-        # Count total applicants
-        cursor.execute('SELECT COUNT(*) as count FROM users WHERE role = "applicant"')
-        total = cursor.fetchone()['count']
+        total = applicant_count
         
-        # Get paginated applicants with profile data
-        cursor.execute('''
+        # Get applicants with profile data, one keyset page at a time
+        pager = keyset_paginate(cursor, '''
             SELECT u.id, u.username, u.email, u.created_at,
                    ap.first_name, ap.last_name, ap.application_status, ap.profile_picture
             FROM users u
             LEFT JOIN applicant_profiles ap ON u.id = ap.user_id
-            WHERE u.role = "applicant"
-            ORDER BY u.created_at DESC
-            LIMIT %s OFFSET %s
-        ''', (per_page, offset))
-        users_list = cursor.fetchall()
-        
-        # Count total employees for badge
-        cursor.execute('SELECT COUNT(*) as count FROM users WHERE role = "employee"')
-        employee_count = cursor.fetchone()['count']
-        applicant_count = total
+        ''', 'u.role = "applicant"', (), USER_ORDER, per_page,
+            after=request.args.get('after'), before=request.args.get('before'))
     
     cursor.close()
     conn.close()
@@ -237,15 +244,15 @@ def users():
     total_pages = (total + per_page - 1) // per_page
     
     return render_template('admin/users.html',
-                         users=users_list,
+                         users=pager.items,
+                         pager=pager,
                          tab=tab,
                          page=page,
                          per_page=per_page,
                          total=total,
                          total_pages=total_pages,
                          employee_count=employee_count,
-                         applicant_count=applicant_count,
-                         profile=profile)
+                         applicant_count=applicant_count)
 
 @admin_bp.route('/users/<int:user_id>/get')
 @login_required
@@ -288,8 +295,6 @@ def get_user(user_id):
 @login_required
 @role_required('admin')
 def add_user():
-    from werkzeug.security import generate_password_hash
-    
     username = request.form.get('username')
     email = request.form.get('email')
     password = request.form.get('password')
@@ -311,7 +316,7 @@ def add_user():
             return {'success': False, 'message': 'Username or email already exists'}
         
         # Hash password
-        hashed_password = generate_password_hash(password)
+        hashed_password = hash_password(password)
         
         # Insert user
         cursor.execute(
@@ -319,12 +324,15 @@ def add_user():
             (username, email, hashed_password, role, status)
         )
         user_id = cursor.lastrowid
+        stats_counters.bump(cursor, 'users', role)
         
         # Create empty profile based on role
         if role == 'employee':
             cursor.execute('INSERT INTO employee_profiles (user_id) VALUES (%s)', (user_id,))
         elif role == 'applicant':
             cursor.execute('INSERT INTO applicant_profiles (user_id) VALUES (%s)', (user_id,))
+            stats_counters.bump(cursor, 'applicant_profiles', 'Pending')
+            assign_applicant_sequence(cursor, user_id)
         elif role == 'admin':
             cursor.execute('INSERT INTO admin_profiles (user_id) VALUES (%s)', (user_id,))
         
@@ -367,16 +375,25 @@ def edit_user():
             conn.close()
             return {'success': False, 'message': 'Username or email already exists'}
         
+        cursor.execute('SELECT role FROM users WHERE id = %s FOR UPDATE', (user_id,))
+        current = cursor.fetchone()
+        
         # Update user in users table
         cursor.execute(
             'UPDATE users SET username = %s, email = %s, role = %s, status = %s WHERE id = %s',
             (username, email, role, status, user_id)
         )
+        if current:
+            stats_counters.move(cursor, 'users', current['role'], role)
         
         # Also update email in profile tables if changed (only for tables that have email column)
         cursor.execute('UPDATE applicant_profiles SET email = %s WHERE user_id = %s', (email, user_id))
         cursor.execute('UPDATE admin_profiles SET email = %s WHERE user_id = %s', (email, user_id))
         
+        # Users moved into the applicant role need a display sequence too
+        if role == 'applicant':
+            assign_applicant_sequence(cursor, user_id)
+        
         conn.commit()
         cursor.close()
         conn.close()
@@ -401,14 +418,18 @@ def delete_user(user_id):
     cursor = conn.cursor(dictionary=True)
     
     try:
+        owned = stats_counters.owned_by_user(cursor, user_id)
+        
         # Delete user (cascade will delete profile)
         cursor.execute('DELETE FROM users WHERE id = %s', (user_id,))
         
         if cursor.rowcount == 0:
+            conn.rollback()
             cursor.close()
             conn.close()
             return {'success': False, 'message': 'User not found'}
         
+        stats_counters.release(cursor, owned)
         conn.commit()
         cursor.close()
         conn.close()
@@ -428,51 +449,27 @@ def recruitment():
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Get admin profile for nav
-    cursor.execute('SELECT profile_picture FROM admin_profiles WHERE user_id = %s', (session['user_id'],))
-    profile = cursor.fetchone()
-    
     # Pagination
-    page = request.args.get('page', 1, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
     per_page = 20
-    offset = (page - 1) * per_page
     
-    # Get all applicants with pagination
-    cursor.execute('''
+    # Get applicants one keyset page at a time
+    pager = keyset_paginate(cursor, '''
         SELECT u.id as user_id, u.email as user_email, u.status as account_status,
-               u.created_at, ap.first_name, ap.middle_name, ap.last_name, ap.email, ap.phone,
-               ap.application_status, ap.applied_date
+               u.created_at, u.applicant_seq, ap.first_name, ap.middle_name, ap.last_name,
+               ap.email, ap.phone, ap.application_status, ap.applied_date
         FROM users u
         LEFT JOIN applicant_profiles ap ON u.id = ap.user_id
-        WHERE u.role = 'applicant'
-        ORDER BY u.created_at DESC
-        LIMIT %s OFFSET %s
-    ''', (per_page, offset))
-    applicants = cursor.fetchall()
+    ''', "u.role = 'applicant'", (), APPLICANT_ORDER, per_page,
+        after=request.args.get('after'), before=request.args.get('before'))
+    applicants = pager.items
     
-    # Generate applicant IDs for each applicant
+    # Applicant IDs come from the sequence persisted at registration
     for applicant in applicants:
-        if applicant['created_at']:
-            # Get year from created_at
-            year = applicant['created_at'].strftime('%y')
-            
-            # Count applicants created in the same year before this one
-            cursor.execute('''
-                SELECT COUNT(*) as count 
-                FROM users 
-                WHERE role = 'applicant' 
-                AND YEAR(created_at) = %s
-                AND created_at <= %s
-            ''', (applicant['created_at'].year, applicant['created_at']))
-            
-            sequence = cursor.fetchone()['count']
-            applicant['applicant_id'] = f"{year}-{sequence:03d}"
-        else:
-            applicant['applicant_id'] = 'N/A'
+        applicant['applicant_id'] = format_applicant_id(applicant)
     
     # Get total count
-    cursor.execute('SELECT COUNT(*) as total FROM users WHERE role = "applicant"')
-    total = cursor.fetchone()['total']
+    total = cached_count(cursor, 'SELECT COUNT(*) as total FROM users WHERE role = "applicant"')
     total_pages = (total + per_page - 1) // per_page
     
     cursor.close()
@@ -480,11 +477,12 @@ def recruitment():
     
     return render_template('admin/recruitment.html',
                          applicants=applicants,
+                         application_stages=APPLICATION_STAGES,
+                         pager=pager,
                          page=page,
                          per_page=per_page,
                          total=total,
-                         total_pages=total_pages,
-                         profile=profile)
+                         total_pages=total_pages)
 
 @admin_bp.route('/recruitment/<int:user_id>/view')
 @login_required
@@ -493,10 +491,10 @@ def view_applicant(user_id):
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Get applicant details with created_at and calculate applicant ID
+    # Get applicant details with created_at and persisted sequence
     cursor.execute('''
         SELECT u.id, u.email as user_email, u.status as account_status, u.created_at,
-               ap.first_name, ap.middle_name, ap.last_name, ap.email, ap.phone,
+               u.applicant_seq, ap.first_name, ap.middle_name, ap.last_name, ap.email, ap.phone,
                ap.address, ap.date_of_birth, ap.application_status,
                DATE_FORMAT(u.created_at, '%%b %%d, %%Y') as applied_date
         FROM users u
@@ -505,18 +503,9 @@ def view_applicant(user_id):
     ''', (user_id,))
     applicant = cursor.fetchone()
     
-    # Generate applicant ID in format YY-XXX (e.g., 25-001)
-    if applicant and applicant['created_at']:
-        year = applicant['created_at'].strftime('%y')
-        # Count applicants registered in the same year up to this user
-        cursor.execute('''
-            SELECT COUNT(*) as count FROM users
-            WHERE role = 'applicant' AND YEAR(created_at) = YEAR(%s) AND id <= %s
-        ''', (applicant['created_at'], user_id))
-        sequence = cursor.fetchone()['count']
-        applicant['applicant_id'] = f"{year}-{sequence:03d}"
-    else:
-        applicant['applicant_id'] = 'N/A'
+    # Applicant ID in format YY-XXX (e.g., 25-001)
+    if applicant:
+        applicant['applicant_id'] = format_applicant_id(applicant)
     
     cursor.close()
     conn.close()
@@ -553,6 +542,20 @@ def update_applicant_status():
     cursor = conn.cursor(dictionary=True)
     
     try:
+        # Only an applicant with an application row gets moved, notified and emailed
+        cursor.execute('''
+            SELECT aa.user_id
+            FROM applicant_applications aa
+            JOIN users u ON u.id = aa.user_id AND u.role = 'applicant'
+            WHERE aa.user_id = %s
+            FOR UPDATE
+        ''', (applicant_id,))
+        if cursor.fetchone() is None:
+            conn.rollback()
+            cursor.close()
+            conn.close()
+            return {'success': False, 'message': 'Applicant has no application'}
+        
         # Update application status in applicant_applications table
         update_query = '''
             UPDATE applicant_applications 
@@ -584,16 +587,15 @@ def update_applicant_status():
         ))
         
         # Also create notification for the applicant
-        cursor.execute('''
-            INSERT INTO notifications (user_id, title, message, type)
-            VALUES (%s, %s, %s, 'applicant')
-        ''', (
-            applicant_id,
-            f'Application Status Update',
-            f'Your application status has been updated to: {status}. {notes if notes else ""}'
-        ))
+        notify_user(cursor, applicant_id,
+                    'Application Status Update',
+                    f'Your application status has been updated to: {status}. {notes if notes else ""}',
+                    'applicant')
+        # Emailed by the outbox worker, same path as bulk updates
+        queue_status_emails(cursor, [applicant_id], status, notes)
         
         conn.commit()
+        nav_cache.invalidate(int(applicant_id))
         cursor.close()
         conn.close()
         
@@ -605,6 +607,85 @@ def update_applicant_status():
         conn.close()
         return {'success': False, 'message': f'Error updating status: {str(e)}'}
 
+@admin_bp.route('/recruitment/bulk-update-status', methods=['POST'])
+@login_required
+@role_required('admin')
+def bulk_update_applicant_status():
+    """
+    Move a cohort to a new stage: the selected applicants, or everyone
+    currently in `from_status`. One UPDATE, one set-based notification
+    fan-out and a single queued email that the worker sends in batches.
+    Only applicant users with an application row are moved and notified;
+    any other posted id is ignored.
+    """
+    applicant_ids = [int(i) for i in request.form.getlist('applicant_ids') if i.isdigit()]
+    from_status = request.form.get('from_status')
+    status = request.form.get('status')
+    notes = request.form.get('notes', '')
+    
+    if not status or not (applicant_ids or from_status):
+        return {'success': False, 'message': 'Missing required fields'}
+    if status not in APPLICATION_STAGES or (from_status and from_status not in APPLICATION_STAGES):
+        return {'success': False, 'message': 'Invalid application stage'}
+    
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    
+    try:
+        selected = bool(applicant_ids)
+        if selected:
+            placeholders = ', '.join(['%s'] * len(applicant_ids))
+            cursor.execute(f'''
+                SELECT aa.user_id
+                FROM applicant_applications aa
+                JOIN users u ON u.id = aa.user_id AND u.role = 'applicant'
+                WHERE aa.user_id IN ({placeholders})
+                FOR UPDATE
+            ''', tuple(applicant_ids))
+        else:
+            cursor.execute('''
+                SELECT aa.user_id
+                FROM applicant_applications aa
+                JOIN users u ON u.id = aa.user_id AND u.role = 'applicant'
+                WHERE aa.status = %s
+                FOR UPDATE
+            ''', (from_status,))
+        applicant_ids = [row['user_id'] for row in cursor.fetchall()]
+        if not applicant_ids:
+            conn.rollback()
+            cursor.close()
+            conn.close()
+            if selected:
+                return {'success': False, 'message': 'None of the selected users has an application'}
+            return {'success': False, 'message': f'No applicants are in {from_status}'}
+        
+        placeholders = ', '.join(['%s'] * len(applicant_ids))
+        cursor.execute(f'''
+            UPDATE applicant_applications 
+            SET status = %s, stage_notes = %s, updated_at = NOW()
+            WHERE user_id IN ({placeholders})
+        ''', (status, notes, *applicant_ids))
+        
+        notify_users(cursor, applicant_ids,
+                     'Application Status Update',
+                     f'Your application status has been updated to: {status}. {notes if notes else ""}',
+                     'applicant')
+        queue_status_emails(cursor, applicant_ids, status, notes)
+        
+        conn.commit()
+        nav_cache.invalidate(*applicant_ids)
+        cursor.close()
+        conn.close()
+        
+        return {'success': True,
+                'message': f'{len(applicant_ids)} applicants updated to {status}. Status emails are being sent.'}
+    
+    except Exception as e:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        return {'success': False, 'message': f'Error updating status: {str(e)}'}
+
 @admin_bp.route('/recruitment/edit', methods=['POST'])
 @login_required
 @role_required('admin')
@@ -653,26 +734,21 @@ def view_all_applicants():
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Get admin profile for nav
-    cursor.execute('SELECT profile_picture FROM admin_profiles WHERE user_id = %s', (session['user_id'],))
-    profile = cursor.fetchone()
-    
     # Pagination
-    page = request.args.get('page', 1, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
     per_page = 10
-    offset = (page - 1) * per_page
     
     # Get total count
-    cursor.execute('SELECT COUNT(*) as total FROM users WHERE role = "applicant"')
-    total = cursor.fetchone()['total']
+    total = cached_count(cursor, 'SELECT COUNT(*) as total FROM users WHERE role = "applicant"')
     total_pages = (total + per_page - 1) // per_page
     
-    # Get applicants with pagination
-    cursor.execute('''
+    # Get applicants one keyset page at a time
+    pager = keyset_paginate(cursor, '''
         SELECT 
             u.id as user_id,
             u.email as user_email,
             u.status as account_status,
+            u.created_at,
             u.created_at as registration_date,
             ap.first_name,
             ap.middle_name,
@@ -705,44 +781,19 @@ def view_all_applicants():
         LEFT JOIN applicant_profiles ap ON u.id = ap.user_id
         LEFT JOIN applicant_address addr ON u.id = addr.user_id
         LEFT JOIN applicant_applications app ON u.id = app.user_id
-        WHERE u.role = 'applicant'
-        ORDER BY u.created_at DESC
-        LIMIT %s OFFSET %s
-    ''', (per_page, offset))
-    applicants = cursor.fetchall()
+    ''', "u.role = 'applicant'", (), APPLICANT_ORDER, per_page,
+        after=request.args.get('after'), before=request.args.get('before'))
+    applicants = pager.items
     
-    # For each applicant, get their education and references
-    for applicant in applicants:
-        # Get education
-        cursor.execute('''
-            SELECT level, school_name, location, year_graduated
-            FROM education
-            WHERE user_id = %s
-            ORDER BY 
-                CASE level
-                    WHEN 'primary' THEN 1
-                    WHEN 'secondary' THEN 2
-                    WHEN 'bachelor' THEN 3
-                    WHEN 'graduate' THEN 4
-                END
-        ''', (applicant['user_id'],))
-        applicant['education'] = cursor.fetchall()
-        
-        # Get character references
-        cursor.execute('''
-            SELECT reference_name, address, contact_number, relationship
-            FROM character_references
-            WHERE user_id = %s
-            LIMIT 3
-        ''', (applicant['user_id'],))
-        applicant['references'] = cursor.fetchall()
+    # Education and references for the whole page in two queries
+    load_applicant_children(cursor, applicants)
     
     cursor.close()
     conn.close()
     
     return render_template('admin/view_all_applicants.html',
                          applicants=applicants,
-                         profile=profile,
+                         pager=pager,
                          page=page,
                          per_page=per_page,
                          total=total,
@@ -816,29 +867,7 @@ def get_applicant_details(user_id):
         if not applicant:
             return json.dumps({'success': False, 'message': 'Applicant not found'}), 404
         
-        # Get education
-        cursor.execute('''
-            SELECT level, school_name, location, year_graduated
-            FROM education
-            WHERE user_id = %s
-            ORDER BY 
-                CASE level
-                    WHEN 'primary' THEN 1
-                    WHEN 'secondary' THEN 2
-                    WHEN 'bachelor' THEN 3
-                    WHEN 'graduate' THEN 4
-                END
-        ''', (user_id,))
-        applicant['education'] = cursor.fetchall()
-        
-        # Get references
-        cursor.execute('''
-            SELECT reference_name, address, contact_number, relationship
-            FROM character_references
-            WHERE user_id = %s
-            LIMIT 3
-        ''', (user_id,))
-        applicant['references'] = cursor.fetchall()
+        load_applicant_children(cursor, [applicant])
         
         # Convert date objects to strings
         if applicant.get('registration_date'):
@@ -863,31 +892,24 @@ def leave_applications():
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Get admin profile
-    cursor.execute('SELECT profile_picture FROM admin_profiles WHERE user_id = %s', (session['user_id'],))
-    profile = cursor.fetchone()
-    
     # Pagination
-    page = request.args.get('page', 1, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
     per_page = 20
-    offset = (page - 1) * per_page
     
-    # Get all leave applications with employee details
-    cursor.execute('''
+    # Get leave applications with employee details, one keyset page at a time
+    pager = keyset_paginate(cursor, '''
         SELECT la.*,
                CONCAT(IFNULL(ep.first_name, u.username), ' ', IFNULL(ep.middle_name, ''), ' ', IFNULL(ep.last_name, '')) as employee_name,
                ep.`rank`
         FROM leave_applications la
         JOIN users u ON la.employee_id = u.id
         LEFT JOIN employee_profiles ep ON la.employee_id = ep.user_id
-        ORDER BY la.applied_date DESC
-        LIMIT %s OFFSET %s
-    ''', (per_page, offset))
-    leaves = cursor.fetchall()
+    ''', '1=1', (), LEAVE_ORDER, per_page,
+        after=request.args.get('after'), before=request.args.get('before'))
+    leaves = pager.items
     
     # Get total count
-    cursor.execute('SELECT COUNT(*) as total FROM leave_applications')
-    total = cursor.fetchone()['total']
+    total = cached_count(cursor, 'SELECT COUNT(*) as total FROM leave_applications')
     total_pages = (total + per_page - 1) // per_page
     
     cursor.close()
@@ -895,11 +917,11 @@ def leave_applications():
     
     return render_template('admin/leave_applications.html',
                          leaves=leaves,
+                         pager=pager,
                          page=page,
                          per_page=per_page,
                          total=total,
-                         total_pages=total_pages,
-                         profile=profile)
+                         total_pages=total_pages)
 
 @admin_bp.route('/leave/<int:leave_id>/get')
 @login_required
@@ -947,10 +969,11 @@ def update_leave_status():
     try:
         # Get leave details for notification
         cursor.execute('''
-            SELECT la.employee_id, la.leave_type, la.start_date, la.end_date, u.username
+            SELECT la.employee_id, la.leave_type, la.start_date, la.end_date, la.status, u.username
             FROM leave_applications la
             JOIN users u ON la.employee_id = u.id
             WHERE la.id = %s
+            FOR UPDATE
         ''', (leave_id,))
         leave = cursor.fetchone()
         
@@ -959,6 +982,8 @@ def update_leave_status():
             'UPDATE leave_applications SET status = %s, remarks = %s WHERE id = %s',
             (status, remarks, leave_id)
         )
+        if leave:
+            stats_counters.move(cursor, 'leave_applications', leave['status'], status)
         
         # Create notification for employee
         if leave:
@@ -967,12 +992,11 @@ def update_leave_status():
             if remarks:
                 notif_message += f' Remarks: {remarks}'
             
-            cursor.execute('''
-                INSERT INTO notifications (user_id, title, message, type, related_id)
-                VALUES (%s, %s, %s, %s, %s)
-            ''', (leave['employee_id'], notif_title, notif_message, 'leave', leave_id))
+            notify_user(cursor, leave['employee_id'], notif_title, notif_message, 'leave', leave_id)
         
         conn.commit()
+        if leave:
+            nav_cache.invalidate(leave['employee_id'])
         cursor.close()
         conn.close()
         
@@ -984,6 +1008,26 @@ def update_leave_status():
         conn.close()
         return {'success': False, 'message': f'Error updating leave status: {str(e)}'}
 
+@admin_bp.route('/notifications/count')
+@login_required
+@role_required('admin')
+def notification_count():
+    """Unread notification count (cheap badge poll)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    count = unread_count(cursor, session['user_id'])
+    cursor.close()
+    conn.close()
+    
+    return {'success': True, 'count': count}
+
+@admin_bp.route('/notifications/stream')
+@login_required
+@role_required('admin')
+def notification_stream():
+    """Server-Sent Events stream of new notifications and unread counts"""
+    return stream_response(session['user_id'])
+
 @admin_bp.route('/notifications/get')
 @login_required
 @role_required('admin')
@@ -993,6 +1037,15 @@ def get_notifications():
     cursor = conn.cursor(dictionary=True)
     
     try:
+        # Answer conditional polls from the validator alone, without fetching rows
+        etag, count = list_version(cursor, session['user_id'])
+        if request.if_none_match.contains_weak(etag):
+            cursor.close()
+            conn.close()
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+        
         cursor.execute('''
             SELECT id, title, message, type, related_id, is_read, created_at
             FROM notifications
@@ -1005,7 +1058,10 @@ def get_notifications():
         cursor.close()
         conn.close()
         
-        return {'success': True, 'notifications': notifications}
+        response = jsonify({'success': True, 'notifications': notifications, 'unread_count': count})
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     
     except Exception as e:
         cursor.close()
@@ -1021,11 +1077,9 @@ def mark_notification_read(notif_id):
     cursor = conn.cursor()
     
     try:
-        cursor.execute(
-            'UPDATE notifications SET is_read = TRUE WHERE id = %s AND user_id = %s',
-            (notif_id, session['user_id'])
-        )
+        mark_read(cursor, session['user_id'], notif_id)
         conn.commit()
+        nav_cache.invalidate(session['user_id'])
         cursor.close()
         conn.close()
         
@@ -1046,11 +1100,9 @@ def mark_all_notifications_read():
     cursor = conn.cursor()
     
     try:
-        cursor.execute(
-            'UPDATE notifications SET is_read = TRUE WHERE user_id = %s AND is_read = FALSE',
-            (session['user_id'],)
-        )
+        mark_all_read(cursor, session['user_id'])
         conn.commit()
+        nav_cache.invalidate(session['user_id'])
         cursor.close()
         conn.close()
         
@@ -1069,10 +1121,6 @@ def deployment():
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Get admin profile
-    cursor.execute('SELECT profile_picture FROM admin_profiles WHERE user_id = %s', (session['user_id'],))
-    profile = cursor.fetchone()
-    
     # Get all employees for dropdown
     cursor.execute('''
         SELECT u.id as user_id,
@@ -1086,25 +1134,22 @@ def deployment():
     employees = cursor.fetchall()
     
     # Pagination
-    page = request.args.get('page', 1, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
     per_page = 20
-    offset = (page - 1) * per_page
     
-    # Get deployments with officer details
-    cursor.execute('''
+    # Get deployments with officer details, one keyset page at a time
+    pager = keyset_paginate(cursor, '''
         SELECT d.*,
                CONCAT(ep.first_name, ' ', IFNULL(ep.middle_name, ''), ' ', ep.last_name) as officer_name,
                ep.`rank`
         FROM deployments d
         JOIN employee_profiles ep ON d.employee_id = ep.user_id
-        ORDER BY d.start_date DESC
-        LIMIT %s OFFSET %s
-    ''', (per_page, offset))
-    deployments = cursor.fetchall()
+    ''', '1=1', (), DEPLOYMENT_ORDER, per_page,
+        after=request.args.get('after'), before=request.args.get('before'))
+    deployments = pager.items
     
     # Get total count
-    cursor.execute('SELECT COUNT(*) as total FROM deployments')
-    total = cursor.fetchone()['total']
+    total = cached_count(cursor, 'SELECT COUNT(*) as total FROM deployments')
     total_pages = (total + per_page - 1) // per_page
     
     cursor.close()
@@ -1112,12 +1157,12 @@ def deployment():
     
     return render_template('admin/deployment.html',
                          deployments=deployments,
+                         pager=pager,
                          employees=employees,
                          page=page,
                          per_page=per_page,
                          total=total,
-                         total_pages=total_pages,
-                         profile=profile)
+                         total_pages=total_pages)
 
 @admin_bp.route('/deployment/add', methods=['POST'])
 @login_required
@@ -1143,6 +1188,7 @@ def add_deployment():
             INSERT INTO deployments (employee_id, station, unit, position, start_date, end_date, status, remarks)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         ''', (employee_id, station, unit, position, start_date, end_date if end_date else None, status, remarks))
+        stats_counters.bump(cursor, 'deployments', status)
         conn.commit()
         cursor.close()
         conn.close()
@@ -1176,12 +1222,17 @@ def edit_deployment():
     cursor = conn.cursor(dictionary=True)
     
     try:
+        cursor.execute('SELECT status FROM deployments WHERE id = %s FOR UPDATE', (deployment_id,))
+        current = cursor.fetchone()
+        
         cursor.execute('''
             UPDATE deployments
             SET employee_id = %s, station = %s, unit = %s, position = %s,
                 start_date = %s, end_date = %s, status = %s, remarks = %s
             WHERE id = %s
         ''', (employee_id, station, unit, position, start_date, end_date if end_date else None, status, remarks, deployment_id))
+        if current:
+            stats_counters.move(cursor, 'deployments', current['status'], status)
         conn.commit()
         cursor.close()
         conn.close()
@@ -1229,6 +1280,9 @@ def delete_deployment(deployment_id):
     cursor = conn.cursor(dictionary=True)
     
     try:
+        cursor.execute('SELECT status FROM deployments WHERE id = %s FOR UPDATE', (deployment_id,))
+        current = cursor.fetchone()
+        
         cursor.execute('DELETE FROM deployments WHERE id = %s', (deployment_id,))
         
         if cursor.rowcount == 0:
@@ -1236,6 +1290,7 @@ def delete_deployment(deployment_id):
             conn.close()
             return {'success': False, 'message': 'Deployment not found'}
         
+        stats_counters.bump(cursor, 'deployments', current['status'], -1)
         conn.commit()
         cursor.close()
         conn.close()
@@ -1255,46 +1310,27 @@ def reports():
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Get admin profile
-    cursor.execute('SELECT profile_picture FROM admin_profiles WHERE user_id = %s', (session['user_id'],))
-    profile = cursor.fetchone()
-    
-    # Get statistics
-    cursor.execute('SELECT COUNT(*) as count FROM users WHERE role = "admin"')
-    admin_count = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM users WHERE role = "employee"')
-    employee_count = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM users WHERE role = "applicant"')
-    applicant_count = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM deployments WHERE status = "Active"')
-    active_deployments = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM deployments WHERE status = "Completed"')
-    completed_deployments = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM applicant_profiles WHERE application_status = "Pending"')
-    pending_applicants = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM applicant_profiles WHERE application_status = "Approved"')
-    approved_applicants = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM applicant_profiles WHERE application_status = "Rejected"')
-    rejected_applicants = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM leave_applications WHERE status = "Pending"')
-    pending_leaves = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM leave_applications WHERE status = "Approved"')
-    approved_leaves = cursor.fetchone()['count']
+    # Get statistics (materialized counters, one query)
+    counters = stats_counters.read_counters(conn)
+    admin_count = counters['users'].get('admin', 0)
+    employee_count = counters['users'].get('employee', 0)
+    applicant_count = counters['users'].get('applicant', 0)
+    active_deployments = counters['deployments'].get('Active', 0)
+    completed_deployments = counters['deployments'].get('Completed', 0)
+    pending_applicants = counters['applicant_profiles'].get('Pending', 0)
+    approved_applicants = counters['applicant_profiles'].get('Approved', 0)
+    rejected_applicants = counters['applicant_profiles'].get('Rejected', 0)
+    pending_leaves = counters['leave_applications'].get('Pending', 0)
+    approved_leaves = counters['leave_applications'].get('Approved', 0)
+    
+    # Background custom-range exports
+    recent_exports = export_jobs.recent_jobs(cursor) if EXPORT_JOBS_CONFIG['enabled'] else []
     
     cursor.close()
     conn.close()
     
     return render_template('admin/reports.html',
-                         profile=profile,
+                         recent_exports=recent_exports,
                          admin_count=admin_count,
                          employee_count=employee_count,
                          applicant_count=applicant_count,
@@ -1306,181 +1342,34 @@ def reports():
                          pending_leaves=pending_leaves,
                          approved_leaves=approved_leaves)
 
+def _export_report(name):
+    report = REPORTS[name]
+    return stream_csv(report['sql'], (), report['filename'], report['header'], report['row'],
+                      compress=request.args.get('gzip') == '1')
+
 @admin_bp.route('/reports/export-users')
 @login_required
 @role_required('admin')
 def export_users():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    cursor.execute('''
-        SELECT u.id, u.username, u.email, u.role, u.status, u.created_at,
-               CASE
-                   WHEN u.role = 'employee' THEN CONCAT(ep.first_name, ' ', ep.last_name)
-                   WHEN u.role = 'applicant' THEN CONCAT(ap.first_name, ' ', ap.last_name)
-                   WHEN u.role = 'admin' THEN CONCAT(adp.first_name, ' ', adp.last_name)
-               END as full_name
-        FROM users u
-        LEFT JOIN employee_profiles ep ON u.id = ep.user_id AND u.role = 'employee'
-        LEFT JOIN applicant_profiles ap ON u.id = ap.user_id AND u.role = 'applicant'
-        LEFT JOIN admin_profiles adp ON u.id = adp.user_id AND u.role = 'admin'
-        ORDER BY u.created_at DESC
-    ''')
-    users = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
-    
-    # Create CSV
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Username', 'Full Name', 'Email', 'Role', 'Status', 'Created At'])
-    
-    for user in users:
-        writer.writerow([
-            user['id'],
-            user['username'],
-            user['full_name'] or 'N/A',
-            user['email'],
-            user['role'],
-            user['status'],
-            user['created_at'].strftime('%Y-%m-%d %H:%M:%S') if user['created_at'] else ''
-        ])
-    
-    output.seek(0)
-    return Response(output.getvalue(),
-                   mimetype='text/csv',
-                   headers={'Content-Disposition': 'attachment; filename=users_report.csv'})
+    return _export_report('users')
 
 @admin_bp.route('/reports/export-deployments')
 @login_required
 @role_required('admin')
 def export_deployments():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    cursor.execute('''
-        SELECT d.*,
-               CONCAT(ep.first_name, ' ', ep.last_name) as officer_name,
-               ep.`rank`
-        FROM deployments d
-        JOIN employee_profiles ep ON d.employee_id = ep.user_id
-        ORDER BY d.start_date DESC
-    ''')
-    deployments = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Officer Name', 'Rank', 'Station', 'Unit', 'Position', 'Start Date', 'End Date', 'Status', 'Remarks'])
-    
-    for d in deployments:
-        writer.writerow([
-            d['id'],
-            d['officer_name'],
-            d['rank'] or 'N/A',
-            d['station'],
-            d['unit'] or 'N/A',
-            d['position'] or 'N/A',
-            d['start_date'].strftime('%Y-%m-%d') if d['start_date'] else '',
-            d['end_date'].strftime('%Y-%m-%d') if d['end_date'] else 'Ongoing',
-            d['status'],
-            d['remarks'] or ''
-        ])
-    
-    output.seek(0)
-    return Response(output.getvalue(),
-                   mimetype='text/csv',
-                   headers={'Content-Disposition': 'attachment; filename=deployments_report.csv'})
+    return _export_report('deployments')
 
 @admin_bp.route('/reports/export-applicants')
 @login_required
 @role_required('admin')
 def export_applicants():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    cursor.execute('''
-        SELECT u.id, u.email as user_email, u.status as account_status,
-               ap.first_name, ap.middle_name, ap.last_name, ap.email, ap.phone,
-               ap.address, ap.date_of_birth, ap.application_status, ap.applied_date
-        FROM users u
-        LEFT JOIN applicant_profiles ap ON u.id = ap.user_id
-        WHERE u.role = 'applicant'
-        ORDER BY ap.applied_date DESC
-    ''')
-    applicants = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Full Name', 'Email', 'Phone', 'Address', 'Date of Birth', 'Application Status', 'Account Status', 'Applied Date'])
-    
-    for a in applicants:
-        full_name = f"{a['first_name'] or ''} {a['middle_name'] or ''} {a['last_name'] or ''}".strip()
-        writer.writerow([
-            a['id'],
-            full_name or 'N/A',
-            a['email'] or a['user_email'],
-            a['phone'] or 'N/A',
-            a['address'] or 'N/A',
-            a['date_of_birth'].strftime('%Y-%m-%d') if a['date_of_birth'] else 'N/A',
-            a['application_status'] or 'Pending',
-            a['account_status'],
-            a['applied_date'].strftime('%Y-%m-%d %H:%M:%S') if a['applied_date'] else ''
-        ])
-    
-    output.seek(0)
-    return Response(output.getvalue(),
-                   mimetype='text/csv',
-                   headers={'Content-Disposition': 'attachment; filename=applicants_report.csv'})
+    return _export_report('applicants')
 
 @admin_bp.route('/reports/export-leaves')
 @login_required
 @role_required('admin')
 def export_leaves():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    cursor.execute('''
-        SELECT la.*,
-               CONCAT(ep.first_name, ' ', ep.last_name) as employee_name,
-               ep.`rank`
-        FROM leave_applications la
-        JOIN employee_profiles ep ON la.employee_id = ep.user_id
-        ORDER BY la.applied_date DESC
-    ''')
-    leaves = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Employee Name', 'Rank', 'Leave Type', 'Start Date', 'End Date', 'Days', 'Reason', 'Status', 'Applied Date'])
-    
-    for l in leaves:
-        writer.writerow([
-            l['id'],
-            l['employee_name'],
-            l['rank'] or 'N/A',
-            l['leave_type'],
-            l['start_date'].strftime('%Y-%m-%d') if l['start_date'] else '',
-            l['end_date'].strftime('%Y-%m-%d') if l['end_date'] else '',
-            l['days_count'],
-            l['reason'],
-            l['status'],
-            l['applied_date'].strftime('%Y-%m-%d %H:%M:%S') if l['applied_date'] else ''
-        ])
-    
-    output.seek(0)
-    return Response(output.getvalue(),
-                   mimetype='text/csv',
-                   headers={'Content-Disposition': 'attachment; filename=leave_applications_report.csv'})
+    return _export_report('leaves')
 
 @admin_bp.route('/reports/export-custom')
 @login_required
@@ -1490,69 +1379,71 @@ def export_custom():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     
+    compress = request.args.get('gzip') == '1'
+    
+    try:
+        start = datetime.strptime(start_date or '', '%Y-%m-%d').date()
+        end = datetime.strptime(end_date or '', '%Y-%m-%d').date()
+    except ValueError:
+        start = end = None
+    if report_type not in CUSTOM_REPORTS or start is None or start > end:
+        flash('Please choose a report type and a valid date range', 'error')
+        return redirect(url_for('admin.reports'))
+    
+    if not EXPORT_JOBS_CONFIG['enabled']:
+        response = stream_csv(CUSTOM_REPORTS[report_type]['sql'], (start_date, end_date),
+                              custom_filename(report_type, start_date, end_date),
+                              compress=compress, require_rows=True)
+        if response is None:
+            flash('No data found for the selected date range', 'warning')
+            return redirect(url_for('admin.reports'))
+        return response
+    
+    # Built by the worker; the reports page shows progress and the download link
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    job_id, status = export_jobs.request_export(conn, report_type, start_date, end_date, compress,
+                                                session['user_id'])
+    conn.close()
     
-    if report_type == 'users':
-        cursor.execute('''
-            SELECT u.*, 
-                   CASE
-                       WHEN u.role = 'employee' THEN CONCAT(ep.first_name, ' ', ep.last_name)
-                       WHEN u.role = 'applicant' THEN CONCAT(ap.first_name, ' ', ap.last_name)
-                       WHEN u.role = 'admin' THEN CONCAT(adp.first_name, ' ', adp.last_name)
-                   END as full_name
-            FROM users u
-            LEFT JOIN employee_profiles ep ON u.id = ep.user_id
-            LEFT JOIN applicant_profiles ap ON u.id = ap.user_id
-            LEFT JOIN admin_profiles adp ON u.id = adp.user_id
-            WHERE DATE(u.created_at) BETWEEN %s AND %s
-        ''', (start_date, end_date))
-        filename = f'users_{start_date}_to_{end_date}.csv'
-        
-    elif report_type == 'deployments':
-        cursor.execute('''
-            SELECT d.*, CONCAT(ep.first_name, ' ', ep.last_name) as officer_name, ep.`rank`
-            FROM deployments d
-            JOIN employee_profiles ep ON d.employee_id = ep.user_id
-            WHERE DATE(d.start_date) BETWEEN %s AND %s
-        ''', (start_date, end_date))
-        filename = f'deployments_{start_date}_to_{end_date}.csv'
-        
-    elif report_type == 'applicants':
-        cursor.execute('''
-            SELECT u.*, ap.*
-            FROM users u
-            JOIN applicant_profiles ap ON u.id = ap.user_id
-            WHERE DATE(ap.applied_date) BETWEEN %s AND %s
-        ''', (start_date, end_date))
-        filename = f'applicants_{start_date}_to_{end_date}.csv'
-        
-    elif report_type == 'leaves':
-        cursor.execute('''
-            SELECT la.*, CONCAT(ep.first_name, ' ', ep.last_name) as employee_name, ep.`rank`
-            FROM leave_applications la
-            JOIN employee_profiles ep ON la.employee_id = ep.user_id
-            WHERE DATE(la.applied_date) BETWEEN %s AND %s
-        ''', (start_date, end_date))
-        filename = f'leaves_{start_date}_to_{end_date}.csv'
+    if status == export_jobs.DONE:
+        flash('This export is already up to date. Download it under Recent Exports.', 'success')
+    else:
+        flash('Export queued. It will be ready to download under Recent Exports shortly.', 'success')
+    return redirect(url_for('admin.reports'))
+
+@admin_bp.route('/reports/exports/<int:job_id>')
+@login_required
+@role_required('admin')
+def export_job_status(job_id):
+    """Progress of a background export (polled by the reports page)"""
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    job = export_jobs.get_job(cursor, job_id)
+    cursor.close()
+    conn.close()
     
-    data = cursor.fetchall()
+    if job is None:
+        return jsonify({'success': False, 'message': 'Export not found'}), 404
+    return jsonify({'success': True, 'job': export_jobs.job_summary(job)})
+
+@admin_bp.route('/reports/exports/<int:job_id>/download')
+@login_required
+@role_required('admin')
+def download_export(job_id):
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    job = export_jobs.get_job(cursor, job_id)
     cursor.close()
     conn.close()
     
-    if not data:
-        flash('No data found for the selected date range', 'warning')
+    if job is None:
+        abort(404)
+    if job['status'] != export_jobs.DONE or not os.path.exists(export_jobs.file_path(job)):
+        flash('That export is not available. Please request it again.', 'warning')
         return redirect(url_for('admin.reports'))
-    
-    output = StringIO()
-    writer = csv.DictWriter(output, fieldnames=data[0].keys())
-    writer.writeheader()
-    writer.writerows(data)
-    
-    output.seek(0)
-    return Response(output.getvalue(),
-                   mimetype='text/csv',
-                   headers={'Content-Disposition': f'attachment; filename={filename}'})
+    return send_file(export_jobs.file_path(job), as_attachment=True,
+                     download_name=export_jobs.download_name(job),
+                     mimetype='application/gzip' if job['compress'] else 'text/csv')
 
 
 @admin_bp.route('/contact-support')
@@ -1563,10 +1454,6 @@ def contact_support():
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Get admin profile for nav
-    cursor.execute('SELECT profile_picture FROM admin_profiles WHERE user_id = %s', (session['user_id'],))
-    profile = cursor.fetchone()
-    
     # Get all support requests from applicants
     cursor.execute('''
         SELECT n.*, u.username as applicant_name,
@@ -1583,19 +1470,13 @@ def contact_support():
     total_requests = len(support_requests)
     unread_requests = sum(1 for req in support_requests if not req['is_read'])
     
-    # Get unread notifications
-    cursor.execute('SELECT COUNT(*) as total FROM notifications WHERE user_id = %s AND is_read = FALSE', (session['user_id'],))
-    unread_notifs = cursor.fetchone()['total']
-    
     cursor.close()
     conn.close()
     
     return render_template('admin/contact_support.html',
                          support_requests=support_requests,
                          total_requests=total_requests,
-                         unread_requests=unread_requests,
-                         profile=profile,
-                         unread_notifs=unread_notifs)
+                         unread_requests=unread_requests)
 
 
 @admin_bp.route('/contact-support/<int:request_id>')
@@ -1651,13 +1532,10 @@ def mark_support_read(request_id):
     cursor = conn.cursor()
     
     try:
-        cursor.execute('''
-            UPDATE notifications 
-            SET is_read = TRUE 
-            WHERE id = %s AND user_id = %s
-        ''', (request_id, session['user_id']))
+        mark_read(cursor, session['user_id'], request_id)
         
         conn.commit()
+        nav_cache.invalidate(session['user_id'])
         
         return jsonify({
             'success': True,
@@ -1674,3 +1552,10 @@ def mark_support_read(request_id):
         conn.close()
 
 
+@admin_bp.route('/system/db-pool')
+@login_required
+@role_required('admin')
+def db_pool_stats():
+    """Connection pool counters for this worker process"""
+    from db import pool
+    return {'success': True, 'pool': pool.stats()}
@@ -1,14 +1,33 @@
-from flask import Blueprint, render_template, request, session, flash, redirect, url_for
+from flask import Blueprint, render_template, request, session, flash, redirect, url_for, jsonify, Response
 from routes.auth import login_required, role_required, get_db_connection
 from werkzeug.utils import secure_filename
 import os
 from functools import wraps
+import nav_cache
+from notification_feed import stream_response
+from notifications import list_version, notify_admins, mark_read, mark_all_read, unread_count
+import stats_counters
 
 applicant_bp = Blueprint('applicant', __name__, url_prefix='/applicant')
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif'}
 
+def allocate_applicant_id(cursor, now):
+    """
+    Allocate the next YY-XXX applicant ID atomically
+
+    A single upsert on the per-year row of applicant_id_sequences bumps the
+    counter through LAST_INSERT_ID(), so concurrent submissions serialize on
+    one row lock (held until the caller commits) instead of counting rows.
+    """
+    cursor.execute('''
+        INSERT INTO applicant_id_sequences (year, last_value)
+        VALUES (%s, LAST_INSERT_ID(1))
+        ON DUPLICATE KEY UPDATE last_value = LAST_INSERT_ID(last_value + 1)
+    ''', (now.year,))
+    return f"{now.strftime('%y')}-{str(cursor.lastrowid).zfill(3)}"
+
 def form_completion_required(f):
     """
     Decorator to check if applicant has completed the 10-step application form.
@@ -70,18 +89,13 @@ def dashboard():
     user_role = cursor.fetchone()['role']
     application_status = 'Pending Review' if user_role == 'applicant' else 'Processed'
     
-    # Get unread notifications
-    cursor.execute('SELECT COUNT(*) as total FROM notifications WHERE user_id = %s AND is_read = FALSE', (session['user_id'],))
-    unread_notifs = cursor.fetchone()['total']
-    
     cursor.close()
     conn.close()
     
     return render_template('applicant/dashboard.html',
                          profile=profile,
                          profile_completion=profile_completion,
-                         application_status=application_status,
-                         unread_notifs=unread_notifs)
+                         application_status=application_status)
 
 @applicant_bp.route('/profile')
 @login_required
@@ -124,19 +138,12 @@ def contact_support():
         applicant_name = applicant['username'] if applicant else 'An applicant'
         
         # Create notification for all admins
-        cursor.execute('SELECT id FROM users WHERE role = "admin"')
-        admins = cursor.fetchall()
-        
         notif_title = f'Support Request: {subject}'
         notif_message = f'{applicant_name} needs assistance: {message}'
-        
-        for admin in admins:
-            cursor.execute('''
-                INSERT INTO notifications (user_id, title, message, type, related_id)
-                VALUES (%s, %s, %s, %s, %s)
-            ''', (admin['id'], notif_title, notif_message, 'general', session['user_id']))
+        notify_admins(cursor, notif_title, notif_message, 'general', session['user_id'])
         
         conn.commit()
+        nav_cache.invalidate_role('admin')
         cursor.close()
         conn.close()
         
@@ -247,6 +254,7 @@ def submit_application():
         if not profile_exists:
             # Create profile if it doesn't exist
             cursor.execute('INSERT INTO applicant_profiles (user_id) VALUES (%s)', (user_id,))
+            stats_counters.bump(cursor, 'applicant_profiles', 'Pending')
             conn.commit()
         
         # Step 2: Update Personal Information in applicant_profiles
@@ -461,14 +469,8 @@ def submit_application():
         # Commit file uploads
         conn.commit()
         
-        # Generate Applicant ID (YY-XXX format)
-        current_year = datetime.now().strftime('%y')
-        cursor.execute('''
-            SELECT COUNT(*) as count FROM applicant_applications 
-            WHERE applicant_id LIKE %s
-        ''', (f'{current_year}-%',))
-        count = cursor.fetchone()['count']
-        applicant_id = f"{current_year}-{str(count + 1).zfill(3)}"
+        # Generate Applicant ID (YY-XXX format) from the per-year sequence
+        applicant_id = allocate_applicant_id(cursor, datetime.now())
         
         # Generate Reference Number
         reference_number = f"PNP-{uuid.uuid4().hex[:8].upper()}"
@@ -649,6 +651,26 @@ def documents():
     return render_template('applicant/documents.html', 
                          profile=profile,
                          has_documents=has_documents)
+@applicant_bp.route('/notifications/count')
+@login_required
+@role_required('applicant')
+def notification_count():
+    """Unread notification count (cheap badge poll)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    count = unread_count(cursor, session['user_id'])
+    cursor.close()
+    conn.close()
+    
+    return {'success': True, 'count': count}
+
+@applicant_bp.route('/notifications/stream')
+@login_required
+@role_required('applicant')
+def notification_stream():
+    """Server-Sent Events stream of new notifications and unread counts"""
+    return stream_response(session['user_id'])
+
 @applicant_bp.route('/notifications/get')
 @login_required
 @role_required('applicant')
@@ -658,6 +680,15 @@ def get_notifications():
     cursor = conn.cursor(dictionary=True)
     
     try:
+        # Answer conditional polls from the validator alone, without fetching rows
+        etag, count = list_version(cursor, session['user_id'])
+        if request.if_none_match.contains_weak(etag):
+            cursor.close()
+            conn.close()
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+        
         cursor.execute('''
             SELECT id, title, message, type, related_id, is_read, created_at
             FROM notifications
@@ -670,7 +701,10 @@ def get_notifications():
         cursor.close()
         conn.close()
         
-        return {'success': True, 'notifications': notifications}
+        response = jsonify({'success': True, 'notifications': notifications, 'unread_count': count})
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     
     except Exception as e:
         cursor.close()
@@ -686,11 +720,9 @@ def mark_notification_read(notif_id):
     cursor = conn.cursor()
     
     try:
-        cursor.execute(
-            'UPDATE notifications SET is_read = TRUE WHERE id = %s AND user_id = %s',
-            (notif_id, session['user_id'])
-        )
+        mark_read(cursor, session['user_id'], notif_id)
         conn.commit()
+        nav_cache.invalidate(session['user_id'])
         cursor.close()
         conn.close()
         
@@ -711,11 +743,9 @@ def mark_all_notifications_read():
     cursor = conn.cursor()
     
     try:
-        cursor.execute(
-            'UPDATE notifications SET is_read = TRUE WHERE user_id = %s AND is_read = FALSE',
-            (session['user_id'],)
-        )
+        mark_all_read(cursor, session['user_id'])
         conn.commit()
+        nav_cache.invalidate(session['user_id'])
         cursor.close()
         conn.close()
         
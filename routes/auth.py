@@ -1,13 +1,49 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from functools import wraps
 import mysql.connector
-from config import DB_CONFIG
-from email_utils import generate_otp, send_otp_email, store_otp, verify_otp as verify_otp_code
+from db import get_db
+import nav_cache
+import rate_limit
+from passwords import hash_password, verify_password, needs_rehash, rehash_password
+from notifications import notify_admins
+import stats_counters
+from email_utils import generate_otp
+from otp_store import store_otp, verify_otp as verify_otp_code
+from email_outbox import queue_otp_email, delivery_status
 
 auth_bp = Blueprint('auth', __name__)
 
 def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+    """Request-scoped pooled connection (released on teardown, close() is a no-op)"""
+    return get_db()
+
+def assign_applicant_sequence(cursor, user_id):
+    """
+    Persist the per-year display sequence used for applicant IDs (YY-NNN)
+
+    Runs once when an applicant is created so list pages never have to
+    count rows to render the ID. No-op if the user already has one.
+    The number comes from the counter row for the year of created_at
+    (bumped through LAST_INSERT_ID(), as allocate_applicant_id does), so
+    it is never reused: deleting an applicant leaves a gap instead of
+    renumbering, and concurrent registrations queue on the row lock.
+    """
+    cursor.execute('''
+        INSERT INTO applicant_seq_counters (year, last_value)
+        SELECT YEAR(created_at), LAST_INSERT_ID(1)
+        FROM users
+        WHERE id = %s AND role = 'applicant' AND applicant_seq IS NULL
+        ON DUPLICATE KEY UPDATE last_value = LAST_INSERT_ID(last_value + 1)
+    ''', (user_id,))
+    if cursor.rowcount:
+        cursor.execute('UPDATE users SET applicant_seq = %s WHERE id = %s AND applicant_seq IS NULL',
+                       (cursor.lastrowid, user_id))
+
+def format_applicant_id(row):
+    """YY-NNN display ID from a row carrying created_at and applicant_seq"""
+    if row.get('created_at') and row.get('applicant_seq'):
+        return f"{row['created_at'].strftime('%y')}-{row['applicant_seq']:03d}"
+    return 'N/A'
 
 def login_required(f):
     @wraps(f)
@@ -35,7 +71,12 @@ def login():
         username = request.form['username']
         password = request.form['password']
         
-        from werkzeug.security import check_password_hash
+        # Throttle before any hashing: per client IP, and per username for failed attempts
+        allowed, retry_after = rate_limit.consume('login_ip', rate_limit.client_ip())
+        if allowed:
+            allowed, retry_after = rate_limit.available('login_user', username)
+        if not allowed:
+            return rate_limit.throttled('login.html', retry_after)
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
@@ -44,20 +85,36 @@ def login():
         cursor.close()
         conn.close()
         
-        if user and check_password_hash(user['password'], password):
+        if user and verify_password(user['password'], password):
+            # Upgrade hashes made under an older policy while we have the plaintext
+            if needs_rehash(user['password']):
+                conn = get_db_connection()
+                cursor = conn.cursor()
+                rehash_password(cursor, user['id'], user['password'], password)
+                conn.commit()
+                cursor.close()
+                conn.close()
+            
             # Check if user account is active
             if user.get('status') != 'active':
-                # Account exists but not verified - allow OTP resend
+                # Account exists but not verified - allow OTP resend, capped like resend_otp
+                allowed, retry_after = rate_limit.consume('otp_ip', rate_limit.client_ip())
+                if allowed:
+                    allowed, retry_after = rate_limit.consume('otp_user', user['id'])
+                if not allowed:
+                    return rate_limit.throttled('login.html', retry_after)
                 otp_code = generate_otp()
                 
                 if store_otp(user['id'], otp_code):
-                    email_sent = send_otp_email(user['email'], otp_code, user['username'])
+                    # Queued for the background email worker; the verify page polls delivery
+                    email_id = queue_otp_email(user['id'], user['email'], otp_code, user['username'])
                     
-                    if email_sent:
+                    if email_id:
                         # Store in session for OTP verification
                         session['pending_registration_user_id'] = user['id']
                         session['pending_registration_username'] = user['username']
                         session['pending_registration_email'] = user['email']
+                        session['pending_email_id'] = email_id
                         flash('Your account is not verified. A new verification code has been sent to your email.', 'info')
                         return redirect(url_for('auth.verify_registration_otp'))
                     else:
@@ -102,6 +159,7 @@ def login():
                     return redirect(url_for('applicant.application_form'))
                 return redirect(url_for('applicant.dashboard'))
         else:
+            rate_limit.consume('login_user', username)
             flash('Invalid username or password', 'error')
     
     return render_template('login.html')
@@ -114,12 +172,15 @@ def register():
         password = request.form['password']
         confirm_password = request.form['confirm_password']
         
+        allowed, retry_after = rate_limit.consume('register_ip', rate_limit.client_ip())
+        if not allowed:
+            return rate_limit.throttled('register.html', retry_after)
+        
         if password != confirm_password:
             flash('Passwords do not match', 'error')
             return render_template('register.html')
         
-        from werkzeug.security import generate_password_hash
-        hashed_password = generate_password_hash(password)
+        hashed_password = hash_password(password)
         
         try:
             conn = get_db_connection()
@@ -131,19 +192,16 @@ def register():
             # Create applicant profile
             cursor.execute('INSERT INTO applicant_profiles (user_id, email) VALUES (%s, %s)',
                          (user_id, email))
+            assign_applicant_sequence(cursor, user_id)
+            stats_counters.bump(cursor, 'users', 'applicant')
+            stats_counters.bump(cursor, 'applicant_profiles', 'Pending')
             
             # Create notification for admins
-            cursor.execute('SELECT id FROM users WHERE role = "admin"')
-            admins = cursor.fetchall()
-            
-            for admin in admins:
-                cursor.execute('''
-                    INSERT INTO notifications (user_id, title, message, type, related_id)
-                    VALUES (%s, %s, %s, %s, %s)
-                ''', (admin[0], 'New Applicant Registration', 
-                      f'New applicant "{username}" has registered.', 'applicant', user_id))
+            notify_admins(cursor, 'New Applicant Registration',
+                          f'New applicant "{username}" has registered.', 'applicant', user_id)
             
             conn.commit()
+            nav_cache.invalidate_role('admin')
             cursor.close()
             conn.close()
             
@@ -153,24 +211,27 @@ def register():
             
             # Generate and send OTP for registration verification
             if store_otp(user_id, otp_code):
-                print(f"🔧 DEBUG: OTP stored in database. Now sending email to {email}...")
-                email_sent = send_otp_email(email, otp_code, username)
-                print(f"🔧 DEBUG: Email send result: {email_sent}")
+                print(f"🔧 DEBUG: OTP stored in database. Now queueing email to {email}...")
+                email_id = queue_otp_email(user_id, email, otp_code, username)
+                print(f"🔧 DEBUG: Email outbox id: {email_id}")
                 
-                if email_sent:
+                if email_id:
                     # Store registration info in session for OTP verification
                     session['pending_registration_user_id'] = user_id
                     session['pending_registration_username'] = username
                     session['pending_registration_email'] = email
+                    session['pending_email_id'] = email_id
                     flash('A verification code has been sent to your email. Please verify to complete registration.', 'success')
                     return redirect(url_for('auth.verify_registration_otp'))
                 else:
-                    # Email failed - show error
-                    flash('Failed to send verification code. Email service is not configured. Please contact administrator.', 'error')
+                    # Could not queue the email - show error
+                    flash('Failed to send verification code. Please try again later.', 'error')
                     # Delete the inactive account
                     conn = get_db_connection()
                     cursor = conn.cursor()
+                    owned = stats_counters.owned_by_user(cursor, user_id)
                     cursor.execute('DELETE FROM users WHERE id = %s', (user_id,))
+                    stats_counters.release(cursor, owned)
                     conn.commit()
                     cursor.close()
                     conn.close()
@@ -207,6 +268,7 @@ def verify_registration_otp():
             session.pop('pending_registration_user_id', None)
             session.pop('pending_registration_username', None)
             session.pop('pending_registration_email', None)
+            session.pop('pending_email_id', None)
             
             flash('Registration verified successfully! You can now log in.', 'success')
             return redirect(url_for('auth.login'))
@@ -232,6 +294,7 @@ def verify_otp():
             session['user_id'] = session.pop('pending_2fa_user_id')
             session['username'] = session.pop('pending_2fa_username')
             session['role'] = session.pop('pending_2fa_role')
+            session.pop('pending_email_id', None)
             
             flash('Login successful!', 'success')
             
@@ -262,6 +325,14 @@ def resend_otp():
         flash('Invalid access. Please log in or register.', 'error')
         return redirect(url_for('auth.login'))
     
+    # Each resend queues an email; cap them per client and per account
+    allowed, retry_after = rate_limit.consume('otp_ip', rate_limit.client_ip())
+    if allowed:
+        allowed, retry_after = rate_limit.consume('otp_user', user_id)
+    if not allowed:
+        return rate_limit.throttled('verify_otp.html', retry_after,
+                                    is_registration=redirect_route == 'auth.verify_registration_otp')
+    
     # Get user email
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
@@ -275,7 +346,9 @@ def resend_otp():
         otp_code = generate_otp()
         
         if store_otp(user_id, otp_code):
-            if send_otp_email(user['email'], otp_code, username):
+            email_id = queue_otp_email(user_id, user['email'], otp_code, username)
+            if email_id:
+                session['pending_email_id'] = email_id
                 flash('A new verification code has been sent to your email.', 'success')
             else:
                 flash('Failed to send verification code. Please try again.', 'error')
@@ -284,6 +357,24 @@ def resend_otp():
     
     return redirect(url_for(redirect_route))
 
+@auth_bp.route('/email-status')
+def email_status():
+    """Delivery status of the latest verification email (polled by the verify-OTP page)"""
+    user_id = session.get('pending_2fa_user_id') or session.get('pending_registration_user_id')
+    email_id = session.get('pending_email_id')
+    if not user_id or not email_id:
+        return {'success': False, 'status': None}
+    
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    row = delivery_status(cursor, email_id, user_id)
+    cursor.close()
+    conn.close()
+    
+    if not row:
+        return {'success': False, 'status': None}
+    return {'success': True, 'status': row['status'], 'attempts': row['attempts']}
+
 @auth_bp.route('/logout')
 def logout():
     session.clear()
@@ -1,7 +1,11 @@
-from flask import Blueprint, render_template, request, session, flash, redirect, url_for, current_app
+from flask import Blueprint, render_template, request, session, flash, redirect, url_for, current_app, jsonify, Response
 from routes.auth import login_required, role_required, get_db_connection
 from werkzeug.utils import secure_filename
 import os
+import nav_cache
+from notification_feed import stream_response
+from notifications import list_version, notify_admins, mark_read, mark_all_read, unread_count
+import stats_counters
 
 employee_bp = Blueprint('employee', __name__, url_prefix='/employee')
 
@@ -60,10 +64,6 @@ def dashboard():
     ''', (session['user_id'],))
     current_deployment = cursor.fetchone()
     
-    # Get unread notifications
-    cursor.execute('SELECT COUNT(*) as total FROM notifications WHERE user_id = %s AND is_read = FALSE', (session['user_id'],))
-    unread_notifs = cursor.fetchone()['total']
-    
     cursor.close()
     conn.close()
     
@@ -74,7 +74,6 @@ def dashboard():
                          pending_leaves=pending_leaves,
                          recent_leaves=recent_leaves,
                          current_deployment=current_deployment,
-                         unread_notifs=unread_notifs,
                          current_year=current_year)
 
 @employee_bp.route('/profile', methods=['GET', 'POST'])
@@ -158,6 +157,7 @@ def profile():
                  emergency_contact_name, emergency_relationship, emergency_contact_number, rank, profile_picture))
         
         conn.commit()
+        nav_cache.invalidate(session['user_id'])
         flash('Profile updated successfully!', 'success')
         
     # Get profile data
@@ -179,10 +179,6 @@ def personal_records():
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Get profile for nav
-    cursor.execute('SELECT profile_picture FROM employee_profiles WHERE user_id = %s', (session['user_id'],))
-    profile = cursor.fetchone()
-    
     # Get employee full details
     cursor.execute('''
         SELECT ep.*, u.status as account_status
@@ -213,7 +209,6 @@ def personal_records():
     conn.close()
     
     return render_template('employee/personal_records.html',
-                         profile=profile,
                          employee=employee,
                          education=education,
                          deployment=deployment)
@@ -225,10 +220,6 @@ def leave_applications():
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Get profile for nav
-    cursor.execute('SELECT profile_picture FROM employee_profiles WHERE user_id = %s', (session['user_id'],))
-    profile = cursor.fetchone()
-    
     # Calculate leave balance (15 days per year)
     from datetime import datetime
     current_year = datetime.now().year
@@ -277,7 +268,6 @@ def leave_applications():
                          per_page=per_page,
                          total=total,
                          total_pages=total_pages,
-                         profile=profile,
                          total_annual_leave=total_annual_leave,
                          used_leave=used_days,
                          remaining_leave=remaining_leave,
@@ -305,6 +295,7 @@ def add_leave():
             VALUES (%s, %s, %s, %s, %s, %s)
         ''', (session['user_id'], leave_type, start_date, end_date, days_count, reason))
         leave_id = cursor.lastrowid
+        stats_counters.bump(cursor, 'leave_applications', 'Pending')
         
         # Get employee name for notification
         cursor.execute('SELECT username FROM users WHERE id = %s', (session['user_id'],))
@@ -312,18 +303,12 @@ def add_leave():
         employee_name = employee['username'] if employee else 'An employee'
         
         # Create notification for all admins
-        cursor.execute('SELECT id FROM users WHERE role = "admin"')
-        admins = cursor.fetchall()
-        
-        for admin in admins:
-            cursor.execute('''
-                INSERT INTO notifications (user_id, title, message, type, related_id)
-                VALUES (%s, %s, %s, %s, %s)
-            ''', (admin['id'], 'New Leave Application', 
-                  f'{employee_name} applied for {leave_type} from {start_date} to {end_date}.', 
-                  'leave', leave_id))
+        notify_admins(cursor, 'New Leave Application',
+                      f'{employee_name} applied for {leave_type} from {start_date} to {end_date}.',
+                      'leave', leave_id)
         
         conn.commit()
+        nav_cache.invalidate_role('admin')
         cursor.close()
         conn.close()
         
@@ -431,7 +416,9 @@ def delete_leave(leave_id):
             conn.close()
             return {'success': False, 'message': 'Cannot cancel approved or rejected leave'}
         
-        cursor.execute('DELETE FROM leave_applications WHERE id = %s AND employee_id = %s', (leave_id, session['user_id']))
+        cursor.execute('DELETE FROM leave_applications WHERE id = %s AND employee_id = %s AND status = %s',
+                       (leave_id, session['user_id'], 'Pending'))
+        stats_counters.bump(cursor, 'leave_applications', 'Pending', -cursor.rowcount)
         
         conn.commit()
         cursor.close()
@@ -445,6 +432,26 @@ def delete_leave(leave_id):
         conn.close()
         return {'success': False, 'message': f'Error cancelling leave: {str(e)}'}
 
+@employee_bp.route('/notifications/count')
+@login_required
+@role_required('employee')
+def notification_count():
+    """Unread notification count (cheap badge poll)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    count = unread_count(cursor, session['user_id'])
+    cursor.close()
+    conn.close()
+    
+    return {'success': True, 'count': count}
+
+@employee_bp.route('/notifications/stream')
+@login_required
+@role_required('employee')
+def notification_stream():
+    """Server-Sent Events stream of new notifications and unread counts"""
+    return stream_response(session['user_id'])
+
 @employee_bp.route('/notifications/get')
 @login_required
 @role_required('employee')
@@ -454,6 +461,15 @@ def get_notifications():
     cursor = conn.cursor(dictionary=True)
     
     try:
+        # Answer conditional polls from the validator alone, without fetching rows
+        etag, count = list_version(cursor, session['user_id'])
+        if request.if_none_match.contains_weak(etag):
+            cursor.close()
+            conn.close()
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+        
         cursor.execute('''
             SELECT id, title, message, type, related_id, is_read, created_at
             FROM notifications
@@ -466,7 +482,10 @@ def get_notifications():
         cursor.close()
         conn.close()
         
-        return {'success': True, 'notifications': notifications}
+        response = jsonify({'success': True, 'notifications': notifications, 'unread_count': count})
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     
     except Exception as e:
         cursor.close()
@@ -482,11 +501,9 @@ def mark_notification_read(notif_id):
     cursor = conn.cursor()
     
     try:
-        cursor.execute(
-            'UPDATE notifications SET is_read = TRUE WHERE id = %s AND user_id = %s',
-            (notif_id, session['user_id'])
-        )
+        mark_read(cursor, session['user_id'], notif_id)
         conn.commit()
+        nav_cache.invalidate(session['user_id'])
         cursor.close()
         conn.close()
         
@@ -507,11 +524,9 @@ def mark_all_notifications_read():
     cursor = conn.cursor()
     
     try:
-        cursor.execute(
-            'UPDATE notifications SET is_read = TRUE WHERE user_id = %s AND is_read = FALSE',
-            (session['user_id'],)
-        )
+        mark_all_read(cursor, session['user_id'])
         conn.commit()
+        nav_cache.invalidate(session['user_id'])
         cursor.close()
         conn.close()
         
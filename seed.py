@@ -5,8 +5,10 @@ Password for all users: password123
 """
 
 import mysql.connector
-from werkzeug.security import generate_password_hash
+from passwords import hash_password
 from config import DB_CONFIG
+from routes.auth import assign_applicant_sequence
+import stats_counters
 
 def seed_database():
     print("Starting database seeding...")
@@ -15,7 +17,7 @@ def seed_database():
     cursor = conn.cursor()
     
     # Generate password hash for 'password123'
-    password_hash = generate_password_hash('password123')
+    password_hash = hash_password('password123')
     
     try:
         # Insert admin user
@@ -51,9 +53,11 @@ def seed_database():
             INSERT INTO applicant_profiles (user_id, email) 
             VALUES (%s, %s)
         ''', (applicant_id, 'applicant@pnpsanjuan.com'))
+        assign_applicant_sequence(cursor, applicant_id)
         print("✓ Applicant user created (username: applicant1)")
         
         conn.commit()
+        stats_counters.reconcile(conn)
         print("\n✅ Database seeding completed successfully!")
         print("\nTest accounts:")
         print("  Admin     - username: admin      | password: password123")
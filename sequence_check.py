@@ -0,0 +1,94 @@
+"""
+Concurrency check for the applicant ID allocator
+Runs allocate_applicant_id from several threads at once, each on its own
+pooled connection and committing every allocation, then checks that the
+IDs handed out are distinct and contiguous. It allocates from the counter
+row of a scratch year that no real applicant can have, and deletes that
+row before and after, so live ID sequences are never touched.
+
+    flask --app app db check-applicant-ids [--threads N] [--per-thread N]
+
+Exits non-zero if any ID was handed out twice or skipped.
+"""
+import threading
+from datetime import datetime
+
+import click
+
+from config import DB_POOL_CONFIG
+from db import pooled_connection
+
+SCRATCH_YEAR = 1901
+
+
+def _reset(year):
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM applicant_id_sequences WHERE year = %s', (year,))
+        conn.commit()
+        cursor.close()
+
+
+def allocate_concurrently(threads, per_thread, year=SCRATCH_YEAR):
+    """Allocate threads * per_thread IDs in parallel; returns (ids, errors)"""
+    from routes.applicant import allocate_applicant_id
+
+    now = datetime(year, 1, 1)
+    start = threading.Barrier(threads)
+    ids, errors = [], []
+    lock = threading.Lock()
+
+    def worker():
+        allocated = []
+        try:
+            with pooled_connection() as conn:
+                cursor = conn.cursor()
+                start.wait()
+                for _ in range(per_thread):
+                    allocated.append(allocate_applicant_id(cursor, now))
+                    conn.commit()
+                cursor.close()
+        except Exception as e:
+            # Release the others if this thread never reached the barrier
+            start.abort()
+            with lock:
+                errors.append(e)
+        with lock:
+            ids.extend(allocated)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return ids, errors
+
+
+@click.command('check-applicant-ids')
+@click.option('--threads', default=DB_POOL_CONFIG['size'], show_default=True,
+              help='Concurrent allocators (at most the pool size).')
+@click.option('--per-thread', default=50, show_default=True, help='IDs allocated by each thread.')
+def check_applicant_ids_command(threads, per_thread):
+    """Check that parallel submissions never share an applicant ID."""
+    threads = max(1, min(threads, DB_POOL_CONFIG['size']))
+    _reset(SCRATCH_YEAR)
+    try:
+        ids, errors = allocate_concurrently(threads, per_thread)
+    finally:
+        _reset(SCRATCH_YEAR)
+
+    expected = threads * per_thread
+    numbers = sorted(int(applicant_id.split('-')[1]) for applicant_id in ids)
+    duplicates = len(numbers) - len(set(numbers))
+    for error in errors:
+        click.echo(f'✗ Allocation failed: {error}')
+    if errors or duplicates or numbers != list(range(1, expected + 1)):
+        raise click.ClickException(f'{len(ids)}/{expected} IDs from {threads} threads, '
+                                   f'{duplicates} duplicate(s), '
+                                   f'range {numbers[0] if numbers else "-"}..{numbers[-1] if numbers else "-"}')
+    click.echo(f'✓ {expected} IDs from {threads} threads are distinct and contiguous (1..{expected})')
+
+
+def init_app(app):
+    from migrations import db_cli
+    db_cli.add_command(check_applicant_ids_command)